@@ -31,6 +31,15 @@ ROOT_HELPER_OPTS = [
                help=_('Root helper application.')),
 ]
 
+ROOT_HELPER_DAEMON_OPTS = [
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Root helper daemon application to run commands '
+                      'through instead of forking the root helper for each '
+                      'command, e.g. "sudo neutron-rootwrap-daemon '
+                      '/etc/neutron/rootwrap.conf". It must apply the same '
+                      'filters as root_helper.')),
+]
+
 AGENT_STATE_OPTS = [
     cfg.IntOpt('report_interval', default=4,
                help=_('Seconds between nodes reporting state to server')),
@@ -68,6 +77,7 @@ def register_root_helper(conf):
     # The first call is to ensure backward compatibility
     conf.register_opts(ROOT_HELPER_OPTS)
     conf.register_opts(ROOT_HELPER_OPTS, 'AGENT')
+    conf.register_opts(ROOT_HELPER_DAEMON_OPTS, 'AGENT')
 
 
 def register_agent_state_opts_helper(conf):
@@ -42,6 +42,15 @@ from neutron import service as neutron_service
 LOG = logging.getLogger(__name__)
 
 
+def _dhcp_settings(port):
+    """Returns the attributes of a port used by the DHCP server."""
+    return (port.mac_address,
+            sorted((ip.subnet_id, ip.ip_address) for ip in port.fixed_ips),
+            sorted((opt.opt_name, opt.opt_value)
+                   for opt in getattr(port, 'extra_dhcp_opts', None) or []),
+            getattr(port, 'device_owner', None))
+
+
 class DhcpAgent(manager.Manager):
     OPTS = [
         cfg.IntOpt('resync_interval', default=5,
@@ -58,7 +67,18 @@ class DhcpAgent(manager.Manager):
                            "dedicated network. Requires "
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
-                   help=_('Number of threads to use during sync process.')),
+                   help=_('Number of threads to use during sync process '
+                          'and to update the networks changed by '
+                          'notifications.')),
+        cfg.IntOpt('network_update_interval', default=1,
+                   help=_('Interval in seconds between updates of the '
+                          'DHCP servers of the networks whose ports or '
+                          'subnets changed. Notifications received in the '
+                          'meantime are merged into a single update.')),
+        cfg.IntOpt('sync_page_size', default=100,
+                   help=_('Number of networks whose subnets and ports are '
+                          'retrieved by each call during the sync process, '
+                          '0 retrieves all of them with a single call.')),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -68,6 +88,12 @@ class DhcpAgent(manager.Manager):
     def __init__(self, host=None):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync = False
+        # network id -> whether the network has to be fetched from the
+        # server (True) or only reloaded from the cache (False)
+        self.dirty_networks = {}
+        # network id -> whether the network info being fetched for the
+        # update of a dirty network is still to be applied
+        self.updating_networks = {}
         self.conf = cfg.CONF
         self.cache = NetworkCache()
         self.root_helper = config.get_root_helper(self.conf)
@@ -111,6 +137,7 @@ class DhcpAgent(manager.Manager):
         """Activate the DHCP agent."""
         self.sync_state()
         self.periodic_resync()
+        self.periodic_network_updates()
 
     def call_driver(self, action, network, **action_kwargs):
         """Invoke an action on a DHCP driver instance."""
@@ -137,8 +164,16 @@ class DhcpAgent(manager.Manager):
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            active_network_ids = set(network.id for network in active_networks)
+            if self.conf.sync_page_size > 0:
+                # The networks are configured as their pages arrive
+                active_network_ids = set(
+                    self.plugin_rpc.get_active_networks())
+                active_networks = self.plugin_rpc.iter_active_networks_info(
+                    sorted(active_network_ids), self.conf.sync_page_size)
+            else:
+                active_networks = self.plugin_rpc.get_active_networks_info()
+                active_network_ids = set(network.id
+                                         for network in active_networks)
             for deleted_id in known_network_ids - active_network_ids:
                 try:
                     self.disable_dhcp_helper(deleted_id)
@@ -166,6 +201,79 @@ class DhcpAgent(manager.Manager):
         """Spawn a thread to periodically resync the dhcp state."""
         eventlet.spawn(self._periodic_resync_helper)
 
+    def _periodic_network_updates_helper(self):
+        """Update the dirty networks at the configured interval."""
+        while True:
+            eventlet.sleep(self.conf.network_update_interval)
+            try:
+                self.update_dirty_networks()
+            except Exception:
+                LOG.exception(_('Unable to update networks.'))
+
+    def periodic_network_updates(self):
+        """Spawn a thread to periodically update the dirty networks."""
+        eventlet.spawn(self._periodic_network_updates_helper)
+
+    def mark_network_dirty(self, network_id, refresh=False):
+        """Schedule the update of the DHCP server of a network.
+
+        The DHCP configuration is reloaded from the cache, unless refresh
+        is True, in which case the network is fetched from the server first.
+        """
+        self.dirty_networks[network_id] = (
+            refresh or self.dirty_networks.get(network_id, False))
+
+    def update_dirty_networks(self):
+        """Update once each network marked dirty since the last call."""
+        dirty_networks, self.dirty_networks = self.dirty_networks, {}
+        if not dirty_networks:
+            return
+        pool = eventlet.GreenPool(self.conf.num_sync_threads)
+        for network_id, refresh in dirty_networks.iteritems():
+            pool.spawn_n(self._update_dirty_network, network_id, refresh)
+        pool.waitall()
+
+    def _update_dirty_network(self, network_id, refresh):
+        if not refresh:
+            self._reload_dirty_network(network_id)
+            return
+        # The network info is fetched without holding the lock of the
+        # notification handlers, which discard the update if they change
+        # the network in the meantime.
+        self.updating_networks[network_id] = True
+        try:
+            network = self.plugin_rpc.get_network_info(network_id)
+        except Exception:
+            self.updating_networks.pop(network_id, None)
+            self.needs_resync = True
+            LOG.exception(_('Network %s RPC info call failed.'), network_id)
+            return
+        self._refresh_dirty_network(network_id, network)
+
+    @utils.synchronized('dhcp-agent')
+    def _reload_dirty_network(self, network_id):
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self.call_driver('reload_allocations', network)
+
+    @utils.synchronized('dhcp-agent')
+    def _refresh_dirty_network(self, network_id, network):
+        if not self.updating_networks.pop(network_id, False):
+            LOG.debug(_('Network %s changed while it was fetched, '
+                        'discarding its update'), network_id)
+            return
+        old_network = self.cache.get_network_by_id(network_id)
+        if old_network:
+            self._refresh_dhcp(old_network, network)
+        else:
+            self.configure_dhcp_for_network(network)
+
+    def _discard_network_update(self, network_id):
+        """Cancel the pending and ongoing updates of a dirty network."""
+        self.dirty_networks.pop(network_id, None)
+        if network_id in self.updating_networks:
+            self.updating_networks[network_id] = False
+
     def enable_dhcp_helper(self, network_id):
         """Enable DHCP for a network that meets enabling criteria."""
         try:
@@ -214,7 +322,9 @@ class DhcpAgent(manager.Manager):
             self.needs_resync = True
             LOG.exception(_('Network %s RPC info call failed.'), network_id)
             return
+        self._refresh_dhcp(old_network, network)
 
+    def _refresh_dhcp(self, old_network, network):
         old_cidrs = set(s.cidr for s in old_network.subnets if s.enable_dhcp)
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
@@ -227,9 +337,8 @@ class DhcpAgent(manager.Manager):
         else:
             self.disable_dhcp_helper(network.id)
 
-    def release_lease_for_removed_ips(self, port, network):
+    def release_lease_for_removed_ips(self, port, network, prev_port):
         """Releases the dhcp lease for ips removed from a port."""
-        prev_port = self.cache.get_port_by_id(port.id)
         if prev_port:
             previous_ips = set(fixed_ip.ip_address
                                for fixed_ip in prev_port.fixed_ips)
@@ -247,12 +356,14 @@ class DhcpAgent(manager.Manager):
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
         network_id = payload['network']['id']
+        self._discard_network_update(network_id)
         self.enable_dhcp_helper(network_id)
 
     @utils.synchronized('dhcp-agent')
     def network_update_end(self, context, payload):
         """Handle the network.update.end notification event."""
         network_id = payload['network']['id']
+        self._discard_network_update(network_id)
         if payload['network']['admin_state_up']:
             self.enable_dhcp_helper(network_id)
         else:
@@ -261,13 +372,14 @@ class DhcpAgent(manager.Manager):
     @utils.synchronized('dhcp-agent')
     def network_delete_end(self, context, payload):
         """Handle the network.delete.end notification event."""
+        self._discard_network_update(payload['network_id'])
         self.disable_dhcp_helper(payload['network_id'])
 
     @utils.synchronized('dhcp-agent')
     def subnet_update_end(self, context, payload):
         """Handle the subnet.update.end notification event."""
         network_id = payload['subnet']['network_id']
-        self.refresh_dhcp_helper(network_id)
+        self.mark_network_dirty(network_id, refresh=True)
 
     # Use the update handler for the subnet create event.
     subnet_create_end = subnet_update_end
@@ -278,7 +390,7 @@ class DhcpAgent(manager.Manager):
         subnet_id = payload['subnet_id']
         network = self.cache.get_network_by_subnet_id(subnet_id)
         if network:
-            self.refresh_dhcp_helper(network.id)
+            self.mark_network_dirty(network.id, refresh=True)
 
     @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
@@ -286,9 +398,16 @@ class DhcpAgent(manager.Manager):
         port = dhcp.DictModel(payload['port'])
         network = self.cache.get_network_by_id(port.network_id)
         if network:
-            self.release_lease_for_removed_ips(port, network)
+            prev_port = self.cache.get_port_by_id(port.id)
+            if (prev_port and
+                    _dhcp_settings(prev_port) == _dhcp_settings(port)):
+                # Status or name updates don't change the DHCP server
+                # configuration.
+                self.cache.put_port(port)
+                return
+            self.release_lease_for_removed_ips(port, network, prev_port)
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            self.mark_network_dirty(network.id)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -306,7 +425,7 @@ class DhcpAgent(manager.Manager):
                              network,
                              mac_address=port.mac_address,
                              removed_ips=removed_ips)
-            self.call_driver('reload_allocations', network)
+            self.mark_network_dirty(network.id)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -381,14 +500,40 @@ class DhcpPluginApi(proxy.RpcProxy):
         self.host = cfg.CONF.host
         self.use_namespaces = use_namespaces
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
-        networks = self.call(self.context,
-                             self.make_msg('get_active_networks_info',
-                                           host=self.host),
-                             topic=self.topic)
+    def get_active_networks(self):
+        """Make a remote process call to retrieve the active network ids."""
+        return self.call(self.context,
+                         self.make_msg('get_active_networks',
+                                       host=self.host),
+                         topic=self.topic)
+
+    def get_active_networks_info(self, network_ids=None):
+        """Make a remote process call to retrieve all network info.
+
+        The info is restricted to the networks of network_ids, if given.
+        """
+        if network_ids is None:
+            msg = self.make_msg('get_active_networks_info', host=self.host)
+        else:
+            msg = self.make_msg('get_active_networks_info',
+                                network_ids=network_ids, host=self.host)
+        networks = self.call(self.context, msg, topic=self.topic)
         return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
 
+    def iter_active_networks_info(self, network_ids, page_size):
+        """Retrieve the info of the networks with one call per page."""
+        for i in xrange(0, len(network_ids), page_size):
+            page = network_ids[i:i + page_size]
+            networks = self.get_active_networks_info(page)
+            for network in networks:
+                yield network
+            if set(network.id for network in networks) - set(page):
+                # Servers which don't know of network_ids return all the
+                # networks at once
+                LOG.debug(_('The server ignored the requested network '
+                            'ids, skipping the remaining pages'))
+                return
+
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
         return dhcp.NetModel(self.use_namespaces,
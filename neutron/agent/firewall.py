@@ -84,6 +84,14 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    def update_security_group_members(self, sg_id, member_ips):
+        """Update the members of a remote security group.
+
+        Only called for drivers matching remote group members with
+        ipsets, see the enable_ipset option.
+        """
+        raise NotImplementedError()
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
@@ -126,6 +134,9 @@ class NoopFirewallDriver(FirewallDriver):
     def remove_port_filter(self, port):
         pass
 
+    def update_security_group_members(self, sg_id, member_ips):
+        pass
+
     def filter_defer_apply_on(self):
         pass
 
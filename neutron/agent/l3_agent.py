@@ -18,6 +18,7 @@
 #
 
 import eventlet
+import eventlet.queue
 import netaddr
 from oslo.config import cfg
 
@@ -35,13 +36,13 @@ from neutron.common import utils as common_utils
 from neutron import context
 from neutron import manager
 from neutron.openstack.common import importutils
-from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
 from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.openstack.common import service
+from neutron.openstack.common import timeutils
 from neutron import service as neutron_service
 from neutron.services.firewall.agents.l3reference import firewall_l3_agent
 
@@ -49,7 +50,11 @@ LOG = logging.getLogger(__name__)
 NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
-RPC_LOOP_INTERVAL = 1
+
+# Lower value is higher priority
+PRIORITY_RPC = 0
+PRIORITY_SYNC_ROUTERS_TASK = 1
+DELETE_ROUTER = 1
 
 
 class L3PluginApi(proxy.RpcProxy):
@@ -138,6 +143,77 @@ class RouterInfo(object):
         self._snat_action = None
 
 
+class RouterUpdate(object):
+    """Pending update of a router.
+
+    Updates are ordered by priority, then by age.
+    """
+
+    def __init__(self, router_id, priority,
+                 action=None, router=None, timestamp=None):
+        self.id = router_id
+        self.priority = priority
+        self.action = action
+        self.router = router
+        self.timestamp = timestamp or timeutils.utcnow()
+
+    def __lt__(self, other):
+        return ((self.priority, self.timestamp, self.id) <
+                (other.priority, other.timestamp, other.id))
+
+
+class RouterProcessingQueue(object):
+    """Queue of router updates shared by a pool of workers.
+
+    The updates of a router are processed by one worker at a time: a
+    worker getting an update for a router which is being processed hands
+    it over to the worker processing that router.  Updates older than the
+    last state applied to a router are dropped, as that state reflects
+    them.
+    """
+
+    def __init__(self):
+        self._queue = eventlet.queue.PriorityQueue()
+        # router id -> updates waiting for the worker owning the router
+        self._owned = {}
+        # router id -> timestamp of the last router state applied
+        self._processed_at = {}
+
+    def add(self, update):
+        self._queue.put(update)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def processed(self, router_id, timestamp):
+        """Record that the state of a router at timestamp was applied."""
+        self._processed_at[router_id] = max(
+            timestamp, self._processed_at.get(router_id, timestamp))
+
+    def each_update_to_next_router(self):
+        """Yield the updates of the router of the next queued update.
+
+        Nothing is yielded when another worker owns the router.
+        """
+        update = self._queue.get()
+        router_id = update.id
+        if router_id in self._owned:
+            self._owned[router_id].append(update)
+            return
+        pending = self._owned[router_id] = [update]
+        try:
+            while pending:
+                update = pending.pop(0)
+                processed_at = self._processed_at.get(router_id)
+                if processed_at and update.timestamp < processed_at:
+                    LOG.debug(_("Discarding outdated update for router %s"),
+                              router_id)
+                    continue
+                yield update
+        finally:
+            del self._owned[router_id]
+
+
 class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     """Manager for L3NatAgent
 
@@ -185,6 +261,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of routers processed concurrently.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -210,15 +288,12 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.L3PLUGIN, host)
         self.fullsync = True
-        self.updated_routers = set()
-        self.removed_routers = set()
         self.sync_progress = False
+        self.target_ex_net_id = None
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
 
-        self.rpc_loop = loopingcall.FixedIntervalLoopingCall(
-            self._rpc_loop)
-        self.rpc_loop.start(interval=RPC_LOOP_INTERVAL)
+        self._queue = RouterProcessingQueue()
         super(L3NATAgent, self).__init__(conf=self.conf)
 
     def _destroy_router_namespaces(self, only_router_id=None):
@@ -259,12 +334,16 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             ip_wrapper = ip_wrapper_root.ensure_namespace(ri.ns_name())
             ip_wrapper.netns.execute(['sysctl', '-w', 'net.ipv4.ip_forward=1'])
 
-    def _fetch_external_net_id(self):
+    def _fetch_external_net_id(self, force=False):
         """Find UUID of single external network for this agent."""
         if self.conf.gateway_external_network_id:
             return self.conf.gateway_external_network_id
+        if self.target_ex_net_id and not force:
+            return self.target_ex_net_id
         try:
-            return self.plugin_rpc.get_external_network_id(self.context)
+            self.target_ex_net_id = self.plugin_rpc.get_external_network_id(
+                self.context)
+            return self.target_ex_net_id
         except rpc_common.RemoteError as e:
             if e.exc_type == 'TooManyExternalNetworks':
                 msg = _(
@@ -291,7 +370,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             self._spawn_metadata_proxy(ri)
 
     def _router_removed(self, router_id):
-        ri = self.router_info[router_id]
+        ri = self.router_info.get(router_id)
+        if ri is None:
+            LOG.debug(_("Router %s is not configured on this agent"),
+                      router_id)
+            return
         ri.router['gw_port'] = None
         ri.router[l3_constants.INTERFACE_KEY] = []
         ri.router[l3_constants.FLOATINGIP_KEY] = []
@@ -616,7 +699,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
         LOG.debug(_('Got router deleted notification for %s'), router_id)
-        self.removed_routers.add(router_id)
+        update = RouterUpdate(router_id, PRIORITY_RPC, action=DELETE_ROUTER)
+        self._queue.add(update)
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
@@ -625,18 +709,20 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             # This is needed for backward compatiblity
             if isinstance(routers[0], dict):
                 routers = [router['id'] for router in routers]
-            self.updated_routers.update(routers)
+            for router_id in routers:
+                self._queue.add(RouterUpdate(router_id, PRIORITY_RPC))
 
     def router_removed_from_agent(self, context, payload):
         LOG.debug(_('Got router removed from agent :%r'), payload)
-        self.removed_routers.add(payload['router_id'])
+        update = RouterUpdate(payload['router_id'], PRIORITY_RPC,
+                              action=DELETE_ROUTER)
+        self._queue.add(update)
 
     def router_added_to_agent(self, context, payload):
         LOG.debug(_('Got router added to agent :%r'), payload)
         self.routers_updated(context, payload)
 
     def _process_routers(self, routers, all_routers=False):
-        pool = eventlet.GreenPool()
         if (self.conf.external_network_bridge and
             not ip_lib.device_exists(self.conf.external_network_bridge)):
             LOG.error(_("The external network bridge '%s' does not exist"),
@@ -674,62 +760,89 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                 self._router_added(r['id'], r)
             ri = self.router_info[r['id']]
             ri.router = r
-            pool.spawn_n(self.process_router, ri)
+            self.process_router(ri)
         # identify and remove routers that no longer exist
         for router_id in prev_router_ids - cur_router_ids:
-            pool.spawn_n(self._router_removed, router_id)
-        pool.waitall()
-
-    @lockutils.synchronized('l3-agent', 'neutron-')
-    def _rpc_loop(self):
-        # _rpc_loop and _sync_routers_task will not be
-        # executed in the same time because of lock.
-        # so we can clear the value of updated_routers
-        # and removed_routers
-        try:
-            if self.updated_routers:
-                router_ids = list(self.updated_routers)
-                self.updated_routers.clear()
-                routers = self.plugin_rpc.get_routers(
-                    self.context, router_ids)
-                self._process_routers(routers)
-            self._process_router_delete()
-        except Exception:
-            LOG.exception(_("Failed synchronizing routers"))
-            self.fullsync = True
-
-    def _process_router_delete(self):
-        current_removed_routers = list(self.removed_routers)
-        for router_id in current_removed_routers:
             self._router_removed(router_id)
-            self.removed_routers.remove(router_id)
+
+    def _process_router_update(self):
+        for update in self._queue.each_update_to_next_router():
+            LOG.debug(_("Starting router update for %s"), update.id)
+            router = update.router
+            if update.action != DELETE_ROUTER and not router:
+                try:
+                    update.timestamp = timeutils.utcnow()
+                    routers = self.plugin_rpc.get_routers(self.context,
+                                                          [update.id])
+                except Exception:
+                    LOG.exception(_("Failed to fetch router information "
+                                    "for '%s'"), update.id)
+                    self.fullsync = True
+                    continue
+                if routers:
+                    router = routers[0]
+
+            try:
+                if router:
+                    self._process_routers([router])
+                else:
+                    self._router_removed(update.id)
+            except Exception:
+                LOG.exception(_("Failed processing router '%s'"), update.id)
+                self.fullsync = True
+                continue
+
+            self._queue.processed(update.id, update.timestamp)
+            LOG.debug(_("Finished router update for %s"), update.id)
+
+    def _process_routers_loop(self):
+        LOG.debug(_("Starting _process_routers_loop"))
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
+        while True:
+            # Each worker processes the updates of a single router, so
+            # that no two workers configure the same router at once.
+            pool.spawn_n(self._process_router_update)
 
     def _router_ids(self):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
     @periodic_task.periodic_task
-    @lockutils.synchronized('l3-agent', 'neutron-')
     def _sync_routers_task(self, context):
         if self.services_sync:
             super(L3NATAgent, self).process_services_sync(context)
         if not self.fullsync:
             return
+        prev_router_ids = set(self.router_info)
         try:
             router_ids = self._router_ids()
-            self.updated_routers.clear()
-            self.removed_routers.clear()
+            timestamp = timeutils.utcnow()
+            self._fetch_external_net_id(force=True)
             routers = self.plugin_rpc.get_routers(
                 context, router_ids)
 
             LOG.debug(_('Processing :%r'), routers)
-            self._process_routers(routers, all_routers=True)
+            # The routers are processed by the workers, after the updates
+            # received through RPC.
+            for r in routers:
+                update = RouterUpdate(r['id'], PRIORITY_SYNC_ROUTERS_TASK,
+                                      router=r, timestamp=timestamp)
+                self._queue.add(update)
             self.fullsync = False
+
+            # identify and remove routers that no longer exist
+            cur_router_ids = set(r['id'] for r in routers)
+            for router_id in prev_router_ids - cur_router_ids:
+                update = RouterUpdate(router_id, PRIORITY_SYNC_ROUTERS_TASK,
+                                      action=DELETE_ROUTER,
+                                      timestamp=timestamp)
+                self._queue.add(update)
         except Exception:
             LOG.exception(_("Failed synchronizing routers"))
             self.fullsync = True
 
     def after_start(self):
+        eventlet.spawn_n(self._process_routers_loop)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -50,6 +50,12 @@ OPTS = [
     cfg.StrOpt('dnsmasq_dns_server',
                help=_('Use another DNS server before any in '
                       '/etc/resolv.conf.')),
+    cfg.BoolOpt('dnsmasq_hostsdir',
+                default=False,
+                help=_('Write one dnsmasq hosts file per port in a '
+                       'directory watched by dnsmasq, which only needs to '
+                       'be signaled when host entries are changed or '
+                       'removed. Requires dnsmasq 2.73 or above.')),
     cfg.StrOpt('interface_driver',
                help=_("The driver used to manage the virtual interface.")),
 ]
@@ -316,7 +322,7 @@ class Dnsmasq(DhcpLocalProcess):
                 'pid', ensure_conf_dir=True),
             #TODO (mark): calculate value from cidr (defaults to 150)
             #'--dhcp-lease-max=%s' % ?,
-            '--dhcp-hostsfile=%s' % self._output_hosts_file(),
+            self._hosts_argument(),
             '--dhcp-optsfile=%s' % self._output_opts_file(),
             '--leasefile-ro',
         ]
@@ -378,22 +384,58 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
-        self._output_hosts_file()
-        self._output_opts_file()
-        if self.active:
-            cmd = ['kill', '-HUP', self.pid]
-            utils.execute(cmd, self.root_helper)
+        if self.conf.dnsmasq_hostsdir:
+            added, changed = self._output_hosts_dir()
         else:
+            added = False
+            changed = self._replace_file_if_changed(
+                self.get_conf_file_name('host', ensure_conf_dir=True),
+                self._hosts_data())
+        changed = self._replace_file_if_changed(
+            self.get_conf_file_name('opts'), self._opts_data()) or changed
+        if not (added or changed):
+            LOG.debug(_('Allocations for network %s are unchanged'),
+                      self.network.id)
+        elif not self.active:
             LOG.debug(_('Pid %d is stale, relaunching dnsmasq'), self.pid)
+        elif changed:
+            # dnsmasq picks up new files of the hosts directory on its own,
+            # other changes require to re-read every file.
+            cmd = ['kill', '-HUP', self.pid]
+            utils.execute(cmd, self.root_helper)
         LOG.debug(_('Reloading allocations for network: %s'), self.network.id)
         self.device_manager.update(self.network)
 
-    def _output_hosts_file(self):
-        """Writes a dnsmasq compatible hosts file."""
+    def _hosts_argument(self):
+        if self.conf.dnsmasq_hostsdir:
+            self._output_hosts_dir()
+            return '--dhcp-hostsdir=%s' % self.get_conf_file_name('hosts')
+        return '--dhcp-hostsfile=%s' % self._output_hosts_file()
+
+    def _replace_file_if_changed(self, name, data, tmp_dir=None):
+        """Replace the content of a file unless it is already data.
+
+        Returns True if the file has been written.
+        """
+        try:
+            with open(name, 'r') as f:
+                if f.read() == data:
+                    return False
+        except IOError:
+            pass
+        if tmp_dir:
+            utils.replace_file(name, data, tmp_dir=tmp_dir)
+        else:
+            utils.replace_file(name, data)
+        return True
+
+    def _host_entries(self):
+        """Returns a list of (port id, dnsmasq hosts lines) tuples."""
         r = re.compile('[:.]')
-        buf = StringIO.StringIO()
+        entries = []
 
         for port in self.network.ports:
+            buf = StringIO.StringIO()
             for alloc in port.fixed_ips:
                 name = 'host-%s.%s' % (r.sub('-', alloc.ip_address),
                                        self.conf.dhcp_domain)
@@ -408,14 +450,57 @@ class Dnsmasq(DhcpLocalProcess):
                 else:
                     buf.write('%s,%s,%s\n' %
                               (port.mac_address, name, alloc.ip_address))
+            entries.append((port.id, buf.getvalue()))
+        return entries
+
+    def _hosts_data(self):
+        return ''.join(lines for port_id, lines in self._host_entries())
 
+    def _output_hosts_file(self):
+        """Writes a dnsmasq compatible hosts file."""
         name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
+        self._replace_file_if_changed(name, self._hosts_data())
         return name
 
+    def _output_hosts_dir(self):
+        """Writes a dnsmasq compatible hosts file per port.
+
+        Only the files of added, changed or removed ports are touched.
+        Returns a (added, changed) tuple telling whether files have been
+        created, and whether files have been rewritten or deleted.
+
+        The files are written in the network config directory and renamed
+        into the hosts directory, where dnsmasq would otherwise read the
+        temporary files as well.
+        """
+        hosts_dir = self.get_conf_file_name('hosts', ensure_conf_dir=True)
+        tmp_dir = os.path.dirname(hosts_dir)
+        if not os.path.isdir(hosts_dir):
+            os.makedirs(hosts_dir, 0o755)
+        existing = set(os.listdir(hosts_dir))
+        added = changed = False
+
+        entries = self._host_entries()
+        for port_id, lines in entries:
+            name = os.path.join(hosts_dir, port_id)
+            if port_id not in existing:
+                utils.replace_file(name, lines, tmp_dir=tmp_dir)
+                added = True
+            elif self._replace_file_if_changed(name, lines, tmp_dir=tmp_dir):
+                changed = True
+
+        for port_id in existing - set(entry[0] for entry in entries):
+            os.unlink(os.path.join(hosts_dir, port_id))
+            changed = True
+        return added, changed
+
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
+        name = self.get_conf_file_name('opts')
+        self._replace_file_if_changed(name, self._opts_data())
+        return name
 
+    def _opts_data(self):
         if self.conf.enable_isolated_metadata:
             subnet_to_interface_ip = self._make_subnet_interface_ip_map()
 
@@ -468,9 +553,7 @@ class Dnsmasq(DhcpLocalProcess):
                     self._format_option(port.id, opt.opt_name, opt.opt_value)
                     for opt in port.extra_dhcp_opts)
 
-        name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
-        return name
+        return '\n'.join(options)
 
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(
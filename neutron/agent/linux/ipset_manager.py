@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Manages ipsets using linux utilities."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset names are limited to 31 characters
+MAX_IPSET_NAME_LENGTH = 31
+IPSET_PREFIX = 'NET'
+IPSET_FAMILY = {constants.IPv4: 'inet',
+                constants.IPv6: 'inet6'}
+
+
+def get_ipset_name(id, ethertype):
+    """Return the name of the set holding the members of a given id."""
+    return ('%s%s%s' % (IPSET_PREFIX, ethertype, id))[:MAX_IPSET_NAME_LENGTH]
+
+
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    The members of the sets created by this manager are kept in memory, so
+    that updating a set only adds and deletes the members which changed,
+    through a single ipset restore.
+    """
+
+    def __init__(self, execute=None, root_helper=None, namespace=None):
+        if execute:
+            self.execute = execute
+        else:
+            self.execute = linux_utils.execute
+        self.root_helper = root_helper
+        self.namespace = namespace
+        self.sets = {}
+
+    def set_exists(self, name):
+        return name in self.sets
+
+    def set_members(self, name, ethertype, member_ips):
+        """Create or update a set so that it holds exactly member_ips."""
+        new_members = set(member_ips)
+        old_members = self.sets.get(name)
+        lines = []
+        if old_members is None:
+            # The set may be left over from a previous run of the agent,
+            # so flush it rather than trust its members.
+            lines.append('create %s hash:net family %s' %
+                         (name, IPSET_FAMILY[ethertype]))
+            lines.append('flush %s' % name)
+            old_members = set()
+        lines += ['add %s %s' % (name, ip)
+                  for ip in sorted(new_members - old_members)]
+        lines += ['del %s %s' % (name, ip)
+                  for ip in sorted(old_members - new_members)]
+        if lines:
+            LOG.debug(_("Updating ipset %(name)s: %(added)d added, "
+                        "%(deleted)d deleted"),
+                      {'name': name,
+                       'added': len(new_members - old_members),
+                       'deleted': len(old_members - new_members)})
+            self._execute(['ipset', 'restore', '-exist'],
+                          process_input='\n'.join(lines) + '\n')
+        self.sets[name] = new_members
+
+    def destroy_set(self, name):
+        """Destroy a set, which must not be referenced by iptables rules."""
+        self._execute(['ipset', 'destroy', name])
+        self.sets.pop(name, None)
+
+    def _execute(self, args, process_input=None):
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return self.execute(args, process_input=process_input,
+                            root_helper=self.root_helper)
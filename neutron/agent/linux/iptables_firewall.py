@@ -19,12 +19,15 @@ import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                    group='SECURITYGROUP')
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
@@ -33,6 +36,8 @@ CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
 LINUX_DEV_LEN = 14
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 
 
 class IptablesFirewallDriver(firewall.FirewallDriver):
@@ -44,11 +49,16 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
             use_ipv6=True)
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        if self.enable_ipset:
+            self.ipset = ipset_manager.IpsetManager(
+                root_helper=cfg.CONF.AGENT.root_helper)
         # list of port which has security group
         self.filtered_ports = {}
         self._add_fallback_chain_v4v6()
         self._defer_apply = False
         self._pre_defer_filtered_ports = None
+        self._updated_ports = set()
 
     @property
     def ports(self):
@@ -57,10 +67,11 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def prepare_port_filter(self, port):
         LOG.debug(_("Preparing device (%s) filter"), port['device'])
         self._remove_chains()
+        self._updated_ports.add(port['device'])
         self.filtered_ports[port['device']] = port
         # each security group has it own chains
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -69,9 +80,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                        'filtered %s'), port['device'])
             return
         self._remove_chains()
+        self._updated_ports.add(port['device'])
         self.filtered_ports[port['device']] = port
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -80,9 +92,66 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                        'filtered %r'), port)
             return
         self._remove_chains()
+        self._updated_ports.add(port['device'])
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
-        self.iptables.apply()
+        self._apply()
+
+    def update_security_group_members(self, sg_id, member_ips):
+        """Update the ipsets of a remote security group in place."""
+        if not self.enable_ipset:
+            return
+        for port in self.filtered_ports.values():
+            member_ips_by_group = port.get('security_group_member_ips', {})
+            if sg_id in member_ips_by_group:
+                member_ips_by_group[sg_id] = member_ips
+        for ethertype in (constants.IPv4, constants.IPv6):
+            name = ipset_manager.get_ipset_name(sg_id, ethertype)
+            if self.ipset.set_exists(name):
+                self.ipset.set_members(
+                    name, ethertype,
+                    self._filter_ips_by_ethertype(member_ips, ethertype))
+
+    def _apply(self):
+        if not self._defer_apply:
+            self.iptables.apply()
+            self._remove_unused_ipsets()
+
+    def _filter_ips_by_ethertype(self, ips, ethertype):
+        version = 4 if ethertype == constants.IPv4 else 6
+        return [ip for ip in ips if netaddr.IPNetwork(ip).version == version]
+
+    def _is_ipset_rule(self, rule):
+        return (self.enable_ipset and rule.get('remote_group_id') and
+                not rule.get('source_ip_prefix') and
+                not rule.get('dest_ip_prefix'))
+
+    def _update_ipset_members(self, port, security_group_rules):
+        member_ips_by_group = port.get('security_group_member_ips', {})
+        for rule in security_group_rules:
+            if not self._is_ipset_rule(rule):
+                continue
+            sg_id = rule['remote_group_id']
+            ethertype = rule['ethertype']
+            self.ipset.set_members(
+                ipset_manager.get_ipset_name(sg_id, ethertype), ethertype,
+                self._filter_ips_by_ethertype(
+                    member_ips_by_group.get(sg_id, []), ethertype))
+
+    def _remove_unused_ipsets(self):
+        if not self.enable_ipset:
+            return
+        used_sets = set(
+            ipset_manager.get_ipset_name(rule['remote_group_id'],
+                                         rule['ethertype'])
+            for port in self.filtered_ports.values()
+            for rule in port.get('security_group_rules', [])
+            if self._is_ipset_rule(rule))
+        for name in set(self.ipset.sets) - used_sets:
+            try:
+                self.ipset.destroy_set(name)
+            except RuntimeError:
+                LOG.exception(_("Failed to destroy ipset %s"), name)
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -109,6 +178,24 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._remove_chain(port, SPOOF_FILTER)
         self._remove_chain_by_name_v4v6(SG_CHAIN)
 
+    def _update_port_chains(self, port):
+        """Re-render the rules of a port in place.
+
+        The jumps to the chains of the port are left alone, and the rules
+        keep the position they had, as if all the chains had been set up
+        again.
+        """
+        tables = [self.iptables.ipv4['filter'], self.iptables.ipv6['filter']]
+        for direction, chain_directions in (
+                (INGRESS_DIRECTION, [INGRESS_DIRECTION]),
+                (EGRESS_DIRECTION, [SPOOF_FILTER, EGRESS_DIRECTION])):
+            chains = [self._port_chain_name(port, chain_direction)
+                      for chain_direction in chain_directions]
+            positions = [table.empty_chains(chains) for table in tables]
+            self._add_rule_by_security_group(port, direction)
+            for table, position in zip(tables, positions):
+                table.move_chain_rules(chains, position)
+
     def _setup_chain(self, port, DIRECTION):
         self._add_chain(port, DIRECTION)
         self._add_rule_by_security_group(port, DIRECTION)
@@ -252,6 +339,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         # for ipv6, iptables6 command is used
         ipv4_sg_rules, ipv6_sg_rules = self._split_sgr_by_ethertype(
             security_group_rules)
+        if self.enable_ipset:
+            self._update_ipset_members(port, security_group_rules)
         ipv4_iptables_rule = []
         ipv6_iptables_rule = []
         if direction == EGRESS_DIRECTION:
@@ -273,11 +362,10 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self._allow_established(iptables_rules)
         for rule in security_group_rules:
             # These arguments MUST be in the format iptables-save will
-            # display them: source/dest, protocol, sport, dport, target
+            # display them: source/dest, protocol, sport, dport, set, target
             # Otherwise the iptables_manager code won't be able to find
             # them to preserve their [packet:byte] counts.
-            args = self._ip_prefix_arg('s',
-                                       rule.get('source_ip_prefix'))
+            args = self._ip_prefix_arg('s', rule.get('source_ip_prefix'))
             args += self._ip_prefix_arg('d',
                                         rule.get('dest_ip_prefix'))
             args += self._protocol_arg(rule.get('protocol'))
@@ -289,6 +377,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._remote_group_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
 
@@ -327,6 +416,14 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                     '--%ss' % direction,
                     '%s:%s' % (port_range_min, port_range_max)]
 
+    def _remote_group_arg(self, rule):
+        if not self._is_ipset_rule(rule):
+            return []
+        name = ipset_manager.get_ipset_name(rule['remote_group_id'],
+                                            rule['ethertype'])
+        return ['-m set --match-set', name,
+                IPSET_DIRECTION[rule['direction']]]
+
     def _ip_prefix_arg(self, direction, ip_prefix):
         #NOTE (nati) : source_group_id is converted to list of source_
         # ip_prefix in server side
@@ -342,15 +439,26 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         if not self._defer_apply:
             self.iptables.defer_apply_on()
             self._pre_defer_filtered_ports = dict(self.filtered_ports)
+            self._updated_ports = set()
             self._defer_apply = True
 
     def filter_defer_apply_off(self):
         if self._defer_apply:
             self._defer_apply = False
-            self._remove_chains_apply(self._pre_defer_filtered_ports)
+            if (set(self._pre_defer_filtered_ports) ==
+                    set(self.filtered_ports) and
+                    self._updated_ports <= set(self.filtered_ports)):
+                # No port was added or removed, so only the chains of the
+                # updated ports need to be rendered again.
+                for device in self._updated_ports:
+                    self._update_port_chains(self.filtered_ports[device])
+            else:
+                self._remove_chains_apply(self._pre_defer_filtered_ports)
+                self._setup_chains_apply(self.filtered_ports)
             self._pre_defer_filtered_ports = None
-            self._setup_chains_apply(self.filtered_ports)
+            self._updated_ports = set()
             self.iptables.defer_apply_off()
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
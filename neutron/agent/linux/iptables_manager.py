@@ -23,6 +23,9 @@
 
 import inspect
 import os
+import time
+
+from oslo.config import cfg
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
@@ -30,6 +33,19 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+OPTS = [
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_("Only rewrite the chains which changed since the "
+                       "previous apply, using iptables-restore --noflush "
+                       "instead of an iptables-save/iptables-restore "
+                       "round-trip of the whole ruleset")),
+    cfg.IntOpt('iptables_full_sync_interval', default=300,
+               help=_("When iptables_incremental_apply is set, the number "
+                      "of seconds after which the next apply rewrites the "
+                      "whole ruleset again")),
+]
+cfg.CONF.register_opts(OPTS, 'AGENT')
+
 
 # NOTE(vish): Iptables supports chain names of up to 28 characters,  and we
 #             add up to 12 characters to binary_name which is used as a prefix,
@@ -97,6 +113,12 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # Wrapped chains changed since the last apply, the rules of each
+        # wrapped chain as of the last apply, and whether unwrapped chains
+        # or rules changed, which requires the whole table to be rewritten.
+        self.dirty_chains = set()
+        self.applied_rules = {}
+        self.full_apply_required = False
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -115,6 +137,13 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self._mark_dirty(name, wrap)
+
+    def _mark_dirty(self, chain, wrap):
+        if wrap:
+            self.dirty_chains.add(chain)
+        else:
+            self.full_apply_required = True
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -153,6 +182,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self._mark_dirty(name, wrap)
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -174,6 +204,9 @@ class IptablesTable(object):
             jump_snippet = '-j %s-%s' % (self.wrap_name, name)
 
         # finally, remove rules from list that have a matching jump chain
+        for rule in self.rules:
+            if jump_snippet in rule.rule:
+                self._mark_dirty(rule.chain, rule.wrap)
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
 
@@ -196,6 +229,7 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name))
+        self._mark_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -214,6 +248,7 @@ class IptablesTable(object):
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name))
+            self._mark_dirty(chain, wrap)
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name))
@@ -230,6 +265,62 @@ class IptablesTable(object):
                          if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self._mark_dirty(chain, wrap)
+
+    def empty_chains(self, chains, wrap=True):
+        """Remove all rules from chains.
+
+        Returns the position of the first removed rule, which can be given
+        to move_chain_rules to refill the chains in place.
+        """
+        chains = set(get_chain_name(chain, wrap) for chain in chains)
+        position = None
+        rules = []
+        for index, rule in enumerate(self.rules):
+            if rule.chain in chains and rule.wrap == wrap:
+                if position is None:
+                    position = index
+                self._mark_dirty(rule.chain, wrap)
+            else:
+                rules.append(rule)
+        self.rules = rules
+        return position
+
+    def move_chain_rules(self, chains, position, wrap=True):
+        """Move the rules of chains to position, keeping their order."""
+        if position is None:
+            return
+        chains = set(get_chain_name(chain, wrap) for chain in chains)
+        moved_rules = [rule for rule in self.rules
+                       if rule.chain in chains and rule.wrap == wrap]
+        rules = [rule for rule in self.rules
+                 if not (rule.chain in chains and rule.wrap == wrap)]
+        rules[position:position] = moved_rules
+        self.rules = rules
+
+    def get_wrapped_chain_rules(self, chains):
+        """Return the rules of the given wrapped chains as applied.
+
+        Rules are ordered and duplicates dropped the same way as when the
+        whole table is rewritten.
+        """
+        chain_rules = dict((chain, []) for chain in chains)
+        for rule in ([r for r in self.rules if r.top] +
+                     [r for r in self.rules if not r.top]):
+            if rule.wrap and rule.chain in chain_rules:
+                chain_rules[rule.chain].append(str(rule))
+        for chain, rules in chain_rules.iteritems():
+            seen_rules = set()
+            unique_rules = []
+            # the last occurrence of a duplicate rule takes precedence
+            for rule in reversed(rules):
+                if rule not in seen_rules:
+                    seen_rules.add(rule)
+                    unique_rules.append(rule)
+            unique_rules.reverse()
+            chain_rules[chain] = unique_rules
+        return chain_rules
 
 
 class IptablesManager(object):
@@ -253,6 +344,12 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    When iptables_incremental_apply is set, only the wrapped chains which
+    changed since the previous apply are rewritten, by feeding a script to
+    iptables-restore --noflush. Changes to unwrapped chains, the first apply
+    and an apply once iptables_full_sync_interval has elapsed still rewrite
+    the whole ruleset.
+
     """
 
     def __init__(self, _execute=None, state_less=False,
@@ -268,6 +365,7 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        self.last_full_apply = None
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -355,6 +453,29 @@ class IptablesManager(object):
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        if self._full_apply_required(s):
+            self._apply_full(s)
+        else:
+            try:
+                self._apply_incremental(s)
+            except RuntimeError:
+                LOG.exception(_("Incremental iptables apply failed, "
+                                "rewriting the whole ruleset"))
+                self._apply_full(s)
+        LOG.debug(_("IPTablesManager.apply completed with success"))
+
+    def _full_apply_required(self, s):
+        if not cfg.CONF.AGENT.iptables_incremental_apply:
+            return True
+        if (self.last_full_apply is None or
+            time.time() - self.last_full_apply >=
+                cfg.CONF.AGENT.iptables_full_sync_interval):
+            return True
+        return any(table.full_apply_required or table.remove_rules or
+                   table.remove_chains
+                   for cmd, tables in s for table in tables.itervalues())
+
+    def _apply_full(self, s):
         for cmd, tables in s:
             args = ['%s-save' % (cmd,), '-c']
             if self.namespace:
@@ -371,7 +492,73 @@ class IptablesManager(object):
                 args = ['ip', 'netns', 'exec', self.namespace] + args
             self.execute(args, process_input='\n'.join(all_lines),
                          root_helper=self.root_helper)
-        LOG.debug(_("IPTablesManager.apply completed with success"))
+
+        incremental = cfg.CONF.AGENT.iptables_incremental_apply
+        for cmd, tables in s:
+            for table in tables.itervalues():
+                table.dirty_chains.clear()
+                table.full_apply_required = False
+                # Only keep track of the applied rules when they will be
+                # needed to find out which chains changed.
+                if incremental:
+                    table.applied_rules = table.get_wrapped_chain_rules(
+                        table.chains)
+                else:
+                    table.applied_rules = {}
+        self.last_full_apply = time.time()
+
+    def _apply_incremental(self, s):
+        updates = []
+        for cmd, tables in s:
+            lines = []
+            for table_name, table in tables.iteritems():
+                table_lines, changed, removed = self._modify_chains(
+                    table, table_name)
+                lines += table_lines
+                updates.append((table, changed, removed))
+            if not lines:
+                continue
+
+            args = ['%s-restore' % (cmd,), '--noflush']
+            if self.namespace:
+                args = ['ip', 'netns', 'exec', self.namespace] + args
+            self.execute(args, process_input='\n'.join(lines) + '\n',
+                         root_helper=self.root_helper)
+
+        for table, changed, removed in updates:
+            table.applied_rules.update(changed)
+            for chain in removed:
+                del table.applied_rules[chain]
+            table.dirty_chains.clear()
+
+    def _modify_chains(self, table, table_name):
+        """Build the iptables-restore --noflush script of a table.
+
+        Declaring an existing chain in such a script flushes it, so each
+        changed wrapped chain is declared and its rules appended, and each
+        removed wrapped chain is declared and then deleted.
+
+        Returns the lines of the script, the rules of the changed chains and
+        the removed chains.
+        """
+        current = table.get_wrapped_chain_rules(
+            table.dirty_chains & table.chains)
+        changed = dict((chain, rules) for chain, rules in current.iteritems()
+                       if table.applied_rules.get(chain) != rules)
+        removed = sorted(chain for chain in table.dirty_chains
+                         if chain not in table.chains and
+                         chain in table.applied_rules)
+        if not changed and not removed:
+            return [], {}, []
+
+        lines = ['*%s' % table_name]
+        lines += [':%s-%s - [0:0]' % (self.wrap_name, chain)
+                  for chain in sorted(changed) + removed]
+        for chain in sorted(changed):
+            lines += changed[chain]
+        lines += ['-X %s-%s' % (self.wrap_name, chain) for chain in removed]
+        lines.append('COMMIT')
+        return lines, changed, removed
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
@@ -48,23 +48,9 @@ class OVSBridge:
     def __init__(self, br_name, root_helper):
         self.br_name = br_name
         self.root_helper = root_helper
-        self.re_id = self.re_compile_id()
         self.defer_apply_flows = False
         self.deferred_flows = {'add': '', 'mod': '', 'del': ''}
 
-    def re_compile_id(self):
-        external = 'external_ids\s*'
-        mac = 'attached-mac="(?P<vif_mac>([a-fA-F\d]{2}:){5}([a-fA-F\d]{2}))"'
-        iface = 'iface-id="(?P<vif_id>[^"]+)"'
-        name = 'name\s*:\s"(?P<port_name>[^"]*)"'
-        port = 'ofport\s*:\s(?P<ofport>-?\d+)'
-        _re = ('%(external)s:\s{ ( %(mac)s,? | %(iface)s,? | . )* }'
-               ' \s+ %(name)s \s+ %(port)s' % {'external': external,
-                                               'mac': mac,
-                                               'iface': iface, 'name': name,
-                                               'port': port})
-        return re.compile(_re, re.M | re.X)
-
     def run_vsctl(self, args):
         full_args = ["ovs-vsctl", "--timeout=2"] + args
         try:
@@ -271,68 +257,76 @@ class OVSBridge:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': args, 'exception': e})
 
+    def _run_vsctl_json(self, args):
+        """Run an ovs-vsctl table command and return its rows."""
+        result = self.run_vsctl(['--format=json', '--'] + args)
+        if not result:
+            return []
+        try:
+            return jsonutils.loads(result)['data']
+        except (ValueError, KeyError) as e:
+            LOG.error(_("Unable to parse ovs-vsctl output %(result)s. "
+                        "Exception: %(exception)s"),
+                      {'result': result, 'exception': e})
+            return []
+
+    def _vif_port_from_row(self, row):
+        """Build a VifPort from a [name, ofport, external_ids] row.
+
+        Returns None if the interface is not a VIF.
+        """
+        name, ofport, external_ids = row
+        external_ids = dict(external_ids[1])
+        if "attached-mac" not in external_ids:
+            return
+        if "iface-id" in external_ids:
+            vif_id = external_ids["iface-id"]
+        elif "xs-vif-uuid" in external_ids:
+            # if this is a xenserver and iface-id is not automatically
+            # synced to OVS from XAPI, we grab it from XAPI directly
+            vif_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+        else:
+            return
+        # An interface without an ofport yet is reported as an empty set
+        if not isinstance(ofport, int):
+            ofport = constants.INVALID_OFPORT
+        return VifPort(name, ofport, vif_id, external_ids["attached-mac"],
+                       self)
+
+    def get_vif_port_snapshot(self):
+        """Return a dict mapping vif id to VifPort for the bridge's VIFs.
+
+        name, ofport and external_ids of all interfaces are fetched with a
+        single 'ovs-vsctl list' call, so the cost does not grow with the
+        number of ports on the bridge.
+        """
+        port_names = set(self.get_port_name_list())
+        rows = self._run_vsctl_json(['--columns=name,ofport,external_ids',
+                                     'list', 'Interface'])
+        snapshot = {}
+        for row in rows:
+            if row[0] not in port_names:
+                continue
+            vif_port = self._vif_port_from_row(row)
+            if vif_port:
+                snapshot[vif_port.vif_id] = vif_port
+        return snapshot
+
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
-        edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-
-        return edge_ports
+        return self.get_vif_port_snapshot().values()
 
     def get_vif_port_set(self):
-        port_names = self.get_port_name_list()
-        edge_ports = set()
-        args = ['--format=json', '--', '--columns=name,external_ids',
-                'list', 'Interface']
-        result = self.run_vsctl(args)
-        if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
-            name = row[0]
-            if name not in port_names:
-                continue
-            external_ids = dict(row[1][1])
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                edge_ports.add(external_ids['iface-id'])
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                edge_ports.add(iface_id)
-        return edge_ports
+        return set(self.get_vif_port_snapshot())
 
     def get_vif_port_by_id(self, port_id):
-        args = ['--', '--columns=external_ids,name,ofport',
-                'find', 'Interface',
-                'external_ids:iface-id="%s"' % port_id]
-        result = self.run_vsctl(args)
-        if not result:
-            return
-        match = self.re_id.search(result)
-        try:
-            vif_mac = match.group('vif_mac')
-            vif_id = match.group('vif_id')
-            port_name = match.group('port_name')
-            ofport = int(match.group('ofport'))
-            return VifPort(port_name, ofport, vif_id, vif_mac, self)
-        except Exception as e:
-            LOG.info(_("Unable to parse regex results. Exception: %s"), e)
-            return
+        rows = self._run_vsctl_json(['--columns=name,ofport,external_ids',
+                                     'find', 'Interface',
+                                     'external_ids:iface-id="%s"' % port_id])
+        for row in rows:
+            vif_port = self._vif_port_from_row(row)
+            if vif_port:
+                return vif_port
 
     def delete_ports(self, all_ports=False):
         if all_ports:
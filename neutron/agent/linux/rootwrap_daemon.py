@@ -0,0 +1,250 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Persistent root wrapper daemon
+
+   Runs commands on behalf of an agent using the same filters as
+   neutron-rootwrap, without paying for an interpreter start and for
+   loading the filters on every call.
+
+   The daemon is started by the agent through the command configured as
+   root_helper_daemon in the [AGENT] section, e.g.:
+   root_helper_daemon=sudo neutron-rootwrap-daemon /etc/neutron/rootwrap.conf
+
+   and the neutron user must be allowed to run it as root in sudoers:
+   neutron ALL = (root) NOPASSWD: /usr/bin/neutron-rootwrap-daemon
+                                   /etc/neutron/rootwrap.conf
+
+   On startup the daemon writes a line of JSON holding the path of its
+   unix socket and a random authentication key to stdout. Each request
+   sent on the socket is a line of JSON holding the key, the command and
+   its input, and is answered by a line of JSON holding the return code,
+   stdout and stderr of the command. The daemon exits when its stdin is
+   closed, i.e. when the agent that started it exits.
+
+   This module is run as root, so it must only depend on the standard
+   library and on the rootwrap filters.
+"""
+
+import ConfigParser
+import json
+import logging
+import os
+import shutil
+import signal
+import SocketServer
+import subprocess
+import sys
+import tempfile
+import threading
+
+from neutron.openstack.common.rootwrap import cmd
+from neutron.openstack.common.rootwrap import wrapper
+
+
+SOCKET_NAME = 'rootwrap.sock'
+AUTHKEY_LENGTH = 32
+
+
+def _subprocess_setup():
+    # Python installs a SIGPIPE handler by default. This is usually not what
+    # non-Python subprocesses expect.
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+
+def encode_data(data):
+    """Make command input or output safe for JSON encoding.
+
+    Commands may read or write arbitrary bytes, so they are carried as
+    latin-1 which maps every byte to a single code point.
+    """
+    if data is None:
+        return None
+    return data.decode('latin-1')
+
+
+def decode_data(data):
+    if data is None:
+        return None
+    return data.encode('latin-1')
+
+
+def _constant_time_compare(first, second):
+    """Compare two strings without leaking where they differ."""
+    if len(first) != len(second):
+        return False
+    result = 0
+    for x, y in zip(first, second):
+        result |= ord(x) ^ ord(y)
+    return result == 0
+
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+                authkey = request['authkey'].encode('ascii')
+                userargs = [arg.encode('utf-8') for arg in request['cmd']]
+                process_input = decode_data(request.get('stdin'))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.server.log_error("Malformed request")
+                return
+            if not _constant_time_compare(authkey, self.server.authkey):
+                self.server.log_error("Unauthenticated request")
+                return
+            returncode, stdout, stderr = self.server.run_command(
+                userargs, process_input)
+            self.wfile.write(json.dumps({'returncode': returncode,
+                                         'stdout': encode_data(stdout),
+                                         'stderr': encode_data(stderr)}))
+            self.wfile.write('\n')
+            self.wfile.flush()
+
+
+class RootwrapDaemon(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer):
+    """Runs the commands allowed by the filters for its clients."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, authkey, execname, config, filters):
+        SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                               _RequestHandler)
+        self.authkey = authkey
+        self.execname = execname
+        self.config = config
+        self.filters = filters
+
+    def log_error(self, message):
+        if self.config.use_syslog:
+            logging.error(message)
+
+    def _error(self, message, returncode):
+        # Report errors the way neutron-rootwrap does, so that callers
+        # see the same output whichever way the command was run.
+        self.log_error(message)
+        return returncode, "%s: %s\n" % (self.execname, message), ''
+
+    def run_command(self, userargs, process_input=None):
+        """Run a command if it matches the filters.
+
+        Returns a tuple of the return code, stdout and stderr.
+        """
+        if not userargs:
+            return self._error("No command specified", cmd.RC_NOCOMMAND)
+        try:
+            filtermatch = wrapper.match_filter(self.filters, userargs,
+                                               exec_dirs=self.config.exec_dirs)
+            command = filtermatch.get_command(userargs,
+                                              exec_dirs=self.config.exec_dirs)
+        except wrapper.FilterMatchNotExecutable as exc:
+            msg = ("Executable not found: %s (filter match = %s)"
+                   % (exc.match.exec_path, exc.match.name))
+            return self._error(msg, cmd.RC_NOEXECFOUND)
+        except wrapper.NoFilterMatched:
+            msg = ("Unauthorized command: %s (no filter matched)"
+                   % ' '.join(userargs))
+            return self._error(msg, cmd.RC_UNAUTHORIZED)
+
+        if self.config.use_syslog:
+            logging.info("Executing %s (filter match = %s)" % (
+                command, filtermatch.name))
+
+        obj = subprocess.Popen(command,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               close_fds=True,
+                               preexec_fn=_subprocess_setup,
+                               env=filtermatch.get_environment(userargs))
+        stdout, stderr = obj.communicate(process_input)
+        return obj.returncode, stdout, stderr
+
+
+def _exit_error(execname, message, errorcode):
+    print >> sys.stderr, "%s: %s" % (execname, message)
+    sys.exit(errorcode)
+
+
+def _restrict_socket(socket_path):
+    # Only the user the daemon runs for may connect; when started through
+    # sudo, that is the user that invoked sudo.
+    os.chmod(socket_path, 0o600)
+    if 'SUDO_UID' in os.environ:
+        os.chown(socket_path, int(os.environ['SUDO_UID']),
+                 int(os.environ.get('SUDO_GID', -1)))
+
+
+def main():
+    execname = sys.argv.pop(0)
+    if len(sys.argv) != 1:
+        _exit_error(execname, "No configuration file specified",
+                    cmd.RC_BADCONFIG)
+    configfile = sys.argv[0]
+
+    try:
+        rawconfig = ConfigParser.RawConfigParser()
+        rawconfig.read(configfile)
+        config = wrapper.RootwrapConfig(rawconfig)
+    except ValueError as exc:
+        msg = "Incorrect value in %s: %s" % (configfile, exc.message)
+        _exit_error(execname, msg, cmd.RC_BADCONFIG)
+    except ConfigParser.Error:
+        _exit_error(execname, "Incorrect configuration file: %s" % configfile,
+                    cmd.RC_BADCONFIG)
+
+    if config.use_syslog:
+        wrapper.setup_syslog(execname,
+                             config.syslog_log_facility,
+                             config.syslog_log_level)
+
+    filters = wrapper.load_filters(config.filters_path)
+
+    temp_dir = tempfile.mkdtemp(prefix='rootwrap-')
+    try:
+        os.chmod(temp_dir, 0o755)
+        socket_path = os.path.join(temp_dir, SOCKET_NAME)
+        authkey = os.urandom(AUTHKEY_LENGTH).encode('hex')
+        server = RootwrapDaemon(socket_path, authkey, execname, config,
+                                filters)
+        _restrict_socket(socket_path)
+
+        # SIGTERM should clean up the socket as well
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+        sys.stdout.write(json.dumps({'socket': socket_path,
+                                     'authkey': authkey}))
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+
+        # Serve until the agent that started us closes our stdin
+        while sys.stdin.read(4096):
+            pass
+
+        server.shutdown()
+        server.server_close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
@@ -24,17 +24,111 @@ import socket
 import struct
 import tempfile
 
+from eventlet.green import socket as green_socket
 from eventlet.green import subprocess
+from eventlet import semaphore
+from oslo.config import cfg
 
+from neutron.agent.common import config
+from neutron.agent.linux import rootwrap_daemon
 from neutron.common import utils
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.register_opts(config.ROOT_HELPER_DAEMON_OPTS, 'AGENT')
 
-def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
+
+class RootwrapDaemonClient(object):
+    """Runs commands through a persistent root helper daemon.
+
+    The daemon is started on first use, and started again if it exits.
+    """
+
+    def __init__(self, daemon_cmd):
+        self.daemon_cmd = daemon_cmd
+        self._process = None
+        self._socket_path = None
+        self._authkey = None
+        self._lock = semaphore.Semaphore()
+
+    def _ensure_daemon(self):
+        with self._lock:
+            if self._process and self._process.poll() is None:
+                return
+            cmd = shlex.split(self.daemon_cmd)
+            LOG.debug(_("Starting root helper daemon: %s"), cmd)
+            self._process = utils.subprocess_popen(cmd,
+                                                   stdin=subprocess.PIPE,
+                                                   stdout=subprocess.PIPE)
+            try:
+                info = jsonutils.loads(self._process.stdout.readline())
+                self._socket_path = info['socket']
+                self._authkey = info['authkey']
+            except (ValueError, KeyError, TypeError):
+                self.stop()
+                raise RuntimeError(_("Unable to start root helper daemon: "
+                                     "%s") % cmd)
+
+    def stop(self):
+        """Stop the daemon by closing its stdin."""
+        process = self._process
+        self._process = None
+        if process:
+            process.stdin.close()
+            process.wait()
+
+    def execute(self, cmd, process_input=None):
+        """Run a command through the daemon.
+
+        Returns a tuple of the return code, stdout and stderr.
+        """
+        self._ensure_daemon()
+        request = {'authkey': self._authkey,
+                   'cmd': cmd,
+                   'stdin': rootwrap_daemon.encode_data(process_input)}
+        sock = green_socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self._socket_path)
+            sock.sendall(jsonutils.dumps(request) + '\n')
+            line = sock.makefile('rb').readline()
+        except socket.error as e:
+            raise RuntimeError(_("Unable to reach root helper daemon: %s")
+                               % e)
+        finally:
+            sock.close()
+        if not line:
+            raise RuntimeError(_("Root helper daemon closed the connection "
+                                 "while running %s") % cmd)
+        response = jsonutils.loads(line)
+        return (response['returncode'],
+                rootwrap_daemon.decode_data(response['stdout']),
+                rootwrap_daemon.decode_data(response['stderr']))
+
+
+_root_helper_daemon_client = None
+
+
+def get_root_helper_daemon_client():
+    """Return the root helper daemon client, or None if not configured."""
+    global _root_helper_daemon_client
+    daemon_cmd = cfg.CONF.AGENT.root_helper_daemon
+    if not daemon_cmd:
+        return None
+    if (_root_helper_daemon_client is None or
+            _root_helper_daemon_client.daemon_cmd != daemon_cmd):
+        _root_helper_daemon_client = RootwrapDaemonClient(daemon_cmd)
+    return _root_helper_daemon_client
+
+
+def create_process(cmd, root_helper=None, addl_env=None):
+    """Create a process object for the given command.
+
+    The return value will be a tuple of the process object and the
+    list of command arguments used to create it.
+    """
     if root_helper:
         cmd = shlex.split(root_helper) + cmd
     cmd = map(str, cmd)
@@ -43,21 +137,45 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
     env = os.environ.copy()
     if addl_env:
         env.update(addl_env)
+
     obj = utils.subprocess_popen(cmd, shell=False,
                                  stdin=subprocess.PIPE,
                                  stdout=subprocess.PIPE,
                                  stderr=subprocess.PIPE,
                                  env=env)
 
-    _stdout, _stderr = (process_input and
-                        obj.communicate(process_input) or
-                        obj.communicate())
-    obj.stdin.close()
+    return obj, cmd
+
+
+def _execute_root_helper_daemon(client, cmd, process_input=None):
+    cmd = map(str, cmd)
+    LOG.debug(_("Running command (root helper daemon): %s"), cmd)
+    returncode, _stdout, _stderr = client.execute(cmd, process_input)
+    return cmd, returncode, _stdout, _stderr
+
+
+def execute(cmd, root_helper=None, process_input=None, addl_env=None,
+            check_exit_code=True, return_stderr=False):
+    daemon_client = root_helper and get_root_helper_daemon_client()
+    if daemon_client:
+        # The daemon runs commands with its own environment, just as
+        # sudo resets the environment of the root helper.
+        cmd, returncode, _stdout, _stderr = _execute_root_helper_daemon(
+            daemon_client, cmd, process_input)
+    else:
+        obj, cmd = create_process(cmd, root_helper=root_helper,
+                                  addl_env=addl_env)
+
+        _stdout, _stderr = (process_input and
+                            obj.communicate(process_input) or
+                            obj.communicate())
+        obj.stdin.close()
+        returncode = obj.returncode
     m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                    'stdout': _stdout, 'stderr': _stderr}
     LOG.debug(m)
-    if obj.returncode and check_exit_code:
+    if returncode and check_exit_code:
         raise RuntimeError(m)
 
     return return_stderr and (_stdout, _stderr) or _stdout
@@ -74,18 +192,35 @@ def get_interface_mac(interface):
                     for char in info[MAC_START:MAC_END]])[:-1]
 
 
-def replace_file(file_name, data):
+def replace_file(file_name, data, tmp_dir=None):
     """Replaces the contents of file_name with data in a safe manner.
 
     First write to a temp file and then rename. Since POSIX renames are
     atomic, the file is unlikely to be corrupted by competing writes.
 
     We create the tempfile on the same device to ensure that it can be renamed.
+    It is created in the directory of file_name unless tmp_dir is given, which
+    must then be on the same device.
     """
 
-    base_dir = os.path.dirname(os.path.abspath(file_name))
+    base_dir = tmp_dir or os.path.dirname(os.path.abspath(file_name))
     tmp_file = tempfile.NamedTemporaryFile('w+', dir=base_dir, delete=False)
     tmp_file.write(data)
     tmp_file.close()
     os.chmod(tmp_file.name, 0o644)
     os.rename(tmp_file.name, file_name)
+
+
+def find_child_pids(pid):
+    """Retrieve a list of the pids of child processes of the given pid."""
+
+    try:
+        raw_pids = execute(['ps', '--ppid', pid, '-o', 'pid='])
+    except RuntimeError as e:
+        # Exception has already been logged by execute
+        no_children_found = 'Exit code: 1' in str(e)
+        if no_children_found:
+            return []
+        # Unexpected errors are the responsibility of the caller
+        raise
+    return [x.strip() for x in raw_pids.split('\n') if x.strip()]
@@ -16,13 +16,16 @@
 #
 # @author: Mark McClain, DreamHost
 
+import collections
 import hashlib
 import hmac
 import os
 import socket
+import time
 import urlparse
 
 import eventlet
+from eventlet import pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -36,6 +39,66 @@ from neutron import wsgi
 LOG = logging.getLogger(__name__)
 
 DEVICE_OWNER_ROUTER_INTF = "network:router_interface"
+# Maximum number of clients kept open to the Neutron and Nova services
+CONNECTION_POOL_SIZE = 32
+
+
+class LookupCache(object):
+    """LRU cache of lookup results, which expire after ttl seconds.
+
+    Hits and misses are counted, a ttl or size of 0 disables the cache.
+    """
+
+    def __init__(self, ttl, size, timer=time.time):
+        self.ttl = ttl
+        self.size = size
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry time, value, use count)
+        self._entries = {}
+        # (key, use count) for each use, oldest first; the ones whose use
+        # count no longer matches the entry are stale and skipped
+        self._uses = collections.deque()
+        self._use_count = 0
+
+    def _use(self, key, expiry, value):
+        self._use_count += 1
+        self._entries[key] = (expiry, value, self._use_count)
+        self._uses.append((key, self._use_count))
+        if len(self._uses) > 2 * max(self.size, len(self._entries)):
+            self._uses = collections.deque(
+                (k, e[2]) for k, e in sorted(self._entries.iteritems(),
+                                             key=lambda item: item[1][2]))
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.timer():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        # mark the entry as the most recently used one
+        self._use(key, entry[0], entry[1])
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.size <= 0:
+            return
+        self._use(key, self.timer() + self.ttl, value)
+        while len(self._entries) > self.size:
+            key, use_count = self._uses.popleft()
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] == use_count:
+                del self._entries[key]
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries)}
 
 
 class MetadataProxyHandler(object):
@@ -65,12 +128,33 @@ class MetadataProxyHandler(object):
         cfg.StrOpt('metadata_proxy_shared_secret',
                    default='',
                    help=_('Shared secret to sign instance-id request'),
-                   secret=True)
+                   secret=True),
+        cfg.IntOpt('metadata_cache_ttl', default=5,
+                   help=_("Number of seconds the instance and router "
+                          "network lookups are cached for, 0 disables "
+                          "the cache.")),
+        cfg.IntOpt('metadata_cache_size', default=1000,
+                   help=_("Maximum number of entries of each lookup "
+                          "cache.")),
     ]
 
     def __init__(self, conf):
         self.conf = conf
         self.auth_info = {}
+        # (router or network id, instance ip address) -> instance id
+        self.instance_cache = LookupCache(conf.metadata_cache_ttl,
+                                          conf.metadata_cache_size)
+        # router id -> ids of the networks the router is attached to
+        self.networks_cache = LookupCache(conf.metadata_cache_ttl,
+                                          conf.metadata_cache_size)
+        self.client_pool = pools.Pool(max_size=CONNECTION_POOL_SIZE,
+                                      create=self._get_neutron_client)
+        self.http_pool = pools.Pool(max_size=CONNECTION_POOL_SIZE,
+                                    create=lambda: httplib2.Http())
+
+    def cache_stats(self):
+        return {'instance_id': self.instance_cache.stats(),
+                'router_networks': self.networks_cache.stats()}
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -104,27 +188,54 @@ class MetadataProxyHandler(object):
             return webob.exc.HTTPInternalServerError(explanation=unicode(msg))
 
     def _get_instance_id(self, req):
-        qclient = self._get_neutron_client()
-
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Neutron-Network-ID')
         router_id = req.headers.get('X-Neutron-Router-ID')
 
-        if network_id:
-            networks = [network_id]
-        else:
-            internal_ports = qclient.list_ports(
-                device_id=router_id,
-                device_owner=DEVICE_OWNER_ROUTER_INTF)['ports']
-
-            networks = [p['network_id'] for p in internal_ports]
-
+        cache_key = (router_id or network_id, remote_address)
+        instance_id = self.instance_cache.get(cache_key)
+        if instance_id:
+            return instance_id
+        LOG.debug(_("Instance lookup cache miss for %(key)s, cache "
+                    "stats: %(stats)s"),
+                  {'key': cache_key, 'stats': self.cache_stats()})
+
+        with self.client_pool.item() as qclient:
+            if network_id:
+                instance_id = self._get_instance_id_on_networks(
+                    qclient, [network_id], remote_address)
+            else:
+                networks = self.networks_cache.get(router_id)
+                if networks is not None:
+                    instance_id = self._get_instance_id_on_networks(
+                        qclient, networks, remote_address)
+                    if not instance_id:
+                        # The router may have been attached to the network
+                        # of the instance since the networks were cached.
+                        self.networks_cache.invalidate(router_id)
+                        networks = None
+                if networks is None:
+                    networks = self._get_router_networks(qclient, router_id)
+                    self.networks_cache.set(router_id, networks)
+                    instance_id = self._get_instance_id_on_networks(
+                        qclient, networks, remote_address)
+
+            self.auth_info = qclient.get_auth_info()
+
+        if instance_id:
+            self.instance_cache.set(cache_key, instance_id)
+        return instance_id
+
+    def _get_router_networks(self, qclient, router_id):
+        internal_ports = qclient.list_ports(
+            device_id=router_id,
+            device_owner=DEVICE_OWNER_ROUTER_INTF)['ports']
+        return [p['network_id'] for p in internal_ports]
+
+    def _get_instance_id_on_networks(self, qclient, networks, remote_address):
         ports = qclient.list_ports(
             network_id=networks,
             fixed_ips=['ip_address=%s' % remote_address])['ports']
-
-        self.auth_info = qclient.get_auth_info()
-
         if len(ports) == 1:
             return ports[0]['device_id']
 
@@ -143,9 +254,10 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        # The connections to Nova are kept open by the pooled clients
+        with self.http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -79,6 +79,8 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - Added get_devices_details_list, update_devices_down and
+              update_devices_up.
 
     '''
 
@@ -94,18 +96,39 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        return self.call(context,
+                         self.make_msg('get_devices_details_list',
+                                       devices=devices,
+                                       agent_id=agent_id),
+                         topic=self.topic, version='1.2')
+
     def update_device_down(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def update_devices_down(self, context, devices, agent_id):
+        return self.call(context,
+                         self.make_msg('update_devices_down',
+                                       devices=devices,
+                                       agent_id=agent_id),
+                         topic=self.topic, version='1.2')
+
     def update_device_up(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_up', device=device,
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def update_devices_up(self, context, devices, agent_id):
+        return self.call(context,
+                         self.make_msg('update_devices_up',
+                                       devices=devices,
+                                       agent_id=agent_id),
+                         topic=self.topic, version='1.2')
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         return self.call(context,
                          self.make_msg('tunnel_sync', tunnel_ip=tunnel_ip,
@@ -16,20 +16,31 @@
 #    under the License.
 #
 
+import netaddr
 from oslo.config import cfg
 
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common.rpc import common as rpc_common
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
 
+DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
+                       'egress': 'dest_ip_prefix'}
+
 security_group_opts = [
     cfg.StrOpt(
         'firewall_driver',
         default='neutron.agent.firewall.NoopFirewallDriver',
-        help=_('Driver for Security Groups Firewall'))
+        help=_('Driver for Security Groups Firewall')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Match the members of remote security groups with one ipset '
+               'per group and ethertype instead of one iptables rule per '
+               'member. Only supported by the iptables firewall drivers.'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -48,16 +59,45 @@ def disable_security_group_extension_if_noop_driver(
 
 class SecurityGroupServerRpcApiMixin(object):
     """A mix-in that enable SecurityGroup support in plugin rpc."""
-    def security_group_rules_for_devices(self, context, devices):
+    def security_group_rules_for_devices(self, context, devices,
+                                         expand_remote_groups=True):
+        """Get the security group rules of devices.
+
+        Unless expand_remote_groups is set, rules with a remote group are
+        not converted to one rule per member of the group, and the members
+        are returned in the security_group_member_ips of each device.
+        """
         LOG.debug(_("Get security group rules "
                     "for devices via rpc %r"), devices)
+        kwargs = {'devices': devices}
+        if not expand_remote_groups:
+            kwargs['expand_remote_groups'] = False
         return self.call(context,
                          self.make_msg('security_group_rules_for_devices',
+                                       **kwargs),
+                         version=SG_RPC_VERSION,
+                         topic=self.topic)
+
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
                                        devices=devices),
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
 
+def _is_unsupported_call(error):
+    """Whether an RPC error tells the server doesn't support the call."""
+    if isinstance(error, rpc_common.UnsupportedRpcVersion):
+        return True
+    if error.exc_type == 'UnsupportedRpcVersion':
+        return True
+    return (error.exc_type == 'AttributeError' and
+            'No such RPC function' in str(error.value))
+
+
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
     support in agent implementations.
@@ -95,18 +135,34 @@ class SecurityGroupAgentRpcMixin(object):
     """A mix-in that enable SecurityGroup agent
     support in agent implementations.
     """
+    # Whether the server supports security_group_info_for_devices,
+    # None until it is found out by the first call
+    use_enhanced_rpc = None
 
-    def init_firewall(self):
+    def init_firewall(self, defer_refresh_firewall=False):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug(_("Init firewall settings (driver=%s)"), firewall_driver)
         self.firewall = importutils.import_object(firewall_driver)
+        # When refreshes are deferred, updates notified by the server are
+        # only recorded, and applied together by refresh_deferred_firewall
+        # which the agent loop calls.
+        self.defer_refresh_firewall = defer_refresh_firewall
+        self.devices_to_refilter = set()
+        self.updated_member_groups = set()
+        self.global_refresh_firewall = False
+        # What security_group_info_for_devices returned: the rules of each
+        # security group, the member ips of each remote group and the
+        # devices, indexed by security group.
+        self.sg_rules = {}
+        self.sg_member_ips = {}
+        self.sg_devices = {}
+        self.devices_info = {}
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._security_group_rules_for_devices(list(device_ids))
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
@@ -114,30 +170,228 @@ class SecurityGroupAgentRpcMixin(object):
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_("Security group "
                    "rule updated %r"), security_groups)
-        self._security_group_updated(
-            security_groups,
-            'security_groups')
+        if self.defer_refresh_firewall:
+            self.devices_to_refilter.update(
+                device['device'] for device in self._devices_in_groups(
+                    security_groups, 'security_groups'))
+        else:
+            self._security_group_updated(
+                security_groups,
+                'security_groups')
 
     def security_groups_member_updated(self, security_groups):
         LOG.info(_("Security group "
                    "member updated %r"), security_groups)
-        self._security_group_updated(
-            security_groups,
-            'security_group_source_groups')
-
-    def _security_group_updated(self, security_groups, attribute):
-        devices = []
-        sec_grp_set = set(security_groups)
+        if self.defer_refresh_firewall:
+            self.updated_member_groups.update(security_groups)
+        elif cfg.CONF.SECURITYGROUP.enable_ipset:
+            self._update_ipset_members(security_groups)
+        elif self.use_enhanced_rpc:
+            with self.firewall.defer_apply():
+                self._update_member_ips(security_groups)
+        else:
+            self._security_group_updated(
+                security_groups,
+                'security_group_source_groups')
+
+    def _security_group_rules_for_devices(self, device_ids):
+        expand_remote_groups = not cfg.CONF.SECURITYGROUP.enable_ipset
+        if self.use_enhanced_rpc is not False:
+            try:
+                sg_info = self.plugin_rpc.security_group_info_for_devices(
+                    self.context, device_ids)
+            except (rpc_common.RemoteError,
+                    rpc_common.UnsupportedRpcVersion) as e:
+                if self.use_enhanced_rpc or not _is_unsupported_call(e):
+                    raise
+                LOG.warn(_("security_group_info_for_devices is not "
+                           "supported by the server, falling back to "
+                           "security_group_rules_for_devices"))
+                self.use_enhanced_rpc = False
+            else:
+                self.use_enhanced_rpc = True
+                self._update_security_group_info(sg_info)
+                return self._devices_from_security_group_info(
+                    sg_info, expand_remote_groups)
+        return self.plugin_rpc.security_group_rules_for_devices(
+            self.context, device_ids,
+            expand_remote_groups=expand_remote_groups)
+
+    def _update_security_group_info(self, sg_info):
+        for device in sg_info['devices'].values():
+            self._remove_device_info(device['device'])
+        self.sg_rules.update(sg_info['security_groups'])
+        self.sg_member_ips.update(sg_info['sg_member_ips'])
+        for device in sg_info['devices'].values():
+            self.devices_info[device['device']] = device
+            for sg_id in device.get('security_groups', []):
+                self.sg_devices.setdefault(sg_id, set()).add(
+                    device['device'])
+
+    def _remove_device_info(self, device_id):
+        device = self.devices_info.pop(device_id, None)
+        if not device:
+            return
+        for sg_id in device.get('security_groups', []):
+            sg_devices = self.sg_devices.get(sg_id, set())
+            sg_devices.discard(device_id)
+            if not sg_devices:
+                self.sg_devices.pop(sg_id, None)
+                self.sg_rules.pop(sg_id, None)
+
+    def _devices_from_security_group_info(self, sg_info,
+                                          expand_remote_groups):
+        """Build the rules of each device from the rules of its groups.
+
+        Returns the devices the way security_group_rules_for_devices does.
+        """
+        security_groups = sg_info['security_groups']
+        sg_member_ips = sg_info['sg_member_ips']
+        devices = {}
+        for key, device_info in sg_info['devices'].iteritems():
+            device = dict(device_info)
+            rules = []
+            device['security_group_source_groups'] = []
+            if not expand_remote_groups:
+                device['security_group_member_ips'] = {}
+            for sg_id in device.get('security_groups', []):
+                for rule in security_groups.get(sg_id, []):
+                    remote_group_id = rule.get('remote_group_id')
+                    if not remote_group_id:
+                        rules.append(rule.copy())
+                        continue
+                    device['security_group_source_groups'].append(
+                        remote_group_id)
+                    member_ips = sg_member_ips.get(remote_group_id, [])
+                    if not expand_remote_groups:
+                        rules.append(rule.copy())
+                        device['security_group_member_ips'][
+                            remote_group_id] = member_ips
+                        continue
+                    rules += self._expand_remote_group_rule(
+                        device, rule, member_ips)
+            # provider rules come after the security group rules
+            device['security_group_rules'] = (
+                rules + device.get('security_group_rules', []))
+            devices[key] = device
+        return devices
+
+    def _expand_remote_group_rule(self, device, rule, member_ips):
+        direction_ip_prefix = DIRECTION_IP_PREFIX[rule['direction']]
+        rules = []
+        for ip in member_ips:
+            if ip in device.get('fixed_ips', []):
+                continue
+            ip_network = netaddr.IPNetwork(ip)
+            if rule['ethertype'] != 'IPv%s' % ip_network.version:
+                continue
+            ip_rule = rule.copy()
+            ip_rule[direction_ip_prefix] = str(ip_network.cidr)
+            rules.append(ip_rule)
+        return rules
+
+    def _update_ipset_members(self, security_groups):
+        # Members of remote groups are matched with ipsets, so only the
+        # sets need updating. Any device referencing a group gets its
+        # members, so fetch a single device per group.
+        device_ids = {}
         for device in self.firewall.ports.values():
-            if sec_grp_set & set(device.get(attribute, [])):
-                devices.append(device)
+            for sg_id in device.get('security_group_source_groups', []):
+                if sg_id in security_groups and sg_id not in device_ids:
+                    device_ids[sg_id] = device['device']
+        if not device_ids:
+            return
+        devices = self._security_group_rules_for_devices(
+            list(set(device_ids.values())))
+        for sg_id in device_ids:
+            for device in devices.values():
+                member_ips = device.get('security_group_member_ips', {})
+                if sg_id in member_ips:
+                    self.firewall.update_security_group_members(
+                        sg_id, member_ips[sg_id])
+                    break
+
+    def _devices_referencing_remote_groups(self, remote_group_ids):
+        """Return {remote_group_id: filtered device ids referencing it}."""
+        filtered_ports = self.firewall.ports
+        devices = {}
+        for sg_id, rules in self.sg_rules.iteritems():
+            sg_device_ids = set(device_id for device_id
+                                in self.sg_devices.get(sg_id, [])
+                                if device_id in filtered_ports)
+            for rule in rules:
+                remote_group_id = rule.get('remote_group_id')
+                if remote_group_id in remote_group_ids:
+                    devices.setdefault(remote_group_id, set()).update(
+                        sg_device_ids)
+        return devices
+
+    def _update_member_ips(self, security_groups):
+        """Apply the member changes of remote groups to their users.
+
+        The new members are fetched with a single device referencing each
+        updated group, then the rules of the devices referencing a group
+        whose members actually changed are rebuilt from the known rules.
+        """
+        remote_group_devices = self._devices_referencing_remote_groups(
+            set(security_groups))
+        remote_group_devices = dict(
+            (sg_id, device_ids)
+            for sg_id, device_ids in remote_group_devices.iteritems()
+            if device_ids)
+        if not remote_group_devices:
+            return
+        old_member_ips = dict((sg_id, set(self.sg_member_ips.get(sg_id, [])))
+                              for sg_id in remote_group_devices)
+        sample_device_ids = set(list(device_ids)[0] for device_ids
+                                in remote_group_devices.values())
+        sg_info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, list(sample_device_ids))
+        self._update_security_group_info(sg_info)
+
+        device_ids = set()
+        missing_device_ids = set()
+        for sg_id, sg_device_ids in remote_group_devices.iteritems():
+            member_ips = sg_info['sg_member_ips'].get(sg_id)
+            if member_ips is None:
+                # The sampled device is gone, fetch each device instead
+                missing_device_ids |= sg_device_ids
+            elif set(member_ips) != old_member_ips[sg_id]:
+                device_ids |= sg_device_ids
+        if missing_device_ids:
+            self._refresh_devices(list(missing_device_ids))
+        device_ids -= missing_device_ids
+        if not device_ids:
+            LOG.debug(_("Members of security groups %s did not change"),
+                      security_groups)
+            return
+        devices = self._devices_from_security_group_info(
+            {'security_groups': self.sg_rules,
+             'sg_member_ips': self.sg_member_ips,
+             'devices': dict((device_id, self.devices_info[device_id])
+                             for device_id in device_ids
+                             if device_id in self.devices_info)},
+            expand_remote_groups=True)
+        for device in devices.values():
+            LOG.debug(_("Update port filter for %s"), device['device'])
+            self.firewall.update_port_filter(device)
+
+    def _devices_in_groups(self, security_groups, attribute):
+        sec_grp_set = set(security_groups)
+        return [device for device in self.firewall.ports.values()
+                if sec_grp_set & set(device.get(attribute, []))]
 
+    def _security_group_updated(self, security_groups, attribute):
+        devices = self._devices_in_groups(security_groups, attribute)
         if devices:
             self.refresh_firewall(devices)
 
     def security_groups_provider_updated(self):
         LOG.info(_("Provider rule updated"))
-        self.refresh_firewall()
+        if self.defer_refresh_firewall:
+            self.global_refresh_firewall = True
+        else:
+            self.refresh_firewall()
 
     def remove_devices_filter(self, device_ids):
         if not device_ids:
@@ -145,6 +399,7 @@ class SecurityGroupAgentRpcMixin(object):
         LOG.info(_("Remove device filter for %r"), device_ids)
         with self.firewall.defer_apply():
             for device_id in device_ids:
+                self._remove_device_info(device_id)
                 device = self.firewall.ports.get(device_id)
                 if not device:
                     continue
@@ -160,12 +415,47 @@ class SecurityGroupAgentRpcMixin(object):
         if not device_ids:
             LOG.info(_("No ports here to refresh firewall"))
             return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
         with self.firewall.defer_apply():
-            for device in devices.values():
-                LOG.debug(_("Update port filter for %s"), device['device'])
-                self.firewall.update_port_filter(device)
+            self._refresh_devices(device_ids)
+
+    def _refresh_devices(self, device_ids):
+        devices = self._security_group_rules_for_devices(device_ids)
+        for device in devices.values():
+            LOG.debug(_("Update port filter for %s"), device['device'])
+            self.firewall.update_port_filter(device)
+
+    def refresh_deferred_firewall(self):
+        """Apply the updates recorded since the previous call at once.
+
+        Called by the agent loop when defer_refresh_firewall is set, so
+        that a burst of notifications results in a single refresh.
+        """
+        if self.global_refresh_firewall:
+            self.global_refresh_firewall = False
+            self.devices_to_refilter = set()
+            self.updated_member_groups = set()
+            self.refresh_firewall()
+            return
+        if not (self.devices_to_refilter or self.updated_member_groups):
+            return
+        device_ids = self.devices_to_refilter & set(self.firewall.ports)
+        member_groups = self.updated_member_groups
+        self.devices_to_refilter = set()
+        self.updated_member_groups = set()
+        LOG.info(_("Refresh firewall rules"))
+        with self.firewall.defer_apply():
+            if member_groups:
+                if cfg.CONF.SECURITYGROUP.enable_ipset:
+                    self._update_ipset_members(member_groups)
+                elif self.use_enhanced_rpc:
+                    self._update_member_ips(member_groups)
+                else:
+                    device_ids.update(
+                        device['device'] for device in
+                        self._devices_in_groups(
+                            member_groups, 'security_group_source_groups'))
+            if device_ids:
+                self._refresh_devices(list(device_ids))
 
 
 class SecurityGroupAgentRpcApiMixin(object):
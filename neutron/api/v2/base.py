@@ -67,6 +67,10 @@ class Controller(object):
         self._native_sorting = self._is_native_sorting_supported()
         self._policy_attrs = [name for (name, info) in self._attr_info.items()
                               if info.get('required_by_policy')]
+        # roles -> attributes visible in every object, and attributes
+        # checked for each object, for the current policy rules
+        self._visibility_plans = {}
+        self._visibility_rules = None
         self._publisher_id = notifier_api.publisher_id('network')
         self._dhcp_agent_notifier = dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
         self._member_actions = member_actions
@@ -117,41 +121,75 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
-    def _is_visible(self, context, attr_name, data):
-        action = "%s:%s" % (self._plugin_handlers[self.SHOW], attr_name)
-        # Optimistically init authz_check to True
-        authz_check = True
-        try:
-            attr = (attributes.RESOURCE_ATTRIBUTE_MAP
-                    [self._collection].get(attr_name))
-            if attr and attr.get('enforce_policy'):
-                authz_check = policy.check_if_exists(
-                    context, action, data)
-        except KeyError:
+    def _compile_visibility_plan(self, context):
+        """Split the visible attributes for the roles of the context.
+
+        Returns the set of attributes visible in every object, and the list
+        of (attribute, action) pairs which must be authorized for each object.
+        """
+        visible = set()
+        checked = []
+        resource_attrs = attributes.RESOURCE_ATTRIBUTE_MAP.get(
+            self._collection)
+        if resource_attrs is None:
             # The extension was not configured for adding its resources
             # to the global resource attribute map. Policy check should
             # not be performed
-            LOG.debug(_("The resource %(resource)s was not found in the "
+            LOG.debug(_("The resource %s was not found in the "
                         "RESOURCE_ATTRIBUTE_MAP; unable to perform authZ "
-                        "check for attribute %(attr)s"),
-                      {'resource': self._collection,
-                       'attr': attr_name})
-        except exceptions.PolicyRuleNotFound:
-            LOG.debug(_("Policy rule:%(action)s not found. Assuming no "
-                        "authZ check is defined for %(attr)s"),
-                      {'action': action,
-                       'attr': attr_name})
-        attr_val = self._attr_info.get(attr_name)
-        return attr_val and attr_val['is_visible'] and authz_check
+                        "check for its attributes"), self._collection)
+            resource_attrs = {}
+        for attr_name, attr_info in self._attr_info.iteritems():
+            if not attr_info.get('is_visible'):
+                continue
+            attr = resource_attrs.get(attr_name)
+            if not (attr and attr.get('enforce_policy')):
+                visible.add(attr_name)
+                continue
+            action = "%s:%s" % (self._plugin_handlers[self.SHOW], attr_name)
+            try:
+                authz_check = policy.check_without_target(context, action)
+            except exceptions.PolicyRuleNotFound:
+                LOG.debug(_("Policy rule:%(action)s not found. Assuming no "
+                            "authZ check is defined for %(attr)s"),
+                          {'action': action,
+                           'attr': attr_name})
+                authz_check = True
+            if authz_check is None:
+                checked.append((attr_name, action))
+            elif authz_check:
+                visible.add(attr_name)
+        return visible, checked
+
+    def _get_visibility_plan(self, context):
+        rules = policy.get_loaded_rules()
+        if rules is not self._visibility_rules:
+            # The policies have been reloaded
+            self._visibility_plans = {}
+            self._visibility_rules = rules
+        roles = frozenset(context.roles)
+        plan = self._visibility_plans.get(roles)
+        if plan is None:
+            plan = self._compile_visibility_plan(context)
+            # Compiling the plan may have loaded the policies
+            if policy.get_loaded_rules() is self._visibility_rules:
+                self._visibility_plans[roles] = plan
+        return plan
 
     def _view(self, context, data, fields_to_strip=None):
         # make sure fields_to_strip is iterable
         if not fields_to_strip:
             fields_to_strip = []
 
-        return dict(item for item in data.iteritems()
-                    if (self._is_visible(context, item[0], data) and
-                        item[0] not in fields_to_strip))
+        visible, checked = self._get_visibility_plan(context)
+        result = dict(item for item in data.iteritems()
+                      if (item[0] in visible and
+                          item[0] not in fields_to_strip))
+        for attr_name, action in checked:
+            if (attr_name in data and attr_name not in fields_to_strip and
+                    policy.check(context, action, data)):
+                result[attr_name] = data[attr_name]
+        return result
 
     def _do_field_list(self, original_fields):
         fields_to_add = None
@@ -232,6 +270,9 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
+            policy.prefetch_parent_resources(request.context,
+                                             self._plugin_handlers[self.SHOW],
+                                             obj_list)
             obj_list = [obj for obj in obj_list
                         if policy.check(request.context,
                                         self._plugin_handlers[self.SHOW],
@@ -349,9 +390,15 @@ class Controller(object):
         else:
             items = [body]
             bulk = False
+        if bulk:
+            policy.prefetch_parent_resources(
+                request.context, action,
+                [item[self._resource] for item in items])
+        networks = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
-                                                    item[self._resource])
+                                                    item[self._resource],
+                                                    networks)
             policy.enforce(request.context,
                            action,
                            item[self._resource])
@@ -601,14 +648,20 @@ class Controller(object):
             msg = _("Unrecognized attribute(s) '%s'") % ', '.join(extra_keys)
             raise webob.exc.HTTPBadRequest(msg)
 
-    def _validate_network_tenant_ownership(self, request, resource_item):
+    def _validate_network_tenant_ownership(self, request, resource_item,
+                                           networks=None):
         # TODO(salvatore-orlando): consider whether this check can be folded
         # in the policy engine
         if self._resource not in ('port', 'subnet'):
             return
-        network = self._plugin.get_network(
-            request.context,
-            resource_item['network_id'])
+        network_id = resource_item['network_id']
+        if networks is not None and network_id in networks:
+            network = networks[network_id]
+        else:
+            network = self._plugin.get_network(request.context, network_id)
+            if networks is not None:
+                # bulk requests often create items on the same network
+                networks[network_id] = network
         # do not perform the check on shared networks
         if network.get('shared'):
             return
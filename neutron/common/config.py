@@ -71,6 +71,13 @@ core_opts = [
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ipam_driver',
+               default='neutron.db.ipam.AvailabilityRangeIpamDriver',
+               help=_("The driver used to allocate IP addresses to ports")),
+    cfg.IntOpt('ip_allocation_attempts', default=3,
+               help=_("Number of times random IP address candidates are "
+                      "drawn by the RandomIpamDriver before looking for "
+                      "the first free address")),
     cfg.IntOpt('dhcp_lease_duration', default=86400,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration")),
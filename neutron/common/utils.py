@@ -205,3 +205,13 @@ def log_opt_values(log):
 
 def is_valid_vlan_tag(vlan):
     return q_const.MIN_VLAN_TAG <= vlan <= q_const.MAX_VLAN_TAG
+
+
+def split_list(items, size):
+    """Split a list into consecutive chunks of at most size items.
+
+    A size of 0 or less returns the whole list as a single chunk.
+    """
+    if size <= 0:
+        return [items] if items else []
+    return [items[i:i + size] for i in xrange(0, len(items), size)]
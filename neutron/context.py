@@ -55,6 +55,9 @@ class ContextBase(common_context.RequestContext):
             timestamp = datetime.utcnow()
         self.timestamp = timestamp
         self._session = None
+        # Parent resource fields fetched by the policy engine for this
+        # request, by (resource, id, field)
+        self.owner_cache = {}
         self.roles = roles or []
         if self.is_admin is None:
             self.is_admin = policy.check_is_admin(self)
@@ -43,6 +43,15 @@ def clear_db(base=BASE):
     session.cleanup()
 
 
+def dispose_db():
+    """Close the connections of the engine pool.
+
+    Processes forked afterwards open their own connections instead of
+    sharing the ones of their parent.
+    """
+    session.get_engine(sqlite_fk=True).pool.dispose()
+
+
 def get_session(autocommit=True, expire_on_commit=False):
     """Helper method to grab session."""
     return session.get_session(autocommit=autocommit,
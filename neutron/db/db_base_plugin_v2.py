@@ -27,6 +27,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as q_exc
 from neutron.db import api as db
+from neutron.db import ipam
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron import neutron_plugin_base_v2
@@ -283,16 +284,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -309,6 +314,32 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   max_retries)
         raise q_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _generate_macs(context, network_id, count, exclude=()):
+        """Generate count MAC addresses which are unique on the network.
+
+        The candidates of each attempt are checked with a single query.
+        """
+        max_retries = cfg.CONF.mac_generation_retries
+        mac_addresses = set()
+        for i in range(max_retries):
+            candidates = set(NeutronDbPluginV2._random_mac()
+                             for j in range(count - len(mac_addresses)))
+            candidates -= mac_addresses
+            candidates -= set(exclude)
+            candidates -= NeutronDbPluginV2._get_used_macs(
+                context, network_id, candidates)
+            mac_addresses |= candidates
+            if len(mac_addresses) == count:
+                LOG.debug(_("Generated %(count)d macs for network "
+                            "%(network_id)s"),
+                          {'count': count, 'network_id': network_id})
+                return list(mac_addresses)
+        LOG.error(_("Unable to generate %(count)d mac addresses after "
+                    "%(max_retries)s attempts"),
+                  {'count': count, 'max_retries': max_retries})
+        raise q_exc.MacAddressGenerationFailure(net_id=network_id)
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -319,90 +350,24 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             return True
         return False
 
+    @staticmethod
+    def _get_used_macs(context, network_id, mac_addresses):
+        """Return those of the MAC addresses in use on the network."""
+        if not mac_addresses:
+            return set()
+        mac_qry = context.session.query(models_v2.Port.mac_address)
+        mac_qry = mac_qry.filter(
+            models_v2.Port.network_id == network_id,
+            models_v2.Port.mac_address.in_(mac_addresses))
+        return set(row[0] for row in mac_qry)
+
     @staticmethod
     def _recycle_ip(context, network_id, subnet_id, ip_address):
         """Return an IP address to the pool of free IP's on the network
         subnet.
         """
-        # Grab all allocation pools for the subnet
-        allocation_pools = (context.session.query(
-            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id).
-            options(orm.joinedload('available_ranges', innerjoin=True)).
-            with_lockmode('update'))
-
-        # Find the allocation pool for the IP to recycle
-        pool_id = None
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
-                break
-        if not pool_id:
-            NeutronDbPluginV2._delete_ip_allocation(
-                context, network_id, subnet_id, ip_address)
-            return
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
-        LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
-        NeutronDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
-                                                ip_address)
+        ipam.get_driver().recycle_ip(context, network_id, subnet_id,
+                                     ip_address)
 
     def update_fixed_ip_lease_expiration(self, context, network_id,
                                          ip_address, lease_remaining):
@@ -425,18 +390,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     @staticmethod
     def _delete_ip_allocation(context, network_id, subnet_id, ip_address):
-
-        # Delete the IP address from the IPAllocate table
-        LOG.debug(_("Delete allocated IP %(ip_address)s "
-                    "(%(network_id)s/%(subnet_id)s)"),
-                  {'ip_address': ip_address,
-                   'network_id': network_id,
-                   'subnet_id': subnet_id})
-        alloc_qry = context.session.query(
-            models_v2.IPAllocation).with_lockmode('update')
-        alloc_qry.filter_by(network_id=network_id,
-                            ip_address=ip_address,
-                            subnet_id=subnet_id).delete()
+        ipam.delete_ip_allocation(context, network_id, subnet_id, ip_address)
 
     @staticmethod
     def _generate_ip(context, subnets):
@@ -445,65 +399,25 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
-        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+        return ipam.get_driver().generate_ip(context, subnets)
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id)
-        for range in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=range['allocation_pool_id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam.get_driver().allocate_specific_ip(context, subnet_id, ip_address)
+
+    @staticmethod
+    def _store_ip_allocation(context, ip_address, network_id, subnet_id,
+                             port_id):
+        LOG.debug(_("Allocated IP %(ip_address)s "
+                    "(%(network_id)s/%(subnet_id)s/%(port_id)s)"),
+                  {'ip_address': ip_address,
+                   'network_id': network_id,
+                   'subnet_id': subnet_id,
+                   'port_id': port_id})
+        return ipam.get_driver().store_allocation(context, network_id,
+                                                  subnet_id, ip_address,
+                                                  port_id)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -544,16 +458,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             return False
 
         # Check if the requested IP is in a defined allocation pool
-        pool_qry = context.session.query(models_v2.IPAllocationPool)
-        allocation_pools = pool_qry.filter_by(subnet_id=subnet_id)
-        ip = netaddr.IPAddress(ip_address)
-        for allocation_pool in allocation_pools:
-            allocation_pool_range = netaddr.IPRange(
-                allocation_pool['first_ip'],
-                allocation_pool['last_ip'])
-            if ip in allocation_pool_range:
-                return True
-        return False
+        value = models_v2.ip_to_value(ip_address)
+        pool_qry = context.session.query(models_v2.IPAllocationPool.id)
+        allocation_pool = pool_qry.filter(
+            models_v2.IPAllocationPool.subnet_id == subnet_id,
+            models_v2.IPAllocationPool.first_ip_value <= value,
+            models_v2.IPAllocationPool.last_ip_value >= value).first()
+        return allocation_pool is not None
 
     def _test_fixed_ips_for_port(self, context, network_id, fixed_ips):
         """Test fixed IPs for port.
@@ -622,12 +533,29 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     def _allocate_fixed_ips(self, context, network, fixed_ips):
         """Allocate IP addresses according to the configured fixed_ips."""
-        ips = []
+        self._allocate_requested_ips(context, fixed_ips)
+        return self._generate_fixed_ips(context, fixed_ips)
+
+    @staticmethod
+    def _allocate_requested_ips(context, fixed_ips):
+        """Remove the IP addresses of the fixed_ips from the free ones.
+
+        This is done before generating any IP address, which could otherwise
+        be one of the requested addresses.
+        """
         for fixed in fixed_ips:
             if 'ip_address' in fixed:
-                # Remove the IP address from the allocation pool
                 NeutronDbPluginV2._allocate_specific_ip(
                     context, fixed['subnet_id'], fixed['ip_address'])
+
+    def _generate_fixed_ips(self, context, fixed_ips):
+        """Return the IP addresses of the fixed_ips, generating missing ones.
+
+        The requested IP addresses must have been allocated already.
+        """
+        ips = []
+        for fixed in fixed_ips:
+            if 'ip_address' in fixed:
                 ips.append({'ip_address': fixed['ip_address'],
                             'subnet_id': fixed['subnet_id']})
             # Only subnet ID is specified => need to generate IP
@@ -1290,8 +1218,145 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._get_collection_count(context, models_v2.Subnet,
                                           filters=filters)
 
+    def _uses_create_port_of(self, plugin_class):
+        """Return True if create_port is the one of plugin_class.
+
+        The bulk creation of ports bypasses create_port, it is only done
+        when create_port has not been overridden by a subclass.
+        """
+        create_port = getattr(self.create_port, 'im_func', None)
+        return create_port is plugin_class.create_port.im_func
+
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        if not self._uses_create_port_of(NeutronDbPluginV2):
+            return self._create_bulk('port', context, ports)
+        return self._create_ports_bulk(context, ports['ports'])
+
+    def _create_ports_bulk(self, context, ports):
+        """Create ports in the database, allocating MACs and IPs in bulk.
+
+        The MAC addresses of the ports of a network are checked with a
+        single query, their IP addresses are taken from the subnets through
+        the generate_ips method of the IPAM driver, and the ports and
+        allocations are inserted together when the session is flushed.
+
+        :param ports: list of the port dicts passed to create_port
+        :returns: the dicts of the created ports, without extensions
+        """
+        items = [port['port'] for port in ports]
+        # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
+        #                unneeded db action if the operation raises
+        tenant_ids = [self._get_tenant_id_for_create(context, p)
+                      for p in items]
+        network_items = {}
+        for index, p in enumerate(items):
+            network_items.setdefault(p['network_id'], []).append(index)
+
+        results = [None] * len(items)
+        context.session.begin(subtransactions=True)
+        try:
+            for network_id, indexes in network_items.iteritems():
+                network = self._get_network(context, network_id)
+                mac_addresses = self._allocate_macs_for_ports(
+                    context, network_id, [items[i] for i in indexes])
+                ips = self._allocate_ips_for_ports(
+                    context, network, [items[i] for i in indexes])
+                for index, mac_address, port_ips in zip(indexes,
+                                                        mac_addresses, ips):
+                    results[index] = self._create_port_with_ips(
+                        context, items[index], tenant_ids[index],
+                        mac_address, port_ips)
+            context.session.commit()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("An exception occured while creating "
+                            "%d ports in bulk"), len(items))
+                context.session.rollback()
+        return results
+
+    def _allocate_macs_for_ports(self, context, network_id, items):
+        """Return the MAC addresses of ports created on a network."""
+        requested = [p['mac_address'] for p in items
+                     if p['mac_address'] is not attributes.ATTR_NOT_SPECIFIED]
+        in_use = NeutronDbPluginV2._get_used_macs(context, network_id,
+                                                  requested)
+        seen = set()
+        for mac_address in requested:
+            if mac_address in in_use or mac_address in seen:
+                raise q_exc.MacAddressInUse(net_id=network_id,
+                                            mac=mac_address)
+            seen.add(mac_address)
+        generated = iter(NeutronDbPluginV2._generate_macs(
+            context, network_id, len(items) - len(requested),
+            exclude=requested))
+        return [p['mac_address']
+                if p['mac_address'] is not attributes.ATTR_NOT_SPECIFIED
+                else generated.next() for p in items]
+
+    def _allocate_ips_for_ports(self, context, network, items):
+        """Return the IP addresses of ports created on a network.
+
+        The addresses requested by the fixed_ips of all the ports are
+        allocated before any address is generated, the ports without
+        fixed_ips share a single generate_ips call per IP version.
+        """
+        ips = [[] for p in items]
+        configured = {}
+        requested = set()
+        generated = []
+        for index, p in enumerate(items):
+            if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                generated.append(index)
+                continue
+            configured[index] = self._test_fixed_ips_for_port(
+                context, p['network_id'], p['fixed_ips'])
+            for fixed in configured[index]:
+                if 'ip_address' not in fixed:
+                    continue
+                # The allocations of the previous ports are not stored yet
+                key = (fixed['subnet_id'], fixed['ip_address'])
+                if key in requested:
+                    raise q_exc.IpAddressInUse(net_id=network['id'],
+                                               ip_address=fixed['ip_address'])
+                requested.add(key)
+        for index in sorted(configured):
+            self._allocate_requested_ips(context, configured[index])
+        for index in sorted(configured):
+            ips[index] = self._generate_fixed_ips(context, configured[index])
+        if generated:
+            subnets = self.get_subnets(
+                context, filters={'network_id': [network['id']]})
+            for ip_version in (4, 6):
+                version_subnets = [subnet for subnet in subnets
+                                   if subnet['ip_version'] == ip_version]
+                if not version_subnets:
+                    continue
+                version_ips = ipam.get_driver().generate_ips(
+                    context, version_subnets, len(generated))
+                for index, ip in zip(generated, version_ips):
+                    ips[index].append({'ip_address': ip['ip_address'],
+                                       'subnet_id': ip['subnet_id']})
+        return ips
+
+    def _create_port_with_ips(self, context, p, tenant_id, mac_address, ips):
+        port_id = p.get('id') or uuidutils.generate_uuid()
+        port = models_v2.Port(tenant_id=tenant_id,
+                              name=p['name'],
+                              id=port_id,
+                              network_id=p['network_id'],
+                              mac_address=mac_address,
+                              admin_state_up=p['admin_state_up'],
+                              status=p.get('status',
+                                           constants.PORT_STATUS_ACTIVE),
+                              device_id=p['device_id'],
+                              device_owner=p['device_owner'])
+        context.session.add(port)
+        allocations = [NeutronDbPluginV2._store_ip_allocation(
+            context, ip['ip_address'], p['network_id'], ip['subnet_id'],
+            port_id) for ip in ips]
+        # The allocations are known, don't query them back for the dict
+        orm.attributes.set_committed_value(port, 'fixed_ips', allocations)
+        return self._make_port_dict(port, process_extensions=False)
 
     def create_port(self, context, port):
         p = port['port']
@@ -1340,21 +1405,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             # Update the allocated IP's
             if ips:
                 for ip in ips:
-                    ip_address = ip['ip_address']
-                    subnet_id = ip['subnet_id']
-                    LOG.debug(_("Allocated IP %(ip_address)s "
-                                "(%(network_id)s/%(subnet_id)s/%(port_id)s)"),
-                              {'ip_address': ip_address,
-                               'network_id': network_id,
-                               'subnet_id': subnet_id,
-                               'port_id': port_id})
-                    allocated = models_v2.IPAllocation(
-                        network_id=network_id,
-                        port_id=port_id,
-                        ip_address=ip_address,
-                        subnet_id=subnet_id,
-                    )
-                    context.session.add(allocated)
+                    NeutronDbPluginV2._store_ip_allocation(
+                        context, ip['ip_address'], network_id,
+                        ip['subnet_id'], port_id)
 
         return self._make_port_dict(port, process_extensions=False)
 
@@ -1374,10 +1427,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
                 # Update ips if necessary
                 for ip in added_ips:
-                    allocated = models_v2.IPAllocation(
-                        network_id=port['network_id'], port_id=port.id,
-                        ip_address=ip['ip_address'], subnet_id=ip['subnet_id'])
-                    context.session.add(allocated)
+                    NeutronDbPluginV2._store_ip_allocation(
+                        context, ip['ip_address'], port['network_id'],
+                        ip['subnet_id'], port.id)
             # Remove all attributes in p which are not in the port DB model
             # and then update the port
             port.update(self._filter_non_model_columns(p, models_v2.Port))
@@ -56,21 +56,38 @@ class DhcpRpcCallbackMixin(object):
         return [net['id'] for net in nets]
 
     def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
+        """Returns all the networks/subnets/ports in system.
+
+        If network_ids is given, only the active networks among them are
+        returned, so that an agent can retrieve its networks in pages.
+        """
         host = kwargs.get('host')
+        network_ids = kwargs.get('network_ids')
         LOG.debug(_('get_active_networks_info from %s'), host)
-        networks = self._get_active_networks(context, **kwargs)
         plugin = manager.NeutronManager.get_plugin()
-        filters = {'network_id': [network['id'] for network in networks]}
-        ports = plugin.get_ports(context, filters=filters)
-        filters['enable_dhcp'] = [True]
-        subnets = plugin.get_subnets(context, filters=filters)
-
+        if network_ids is None:
+            networks = self._get_active_networks(context, **kwargs)
+        elif network_ids:
+            filters = dict(id=network_ids, admin_state_up=[True])
+            networks = plugin.get_networks(context, filters=filters)
+        else:
+            return []
+        networks_by_id = {}
         for network in networks:
-            network['subnets'] = [subnet for subnet in subnets
-                                  if subnet['network_id'] == network['id']]
-            network['ports'] = [port for port in ports
-                                if port['network_id'] == network['id']]
+            network['subnets'] = []
+            network['ports'] = []
+            networks_by_id[network['id']] = network
+
+        network_ids = networks_by_id.keys()
+        ports = plugin.get_ports(context,
+                                 filters=dict(network_id=network_ids))
+        subnets = plugin.get_subnets(context,
+                                     filters=dict(network_id=network_ids,
+                                                  enable_dhcp=[True]))
+        for subnet in subnets:
+            networks_by_id[subnet['network_id']]['subnets'].append(subnet)
+        for port in ports:
+            networks_by_id[port['network_id']]['ports'].append(port)
 
         return networks
 
@@ -0,0 +1,493 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP address allocation drivers for the database plugin base class.
+
+The driver is selected with the ipam_driver option.
+"""
+
+import random
+
+import netaddr
+from oslo.config import cfg
+from sqlalchemy.orm import exc
+
+from neutron.common import exceptions as q_exc
+from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.openstack.common import importutils
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Number of random candidates drawn at once from the allocation pools
+CANDIDATES_PER_ATTEMPT = 16
+
+_driver = None
+_driver_class = None
+
+
+def get_driver():
+    """Return the instance of the configured IPAM driver."""
+    global _driver, _driver_class
+    if _driver_class != cfg.CONF.ipam_driver:
+        _driver = importutils.import_object(cfg.CONF.ipam_driver)
+        _driver_class = cfg.CONF.ipam_driver
+    return _driver
+
+
+def delete_ip_allocation(context, network_id, subnet_id, ip_address):
+    # Delete the IP address from the IPAllocate table
+    LOG.debug(_("Delete allocated IP %(ip_address)s "
+                "(%(network_id)s/%(subnet_id)s)"),
+              {'ip_address': ip_address,
+               'network_id': network_id,
+               'subnet_id': subnet_id})
+    alloc_qry = context.session.query(
+        models_v2.IPAllocation).with_lockmode('update')
+    alloc_qry.filter_by(network_id=network_id,
+                        ip_address=ip_address,
+                        subnet_id=subnet_id).delete()
+
+
+class IpamDriver(object):
+    """Base class of the IPAM drivers.
+
+    generate_ip(s) and allocate_specific_ip run in the transaction creating
+    or updating the port, which then stores the allocations through
+    store_allocation.
+    """
+
+    def generate_ip(self, context, subnets):
+        """Return an address, in one of the subnets, for a new allocation.
+
+        :returns: a dict with the ip_address and subnet_id keys
+        """
+        raise NotImplementedError()
+
+    def generate_ips(self, context, subnets, count):
+        """Return count addresses, in the subnets, for new allocations.
+
+        Used when ports are created in bulk, drivers should override it to
+        reserve the addresses with fewer queries than count generate_ip.
+
+        :returns: a list of dicts with the ip_address and subnet_id keys
+        """
+        return [self.generate_ip(context, subnets) for i in range(count)]
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Withdraw an address requested by the user from the free ones."""
+        raise NotImplementedError()
+
+    def recycle_ip(self, context, network_id, subnet_id, ip_address):
+        """Delete the allocation of an address and make it free again."""
+        raise NotImplementedError()
+
+    def store_allocation(self, context, network_id, subnet_id, ip_address,
+                         port_id):
+        """Store the allocation of an address to a port, and return it."""
+        allocated = models_v2.IPAllocation(network_id=network_id,
+                                           port_id=port_id,
+                                           ip_address=ip_address,
+                                           subnet_id=subnet_id)
+        context.session.add(allocated)
+        return allocated
+
+
+class AvailabilityRangeIpamDriver(IpamDriver):
+    """Allocate addresses from the availability ranges of the subnets.
+
+    The free addresses of the allocation pools are tracked as ranges, which
+    are locked to allocate or recycle an address: concurrent allocations on
+    a subnet are serialized on its first range.  The ranges still hold the
+    addresses allocated by RandomIpamDriver, these are skipped.
+    """
+
+    @staticmethod
+    def _take_free_ips(context, subnet_id, ip_range, count):
+        """Withdraw up to count addresses from the start of a range.
+
+        The addresses which are allocated anyway are withdrawn as well.
+        """
+        first_ip = netaddr.IPAddress(ip_range['first_ip'])
+        first = int(first_ip)
+        last = int(netaddr.IPAddress(ip_range['last_ip']))
+        value_column = models_v2.IPAllocation.ip_address_value
+        allocated = set(int(row[0], 16) for row in context.session.query(
+            value_column).filter(
+                models_v2.IPAllocation.subnet_id == subnet_id,
+                value_column >= ip_range['first_ip_value'],
+                value_column <= ip_range['last_ip_value']))
+        ip_addresses = []
+        # xrange does not take the long values of IPv6 addresses
+        ip = first
+        while ip <= last and len(ip_addresses) < count:
+            if ip in allocated:
+                LOG.debug(_("Skipped allocated IP %s"),
+                          netaddr.IPAddress(ip, first_ip.version))
+            else:
+                ip_addresses.append(
+                    str(netaddr.IPAddress(ip, first_ip.version)))
+            ip += 1
+        LOG.debug(_("Allocated IPs %(ip_addresses)s from %(first_ip)s to "
+                    "%(last_ip)s"),
+                  {'ip_addresses': ip_addresses,
+                   'first_ip': ip_range['first_ip'],
+                   'last_ip': ip_range['last_ip']})
+        if ip > last:
+            # No more free indices on subnet => delete
+            LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                        "pool."))
+            context.session.delete(ip_range)
+        else:
+            # increment the first free
+            ip_range['first_ip'] = str(netaddr.IPAddress(ip,
+                                                         first_ip.version))
+        return ip_addresses
+
+    def generate_ip(self, context, subnets):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        range_qry = range_qry.order_by(
+            models_v2.IPAvailabilityRange.first_ip_value)
+        for subnet in subnets:
+            while True:
+                range = range_qry.filter_by(subnet_id=subnet['id']).first()
+                if not range:
+                    LOG.debug(_("All IP's from subnet %(subnet_id)s "
+                                "(%(cidr)s) allocated"),
+                              {'subnet_id': subnet['id'],
+                               'cidr': subnet['cidr']})
+                    break
+                ip_addresses = self._take_free_ips(context, subnet['id'],
+                                                   range, 1)
+                if ip_addresses:
+                    return {'ip_address': ip_addresses[0],
+                            'subnet_id': subnet['id']}
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def generate_ips(self, context, subnets, count):
+        # Lock all the ranges of the subnets at once and take the addresses
+        # from their start, as generate_ip does one address at a time.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange,
+            models_v2.IPAllocationPool.subnet_id).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        ranges = range_qry.filter(
+            models_v2.IPAllocationPool.subnet_id.in_(
+                [subnet['id'] for subnet in subnets])).order_by(
+                    models_v2.IPAvailabilityRange.first_ip_value).all()
+        subnet_order = dict((subnet['id'], i)
+                            for i, subnet in enumerate(subnets))
+        ranges.sort(key=lambda row: subnet_order[row[1]])
+        ips = []
+        for ip_range, subnet_id in ranges:
+            ips.extend({'ip_address': ip_address, 'subnet_id': subnet_id}
+                       for ip_address in self._take_free_ips(
+                           context, subnet_id, ip_range, count - len(ips)))
+            if len(ips) == count:
+                return ips
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        value = models_v2.ip_to_value(ip_address)
+        range = self._get_range(context, subnet_id, ip_address).with_lockmode(
+            'update').first()
+        if not range:
+            return
+        if range['first_ip_value'] == range['last_ip_value']:
+            context.session.delete(range)
+        elif range['first_ip_value'] == value:
+            range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+        elif range['last_ip_value'] == value:
+            range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+        else:
+            # Split into two ranges
+            new_first = str(netaddr.IPAddress(ip_address) + 1)
+            new_last = range['last_ip']
+            range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=range['allocation_pool_id'],
+                first_ip=new_first,
+                last_ip=new_last)
+            context.session.add(ip_range)
+
+    @staticmethod
+    def _get_range(context, subnet_id, ip_address):
+        """Return a query of the availability range holding an address."""
+        value = models_v2.ip_to_value(ip_address)
+        return context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).filter(
+                    models_v2.IPAllocationPool.subnet_id == subnet_id,
+                    models_v2.IPAvailabilityRange.first_ip_value <= value,
+                    models_v2.IPAvailabilityRange.last_ip_value >= value)
+
+    def recycle_ip(self, context, network_id, subnet_id, ip_address):
+        """Return an IP address to the pool of free IP's on the network
+        subnet.
+        """
+        # Find the allocation pool for the IP to recycle
+        value = models_v2.ip_to_value(ip_address)
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool.id).with_lockmode('update')
+        allocation_pool = pool_qry.filter(
+            models_v2.IPAllocationPool.subnet_id == subnet_id,
+            models_v2.IPAllocationPool.first_ip_value <= value,
+            models_v2.IPAllocationPool.last_ip_value >= value).first()
+        if (not allocation_pool or
+                self._get_range(context, subnet_id, ip_address).first()):
+            # The addresses allocated by RandomIpamDriver are still free in
+            # the ranges
+            delete_ip_allocation(context, network_id, subnet_id, ip_address)
+            return
+        pool_id = allocation_pool.id
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        LOG.debug(_("Recycle %s"), ip_address)
+        try:
+            r1 = range_qry.filter_by(
+                allocation_pool_id=pool_id,
+                first_ip_value=models_v2.ip_to_value(ip_first)).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(
+                allocation_pool_id=pool_id,
+                last_ip_value=models_v2.ip_to_value(ip_last)).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+        delete_ip_allocation(context, network_id, subnet_id, ip_address)
+
+
+class RandomIpamDriver(IpamDriver):
+    """Allocate random addresses without locking shared rows.
+
+    Candidates are drawn at random from the allocation pools, and the
+    allocation of a free one is inserted right away: the primary key of
+    the allocations makes the insert fail if a concurrent request took the
+    same address, in which case the next candidate is tried.  The
+    allocations are not withdrawn from the availability ranges, which
+    AvailabilityRangeIpamDriver skips, but recycled addresses missing from
+    the ranges are returned to them.
+    """
+
+    def __init__(self):
+        self.attempts = cfg.CONF.ip_allocation_attempts
+
+    def generate_ip(self, context, subnets):
+        return self.generate_ips(context, subnets, 1)[0]
+
+    def generate_ips(self, context, subnets, count):
+        ips = []
+        for subnet in subnets:
+            ranges = [(int(netaddr.IPAddress(pool['first_ip'])),
+                       int(netaddr.IPAddress(pool['last_ip'])))
+                      for pool in context.session.query(
+                          models_v2.IPAllocationPool).filter_by(
+                              subnet_id=subnet['id'])]
+            needed = count - len(ips)
+            ip_addresses = self._allocate_random_ips(context, subnet, ranges,
+                                                     needed)
+            if len(ip_addresses) < needed:
+                ip_addresses += self._allocate_first_free_ips(
+                    context, subnet, ranges, needed - len(ip_addresses))
+            if ip_addresses:
+                LOG.debug(_("Allocated IPs %(ip_addresses)s on subnet "
+                            "%(subnet_id)s"),
+                          {'ip_addresses': ip_addresses,
+                           'subnet_id': subnet['id']})
+                ips += [{'ip_address': ip_address, 'subnet_id': subnet['id']}
+                        for ip_address in ip_addresses]
+            if len(ips) == count:
+                return ips
+            LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def _allocate_random_ips(self, context, subnet, ranges, count):
+        ip_addresses = []
+        size = sum(last - first + 1 for first, last in ranges)
+        if not size:
+            return ip_addresses
+        for attempt in range(self.attempts):
+            candidates = set()
+            draws = max(CANDIDATES_PER_ATTEMPT,
+                        2 * (count - len(ip_addresses)))
+            for i in range(min(draws, size)):
+                index = random.randrange(size)
+                for first, last in ranges:
+                    if index <= last - first:
+                        candidates.add(str(netaddr.IPAddress(
+                            first + index, subnet['ip_version'])))
+                        break
+                    index -= last - first + 1
+            candidates -= set(ip_addresses)
+            candidates -= self._get_allocated_ips(context, subnet['id'],
+                                                  candidates)
+            for ip_address in candidates:
+                if self._reserve_ip(context, subnet, ip_address):
+                    ip_addresses.append(ip_address)
+                    if len(ip_addresses) == count:
+                        return ip_addresses
+        return ip_addresses
+
+    def _allocate_first_free_ips(self, context, subnet, ranges, count):
+        # Draws keep hitting allocated addresses when the pools are almost
+        # exhausted, look for the gaps between the allocated ones instead.
+        ip_addresses = []
+        value_column = models_v2.IPAllocation.ip_address_value
+        for first, last in ranges:
+            allocated = context.session.query(value_column).filter(
+                models_v2.IPAllocation.subnet_id == subnet['id'],
+                value_column >= models_v2.ip_to_value(first),
+                value_column <= models_v2.ip_to_value(last)).order_by(
+                    value_column)
+            free_ranges = []
+            free = first
+            for row in allocated:
+                allocated_ip = int(row[0], 16)
+                free_ranges.append((free, allocated_ip))
+                free = max(free, allocated_ip + 1)
+            free_ranges.append((free, last + 1))
+            for start, end in free_ranges:
+                # xrange does not take the long values of IPv6 addresses
+                ip = start
+                while ip < end:
+                    ip_address = str(netaddr.IPAddress(ip,
+                                                       subnet['ip_version']))
+                    if self._reserve_ip(context, subnet, ip_address):
+                        ip_addresses.append(ip_address)
+                        if len(ip_addresses) == count:
+                            return ip_addresses
+                    ip += 1
+        return ip_addresses
+
+    @staticmethod
+    def _get_allocated_ips(context, subnet_id, ip_addresses=None):
+        query = context.session.query(
+            models_v2.IPAllocation.ip_address).filter_by(subnet_id=subnet_id)
+        if ip_addresses is not None:
+            query = query.filter(
+                models_v2.IPAllocation.ip_address.in_(ip_addresses))
+        return set(row[0] for row in query)
+
+    @staticmethod
+    def _reserve_ip(context, subnet, ip_address):
+        """Insert the allocation of an address, not yet bound to a port.
+
+        Returns False if the address has been allocated concurrently.
+        """
+        allocated = models_v2.IPAllocation(network_id=subnet['network_id'],
+                                           subnet_id=subnet['id'],
+                                           ip_address=ip_address)
+        if context.session.bind.dialect.name == 'sqlite':
+            # pysqlite does not support savepoints, and the transactions
+            # are serialized by SQLite anyway
+            if context.session.query(models_v2.IPAllocation).get(
+                    (ip_address, subnet['id'], subnet['network_id'])):
+                return False
+            context.session.add(allocated)
+            return True
+        try:
+            with context.session.begin_nested():
+                context.session.add(allocated)
+        except db_exc.DBDuplicateEntry:
+            LOG.debug(_("IP %s was allocated concurrently"), ip_address)
+            return False
+        return True
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        # Reserve the address right away, so that it can't be generated for
+        # another fixed IP before the allocations are stored.
+        subnet = context.session.query(models_v2.Subnet).get(subnet_id)
+        if not self._reserve_ip(context, subnet, ip_address):
+            raise q_exc.IpAddressInUse(net_id=subnet['network_id'],
+                                       ip_address=ip_address)
+
+    def recycle_ip(self, context, network_id, subnet_id, ip_address):
+        # The address is only missing from the ranges if it was allocated
+        # by AvailabilityRangeIpamDriver, return it to them in that case.
+        ranges = AvailabilityRangeIpamDriver._get_range(context, subnet_id,
+                                                        ip_address)
+        if ranges.first():
+            delete_ip_allocation(context, network_id, subnet_id, ip_address)
+        else:
+            AvailabilityRangeIpamDriver().recycle_ip(context, network_id,
+                                                     subnet_id, ip_address)
+
+    def store_allocation(self, context, network_id, subnet_id, ip_address,
+                         port_id):
+        allocated = context.session.query(models_v2.IPAllocation).get(
+            (ip_address, subnet_id, network_id))
+        if allocated:
+            if allocated.port_id is not None:
+                raise q_exc.IpAddressInUse(net_id=network_id,
+                                           ip_address=ip_address)
+            # the allocation reserved by generate_ip or allocate_specific_ip
+            allocated.port_id = port_id
+            return allocated
+        return super(RandomIpamDriver, self).store_allocation(
+            context, network_id, subnet_id, ip_address, port_id)
@@ -0,0 +1,106 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add indexes for port and allocation lookups
+
+Revision ID: 001537cb45a4
+Revises: e166998016f1
+Create Date: 2013-10-08 14:21:05.627310
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '001537cb45a4'
+down_revision = 'e166998016f1'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = [
+    '*'
+]
+
+# The plugins whose security group tables are created by 3cb5d900c5de
+security_groups_plugins = [
+    'neutron.plugins.linuxbridge.lb_neutron_plugin.LinuxBridgePluginV2',
+    'neutron.plugins.nicira.NeutronPlugin.NvpPluginV2',
+    'neutron.plugins.openvswitch.ovs_neutron_plugin.OVSNeutronPluginV2',
+    'neutron.plugins.nec.nec_plugin.NECPluginV2',
+    'neutron.plugins.ryu.ryu_neutron_plugin.RyuNeutronPluginV2',
+]
+
+from alembic import op
+
+from neutron.db import migration
+
+
+INDEXES = [
+    ('ix_ports_network_id_mac_address', 'ports',
+     ['network_id', 'mac_address']),
+    ('ix_ports_network_id_device_owner', 'ports',
+     ['network_id', 'device_owner']),
+    ('ix_ports_device_id_device_owner', 'ports',
+     ['device_id', 'device_owner']),
+    ('ix_ports_device_owner', 'ports', ['device_owner']),
+    ('ix_ipallocations_network_id_ip_address', 'ipallocations',
+     ['network_id', 'ip_address']),
+]
+
+SECURITY_GROUPS_INDEXES = [
+    ('ix_securitygroupportbindings_security_group_id',
+     'securitygroupportbindings', ['security_group_id']),
+]
+
+# The indexes InnoDB implicitly created for these foreign key columns were
+# dropped when the indexes above, which start with the same columns, were
+# created: the foreign keys then depend on the new indexes.
+FOREIGN_KEY_INDEXES = [
+    ('ports', 'network_id'),
+    ('ipallocations', 'network_id'),
+]
+
+SECURITY_GROUPS_FOREIGN_KEY_INDEXES = [
+    ('securitygroupportbindings', 'security_group_id'),
+]
+
+
+def _indexes(active_plugins):
+    indexes = list(INDEXES)
+    if migration.should_run(active_plugins, security_groups_plugins):
+        indexes += SECURITY_GROUPS_INDEXES
+    return indexes
+
+
+def _foreign_key_indexes(active_plugins):
+    indexes = list(FOREIGN_KEY_INDEXES)
+    if migration.should_run(active_plugins, security_groups_plugins):
+        indexes += SECURITY_GROUPS_FOREIGN_KEY_INDEXES
+    return indexes
+
+
+def upgrade(active_plugins=None, options=None):
+    for name, table_name, columns in _indexes(active_plugins):
+        op.create_index(name, table_name, columns)
+
+
+def downgrade(active_plugins=None, options=None):
+    if op.get_bind().dialect.name == 'mysql':
+        # Restore the implicit indexes, or the foreign keys prevent the
+        # other ones from being dropped
+        for table_name, column in _foreign_key_indexes(active_plugins):
+            op.create_index(column, table_name, [column])
+    for name, table_name, columns in _indexes(active_plugins):
+        op.drop_index(name, table_name)
@@ -0,0 +1,111 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add sortable IP address value columns
+
+Revision ID: e166998016f1
+Revises: 4a666eb208c2
+Create Date: 2013-10-01 10:12:41.356183
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e166998016f1'
+down_revision = '4a666eb208c2'
+
+# Change to ['*'] if this migration applies to all plugins
+
+migration_for_plugins = [
+    '*'
+]
+
+from alembic import op
+import netaddr
+import sqlalchemy as sa
+from sqlalchemy import sql
+
+
+# table -> (columns holding IP addresses, primary key columns)
+TABLES = {
+    'ipavailabilityranges': (('first_ip', 'last_ip'),
+                             ('allocation_pool_id', 'first_ip', 'last_ip')),
+    'ipallocationpools': (('first_ip', 'last_ip'), ('id',)),
+    'ipallocations': (('ip_address',),
+                      ('ip_address', 'subnet_id', 'network_id')),
+}
+
+INDEXES = [
+    ('ix_ipavailabilityranges_first_ip_value', 'ipavailabilityranges',
+     ['allocation_pool_id', 'first_ip_value']),
+    ('ix_ipavailabilityranges_last_ip_value', 'ipavailabilityranges',
+     ['allocation_pool_id', 'last_ip_value']),
+    ('ix_ipallocationpools_first_ip_value', 'ipallocationpools',
+     ['subnet_id', 'first_ip_value']),
+    ('ix_ipallocations_ip_address_value', 'ipallocations',
+     ['subnet_id', 'ip_address_value']),
+]
+
+# The indexes InnoDB implicitly created for these foreign key columns were
+# dropped when the indexes above, which start with the same columns, were
+# created: the foreign keys then depend on the new indexes.
+FOREIGN_KEY_INDEXES = [
+    ('ipallocationpools', 'subnet_id'),
+    ('ipallocations', 'subnet_id'),
+]
+
+
+def _ip_to_value(ip_address):
+    # Same encoding as neutron.db.models_v2.ip_to_value
+    return '%032x' % int(netaddr.IPAddress(ip_address))
+
+
+def upgrade(active_plugins=None, options=None):
+    connection = op.get_bind()
+    for table_name, (ip_columns, pk_columns) in TABLES.items():
+        for column in ip_columns:
+            op.add_column(table_name,
+                          sa.Column(column + '_value', sa.String(32),
+                                    nullable=True))
+        table = sql.table(table_name,
+                          *[sql.column(column) for column in
+                            set(ip_columns + pk_columns) |
+                            set(c + '_value' for c in ip_columns)])
+        for row in connection.execute(
+                sql.select([table.c[column] for column in
+                            set(ip_columns + pk_columns)])):
+            op.execute(
+                table.update().where(sql.and_(*[
+                    table.c[column] == row[column] for column in pk_columns
+                ])).values(dict(
+                    (column + '_value', _ip_to_value(row[column]))
+                    for column in ip_columns)))
+
+    for name, table_name, columns in INDEXES:
+        op.create_index(name, table_name, columns)
+
+
+def downgrade(active_plugins=None, options=None):
+    if op.get_bind().dialect.name == 'mysql':
+        # Restore the implicit indexes, or the foreign keys prevent the
+        # other ones from being dropped
+        for table_name, column in FOREIGN_KEY_INDEXES:
+            op.create_index(column, table_name, [column])
+    for name, table_name, columns in INDEXES:
+        op.drop_index(name, table_name)
+    for table_name, (ip_columns, pk_columns) in TABLES.items():
+        for column in ip_columns:
+            op.drop_column(table_name, column + '_value')
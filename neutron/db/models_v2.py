@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import netaddr
 import sqlalchemy as sa
 from sqlalchemy import orm
 
@@ -44,7 +45,25 @@ class HasStatusDescription(object):
     status_description = sa.Column(sa.String(255))
 
 
-class IPAvailabilityRange(model_base.BASEV2):
+def ip_to_value(ip_address):
+    """Encode an IP address as a string which sorts like its value.
+
+    The integer value of the address is written as 32 hexadecimal digits,
+    so that IPv6 addresses fit in a single indexable column on every
+    database, and that range lookups can be done in SQL.
+    """
+    return '%032x' % int(netaddr.IPAddress(ip_address))
+
+
+class HasIpValues(object):
+    """Keep the <column>_value columns encoding IP addresses up to date."""
+
+    def _set_ip_value(self, key, ip_address):
+        setattr(self, key + '_value', ip_to_value(ip_address))
+        return ip_address
+
+
+class IPAvailabilityRange(model_base.BASEV2, HasIpValues):
     """Internal representation of available IPs for Neutron subnets.
 
     Allocation - first entry from the range will be allocated.
@@ -63,12 +82,23 @@ class IPAvailabilityRange(model_base.BASEV2):
                                    primary_key=True)
     first_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
     last_ip = sa.Column(sa.String(64), nullable=False, primary_key=True)
+    first_ip_value = sa.Column(sa.String(32))
+    last_ip_value = sa.Column(sa.String(32))
+    __table_args__ = (sa.Index('ix_ipavailabilityranges_first_ip_value',
+                               'allocation_pool_id', 'first_ip_value'),
+                      sa.Index('ix_ipavailabilityranges_last_ip_value',
+                               'allocation_pool_id', 'last_ip_value'),
+                      {'mysql_engine': 'InnoDB'})
+
+    @orm.validates('first_ip', 'last_ip')
+    def _validate_ips(self, key, ip_address):
+        return self._set_ip_value(key, ip_address)
 
     def __repr__(self):
         return "%s - %s" % (self.first_ip, self.last_ip)
 
 
-class IPAllocationPool(model_base.BASEV2, HasId):
+class IPAllocationPool(model_base.BASEV2, HasId, HasIpValues):
     """Representation of an allocation pool in a Neutron subnet."""
 
     subnet_id = sa.Column(sa.String(36), sa.ForeignKey('subnets.id',
@@ -76,16 +106,25 @@ class IPAllocationPool(model_base.BASEV2, HasId):
                           nullable=True)
     first_ip = sa.Column(sa.String(64), nullable=False)
     last_ip = sa.Column(sa.String(64), nullable=False)
+    first_ip_value = sa.Column(sa.String(32))
+    last_ip_value = sa.Column(sa.String(32))
     available_ranges = orm.relationship(IPAvailabilityRange,
                                         backref='ipallocationpool',
                                         lazy="joined",
                                         cascade='delete')
+    __table_args__ = (sa.Index('ix_ipallocationpools_first_ip_value',
+                               'subnet_id', 'first_ip_value'),
+                      {'mysql_engine': 'InnoDB'})
+
+    @orm.validates('first_ip', 'last_ip')
+    def _validate_ips(self, key, ip_address):
+        return self._set_ip_value(key, ip_address)
 
     def __repr__(self):
         return "%s - %s" % (self.first_ip, self.last_ip)
 
 
-class IPAllocation(model_base.BASEV2):
+class IPAllocation(model_base.BASEV2, HasIpValues):
     """Internal representation of allocated IP addresses in a Neutron subnet.
     """
 
@@ -99,6 +138,16 @@ class IPAllocation(model_base.BASEV2):
     network_id = sa.Column(sa.String(36), sa.ForeignKey("networks.id",
                                                         ondelete="CASCADE"),
                            nullable=False, primary_key=True)
+    ip_address_value = sa.Column(sa.String(32))
+    __table_args__ = (sa.Index('ix_ipallocations_ip_address_value',
+                               'subnet_id', 'ip_address_value'),
+                      sa.Index('ix_ipallocations_network_id_ip_address',
+                               'network_id', 'ip_address'),
+                      {'mysql_engine': 'InnoDB'})
+
+    @orm.validates('ip_address')
+    def _validate_ips(self, key, ip_address):
+        return self._set_ip_value(key, ip_address)
 
 
 class Route(object):
@@ -128,6 +177,14 @@ class Port(model_base.BASEV2, HasId, HasTenant):
     status = sa.Column(sa.String(16), nullable=False)
     device_id = sa.Column(sa.String(255), nullable=False)
     device_owner = sa.Column(sa.String(255), nullable=False)
+    __table_args__ = (sa.Index('ix_ports_network_id_mac_address',
+                               'network_id', 'mac_address'),
+                      sa.Index('ix_ports_network_id_device_owner',
+                               'network_id', 'device_owner'),
+                      sa.Index('ix_ports_device_id_device_owner',
+                               'device_id', 'device_owner'),
+                      sa.Index('ix_ports_device_owner', 'device_owner'),
+                      {'mysql_engine': 'InnoDB'})
 
 
 class DNSNameServer(model_base.BASEV2):
@@ -53,6 +53,10 @@ class SecurityGroupPortBinding(model_base.BASEV2):
     security_group_id = sa.Column(sa.String(36),
                                   sa.ForeignKey("securitygroups.id"),
                                   primary_key=True)
+    __table_args__ = (
+        sa.Index('ix_securitygroupportbindings_security_group_id',
+                 'security_group_id'),
+        {'mysql_engine': 'InnoDB'})
 
     # Add a relationship to the Port model in order to instruct SQLAlchemy to
     # eagerly load security group bindings
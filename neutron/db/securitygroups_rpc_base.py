@@ -120,6 +120,25 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
+    def notify_security_groups_members_updated(self, context, ports):
+        """Notify update event of security group members for many ports.
+
+        The notifications of notify_security_groups_member_updated are
+        sent once for all the ports.
+        """
+        sg_ids = set()
+        provider_updated = False
+        for port in ports:
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                provider_updated = True
+            else:
+                sg_ids.update(port.get(ext_sg.SECURITYGROUPS) or [])
+        if provider_updated:
+            self.notifier.security_groups_provider_updated(context)
+        if sg_ids:
+            self.notifier.security_groups_member_updated(context,
+                                                         list(sg_ids))
+
 
 class SecurityGroupServerRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent support in plugin
@@ -130,13 +149,42 @@ class SecurityGroupServerRpcCallbackMixin(object):
         """Return security group rules for each port.
 
         also convert remote_group_id rule
-        to source_ip_prefix and dest_ip_prefix rule
+        to source_ip_prefix and dest_ip_prefix rule,
+        unless expand_remote_groups is False
 
         :params devices: list of devices
+        :params expand_remote_groups: if False, return the member ips of
+                                      remote groups in the
+                                      security_group_member_ips of each port
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        expand_remote_groups = kwargs.get('expand_remote_groups', True)
+
+        ports = self._get_ports_for_devices(devices)
+        return self._security_group_rules_for_ports(context, ports,
+                                                    expand_remote_groups)
 
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group rules and members for each port.
+
+        Unlike security_group_rules_for_devices, the rules of a security
+        group and the member ips of a remote group are returned once,
+        however many ports reference them.
+
+        :params devices: list of devices
+        :returns: {'devices': {port_id: port},
+                   'security_groups': {sg_id: [rule, ...]},
+                   'sg_member_ips': {sg_id: [ip, ...]}}
+                  the security_groups of each port list its sg_ids and its
+                  security_group_rules only hold the provider rules
+        """
+        devices = kwargs.get('devices')
+
+        ports = self._get_ports_for_devices(devices)
+        return self._security_group_info_for_ports(context, ports)
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -145,7 +193,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -162,6 +210,14 @@ class SecurityGroupServerRpcCallbackMixin(object):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _select_rules_for_security_groups(self, context, security_group_ids):
+        if not security_group_ids:
+            return []
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(security_group_ids))
+        return query.all()
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
         if not remote_group_ids:
@@ -249,6 +305,20 @@ class SecurityGroupServerRpcCallbackMixin(object):
             port['security_group_rules'] = updated_rule
         return ports
 
+    def _add_remote_group_member_ips(self, context, ports):
+        remote_group_ids = self._select_remote_group_ids(ports)
+        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        for port in ports.values():
+            port['security_group_member_ips'] = {}
+            for rule in port.get('security_group_rules'):
+                remote_group_id = rule.get('remote_group_id')
+                if not remote_group_id:
+                    continue
+                port['security_group_source_groups'].append(remote_group_id)
+                port['security_group_member_ips'][remote_group_id] = (
+                    ips[remote_group_id])
+        return ports
+
     def _add_ingress_dhcp_rule(self, port, ips):
         dhcp_ips = ips.get(port['network_id'])
         for dhcp_ip in dhcp_ips:
@@ -286,25 +356,50 @@ class SecurityGroupServerRpcCallbackMixin(object):
             self._add_ingress_ra_rule(port, ips)
             self._add_ingress_dhcp_rule(port, ips)
 
-    def _security_group_rules_for_ports(self, context, ports):
+    def _make_rule_dict_for_agent(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
+
+    def _security_group_info_for_ports(self, context, ports):
+        sg_ids = set()
+        for port in ports.values():
+            sg_ids.update(port.get('security_groups', []))
+        security_groups = dict((sg_id, []) for sg_id in sg_ids)
+        remote_group_ids = set()
+        for rule_in_db in self._select_rules_for_security_groups(
+                context, list(sg_ids)):
+            rule_dict = self._make_rule_dict_for_agent(rule_in_db)
+            security_groups[rule_dict['security_group_id']].append(rule_dict)
+            if rule_dict.get('remote_group_id'):
+                remote_group_ids.add(rule_dict['remote_group_id'])
+        self._apply_provider_rule(context, ports)
+        return {'devices': ports,
+                'security_groups': security_groups,
+                'sg_member_ips': self._select_ips_for_remote_group(
+                    context, list(remote_group_ids))}
+
+    def _security_group_rules_for_ports(self, context, ports,
+                                        expand_remote_groups=True):
         rules_in_db = self._select_rules_for_ports(context, ports)
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            port['security_group_rules'].append(
+                self._make_rule_dict_for_agent(rule_in_db))
         self._apply_provider_rule(context, ports)
+        if not expand_remote_groups:
+            return self._add_remote_group_member_ips(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
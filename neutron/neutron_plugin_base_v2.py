@@ -324,3 +324,21 @@ class NeutronPluginBaseV2(object):
         :param id: UUID representing the port to delete.
         """
         pass
+
+    def start_rpc_listeners(self):
+        """Start consuming the RPC topics of the plugin.
+
+        Most plugins consume their topics on initialization. Plugins
+        implementing this method let neutron-server start the consumers
+        instead, possibly in dedicated RPC worker processes.
+
+        :returns: the RPC connections to close when the consumers stop.
+
+        .. note:: this method is optional, as it was not part of the originally
+                  defined plugin API.
+        """
+        raise NotImplementedError
+
+    def rpc_workers_supported(self):
+        return (self.__class__.start_rpc_listeners !=
+                NeutronPluginBaseV2.start_rpc_listeners)
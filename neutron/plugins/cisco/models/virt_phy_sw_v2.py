@@ -83,6 +83,11 @@ class VirtualPhysicalSwitchModelV2(neutron_plugin_base_v2.NeutronPluginBaseV2):
             self.supported_extension_aliases.extend(
                 self._plugins[const.VSWITCH_PLUGIN].
                 supported_extension_aliases)
+        # The vswitch plugin may leave consuming its RPC topics to
+        # neutron-server, which only knows about this model
+        if ((const.VSWITCH_PLUGIN in self._plugins) and
+            self._plugins[const.VSWITCH_PLUGIN].rpc_workers_supported()):
+            self._plugins[const.VSWITCH_PLUGIN].start_rpc_listeners()
         # At this point, all the database models should have been loaded. It's
         # possible that configure_db() may have been called by one of the
         # plugins loaded in above. Otherwise, this call is to make sure that
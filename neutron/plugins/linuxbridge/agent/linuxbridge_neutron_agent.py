@@ -734,6 +734,7 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                  root_helper):
         self.polling_interval = polling_interval
         self.root_helper = root_helper
+        self.device_rpc_batch_size = cfg.CONF.AGENT.device_rpc_batch_size
         self.setup_linux_bridge(interface_mappings)
         configurations = {'interface_mappings': interface_mappings}
         if self.br_mgr.vxlan_mode is not lconst.VXLAN_NONE:
@@ -749,7 +750,7 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
             'start_flag': True}
 
         self.setup_rpc(interface_mappings.values())
-        self.init_firewall()
+        self.init_firewall(defer_refresh_firewall=True)
 
     def _report_state(self):
         try:
@@ -821,70 +822,85 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
     def treat_devices_added(self, devices):
         resync = False
         self.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.debug(_("Port %s added"), device)
+        for devices_batch in q_utils.split_list(list(devices),
+                                                self.device_rpc_batch_size):
             try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
+                devices_details_list = (
+                    self.plugin_rpc.get_devices_details_list(
+                        self.context, devices_batch, self.agent_id))
             except Exception as e:
                 LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                            "%(devices)s: %(e)s"),
+                          {'devices': devices_batch, 'e': e})
                 resync = True
                 continue
-            if 'port_id' in details:
-                LOG.info(_("Port %(device)s updated. Details: %(details)s"),
-                         {'device': device, 'details': details})
-                if details['admin_state_up']:
-                    # create the networking for the port
-                    network_type = details.get('network_type')
-                    if network_type:
-                        segmentation_id = details.get('segmentation_id')
+            devices_up = []
+            devices_down = []
+            for details in devices_details_list:
+                device = details['device']
+                LOG.debug(_("Port %s added"), device)
+                if 'port_id' in details:
+                    LOG.info(_("Port %(device)s updated. "
+                               "Details: %(details)s"),
+                             {'device': device, 'details': details})
+                    if details['admin_state_up']:
+                        # create the networking for the port
+                        network_type = details.get('network_type')
+                        if network_type:
+                            segmentation_id = details.get('segmentation_id')
+                        else:
+                            # compatibility with pre-Havana RPC vlan_id
+                            # encoding
+                            vlan_id = details.get('vlan_id')
+                            (network_type,
+                             segmentation_id) = lconst.interpret_vlan_id(
+                                 vlan_id)
+                        if self.br_mgr.add_interface(
+                                details['network_id'],
+                                network_type,
+                                details['physical_network'],
+                                segmentation_id,
+                                details['port_id']):
+                            devices_up.append(device)
+                        else:
+                            devices_down.append(device)
                     else:
-                        # compatibility with pre-Havana RPC vlan_id encoding
-                        vlan_id = details.get('vlan_id')
-                        (network_type,
-                         segmentation_id) = lconst.interpret_vlan_id(vlan_id)
-                    if self.br_mgr.add_interface(details['network_id'],
-                                                 network_type,
-                                                 details['physical_network'],
-                                                 segmentation_id,
-                                                 details['port_id']):
-
-                        # update plugin about port status
-                        self.plugin_rpc.update_device_up(self.context,
-                                                         device,
-                                                         self.agent_id)
-                    else:
-                        self.plugin_rpc.update_device_down(self.context,
-                                                           device,
-                                                           self.agent_id)
+                        self.remove_port_binding(details['network_id'],
+                                                 details['port_id'])
                 else:
-                    self.remove_port_binding(details['network_id'],
-                                             details['port_id'])
-            else:
-                LOG.info(_("Device %s not defined on plugin"), device)
+                    LOG.info(_("Device %s not defined on plugin"), device)
+            # update plugin about port status
+            if devices_up:
+                self.plugin_rpc.update_devices_up(self.context,
+                                                  devices_up,
+                                                  self.agent_id)
+            if devices_down:
+                self.plugin_rpc.update_devices_down(self.context,
+                                                    devices_down,
+                                                    self.agent_id)
         return resync
 
     def treat_devices_removed(self, devices):
         resync = False
         self.remove_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
+        for devices_batch in q_utils.split_list(list(devices),
+                                                self.device_rpc_batch_size):
+            LOG.info(_("Attachments %s removed"), devices_batch)
             try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
+                devices_details_list = self.plugin_rpc.update_devices_down(
+                    self.context, devices_batch, self.agent_id)
             except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                          {'devices': devices_batch, 'e': e})
                 resync = True
-            if details['exists']:
-                LOG.info(_("Port %s updated."), device)
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-            self.br_mgr.remove_empty_bridges()
+                continue
+            for details in devices_details_list:
+                if details['exists']:
+                    LOG.info(_("Port %s updated."), details['device'])
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"),
+                              details['device'])
+        self.br_mgr.remove_empty_bridges()
         return resync
 
     def daemon_loop(self):
@@ -913,6 +929,9 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
                     # plugin
                     sync = self.process_network_devices(device_info)
                     devices = device_info['current']
+                # Apply the security group updates received since the
+                # last iteration in a single pass
+                self.refresh_deferred_firewall()
             except Exception:
                 LOG.exception(_("Error in agent loop. Devices info: %s"),
                               device_info)
@@ -65,6 +65,11 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.IntOpt('device_rpc_batch_size', default=100,
+               help=_("The maximum number of devices the agent sends to "
+                      "the plugin in a single get_devices_details_list, "
+                      "update_devices_up or update_devices_down call. "
+                      "Set to 0 to send all devices in one call.")),
     #TODO(rkukura): Change default to False before havana rc1
     cfg.BoolOpt('rpc_support_old_agents', default=True,
                 help=_("Enable server RPC compatibility with old agents")),
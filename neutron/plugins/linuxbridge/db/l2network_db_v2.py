@@ -14,6 +14,7 @@
 # limitations under the License.
 
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.common import exceptions as q_exc
@@ -201,6 +202,38 @@ def get_network_binding(session, network_id):
         return
 
 
+def get_network_bindings(session, network_ids):
+    """Return a dict mapping each network id to its binding."""
+    if not network_ids:
+        return {}
+    bindings = (session.query(l2network_models_v2.NetworkBinding).
+                filter(l2network_models_v2.NetworkBinding.network_id.in_(
+                    network_ids)))
+    return dict((binding.network_id, binding) for binding in bindings)
+
+
+def get_ports_from_devices(devices):
+    """Get the ports matching a list of devices with a single query.
+
+    As in get_port_from_device, each device is a port id prefix. Returns a
+    dict mapping each device found to its port.
+    """
+    if not devices:
+        return {}
+    session = db.get_session()
+    query = session.query(models_v2.Port).filter(
+        sa.or_(*[models_v2.Port.id.startswith(device) for device in devices]))
+    devices = set(devices)
+    lengths = set(len(device) for device in devices)
+    ports = {}
+    for port in query:
+        for length in lengths:
+            device = port['id'][:length]
+            if device in devices:
+                ports.setdefault(device, port)
+    return ports
+
+
 def get_port_from_device(device):
     """Get port from database."""
     LOG.debug(_("get_port_from_device() called"))
@@ -240,3 +273,15 @@ def set_port_status(port_id, status):
         session.flush()
     except exc.NoResultFound:
         raise q_exc.PortNotFound(port_id=port_id)
+
+
+def set_ports_status(port_ids, status):
+    """Set the status of all the given ports with a single update."""
+    LOG.debug(_("set_ports_status as %s called"), status)
+    if not port_ids:
+        return
+    session = db.get_session()
+    with session.begin(subtransactions=True):
+        (session.query(models_v2.Port).
+         filter(models_v2.Port.id.in_(port_ids)).
+         update({'status': status}, synchronize_session=False))
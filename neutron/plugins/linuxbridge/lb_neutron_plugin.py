@@ -61,7 +61,9 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     # history
     #   1.1 Support Security Group RPC
-    RPC_API_VERSION = '1.1'
+    #   1.2 Support get_devices_details_list, update_devices_up and
+    #       update_devices_down
+    RPC_API_VERSION = '1.2'
     # Device names start with "tap"
     TAP_PREFIX_LEN = 3
 
@@ -85,12 +87,37 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested from %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = self.get_port_from_device(device)
-        if port:
-            binding = db.get_network_binding(db_api.get_session(),
-                                             port['network_id'])
+        return self.get_devices_details_list(rpc_context,
+                                             devices=[device],
+                                             agent_id=agent_id)[0]
+
+    @classmethod
+    def _get_ports_from_devices(cls, devices):
+        ports = db.get_ports_from_devices(
+            [device[cls.TAP_PREFIX_LEN:] for device in devices])
+        return dict((device, ports.get(device[cls.TAP_PREFIX_LEN:]))
+                    for device in devices)
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests details for a list of devices."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s details requested from %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = self._get_ports_from_devices(devices)
+        bindings = db.get_network_bindings(
+            db_api.get_session(),
+            set(port['network_id'] for port in ports.itervalues() if port))
+        status_updates = {q_const.PORT_STATUS_ACTIVE: [],
+                          q_const.PORT_STATUS_DOWN: []}
+        entries = []
+        for device in devices:
+            port = ports[device]
+            binding = port and bindings.get(port['network_id'])
+            if not binding:
+                entries.append({'device': device})
+                LOG.debug(_("%s can not be found in database"), device)
+                continue
             (network_type,
              segmentation_id) = constants.interpret_vlan_id(binding.vlan_id)
             entry = {'device': device,
@@ -102,48 +129,66 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                      'admin_state_up': port['admin_state_up']}
             if cfg.CONF.AGENT.rpc_support_old_agents:
                 entry['vlan_id'] = binding.vlan_id
+            entries.append(entry)
             new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
                           else q_const.PORT_STATUS_DOWN)
             if port['status'] != new_status:
-                db.set_port_status(port['id'], new_status)
-        else:
-            entry = {'device': device}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+                status_updates[new_status].append(port['id'])
+        for status, port_ids in status_updates.iteritems():
+            db.set_ports_status(port_ids, status)
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
-        # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists on %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = self.get_port_from_device(device)
-        if port:
-            entry = {'device': device,
-                     'exists': True}
-            if port['status'] != q_const.PORT_STATUS_DOWN:
-                # Set port status to DOWN
-                db.set_port_status(port['id'], q_const.PORT_STATUS_DOWN)
-        else:
-            entry = {'device': device,
-                     'exists': False}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        return self.update_devices_down(rpc_context,
+                                        devices=[device],
+                                        agent_id=agent_id)[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        # TODO(garyk) - live migration and port status
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = self._get_ports_from_devices(devices)
+        entries = []
+        for device in devices:
+            entries.append({'device': device,
+                            'exists': bool(ports[device])})
+            if not ports[device]:
+                LOG.debug(_("%s can not be found in database"), device)
+        # Set port status to DOWN
+        db.set_ports_status(
+            [port['id'] for port in ports.itervalues()
+             if port and port['status'] != q_const.PORT_STATUS_DOWN],
+            q_const.PORT_STATUS_DOWN)
+        return entries
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s up %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = self.get_port_from_device(device)
-        if port:
-            if port['status'] != q_const.PORT_STATUS_ACTIVE:
-                # Set port status to ACTIVE
-                db.set_port_status(port['id'], q_const.PORT_STATUS_ACTIVE)
-        else:
-            LOG.debug(_("%s can not be found in database"), device)
+        self.update_devices_up(rpc_context, devices=[device],
+                               agent_id=agent_id)
+
+    def update_devices_up(self, rpc_context, **kwargs):
+        """Devices are up on agent."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s up %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = self._get_ports_from_devices(devices)
+        for device in devices:
+            if not ports[device]:
+                LOG.debug(_("%s can not be found in database"), device)
+        # Set port status to ACTIVE
+        db.set_ports_status(
+            [port['id'] for port in ports.itervalues()
+             if port and port['status'] != q_const.PORT_STATUS_ACTIVE],
+            q_const.PORT_STATUS_ACTIVE)
 
 
 class AgentNotifierApi(proxy.RpcProxy,
@@ -265,13 +310,7 @@ class LinuxBridgePluginV2(db_base_plugin_v2.NeutronDbPluginV2,
         # RPC support
         self.service_topics = {svc_constants.CORE: topics.PLUGIN,
                                svc_constants.L3_ROUTER_NAT: topics.L3PLUGIN}
-        self.conn = rpc.create_connection(new=True)
         self.callbacks = LinuxBridgeRpcCallbacks()
-        self.dispatcher = self.callbacks.create_rpc_dispatcher()
-        for svc_topic in self.service_topics.values():
-            self.conn.create_consumer(svc_topic, self.dispatcher, fanout=False)
-        # Consume from all consumers in a thread
-        self.conn.consume_in_thread()
         self.notifier = AgentNotifierApi(topics.AGENT)
         self.agent_notifiers[q_const.AGENT_TYPE_DHCP] = (
             dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
@@ -280,6 +319,15 @@ class LinuxBridgePluginV2(db_base_plugin_v2.NeutronDbPluginV2,
             l3_rpc_agent_api.L3AgentNotify
         )
 
+    def start_rpc_listeners(self):
+        self.conn = rpc.create_connection(new=True)
+        self.dispatcher = self.callbacks.create_rpc_dispatcher()
+        for svc_topic in self.service_topics.values():
+            self.conn.create_consumer(svc_topic, self.dispatcher, fanout=False)
+        # Consume from all consumers in a thread
+        self.conn.consume_in_thread()
+        return [self.conn]
+
     def _parse_network_vlan_ranges(self):
         try:
             self.network_vlan_ranges = plugin_utils.parse_network_vlan_ranges(
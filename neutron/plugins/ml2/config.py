@@ -30,6 +30,13 @@ ml2_opts = [
                 help=_("An ordered list of networking mechanism driver "
                        "entrypoints to be loaded from the "
                        "neutron.ml2.mechanism_drivers namespace.")),
+    cfg.IntOpt('postcommit_pool_size',
+               default=0,
+               help=_("Maximum number of mechanism driver postcommit "
+                      "operations run concurrently for an API request. If "
+                      "greater than 1, the postcommit operations of the "
+                      "mechanism drivers supporting it are run "
+                      "concurrently rather than in order.")),
 ]
 
 
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from neutron.db import api as db_api
@@ -60,6 +61,23 @@ def get_network_segments(session, network_id):
                 for record in records]
 
 
+def get_networks_segments(session, network_ids):
+    """Return a dict mapping each network id to its list of segments."""
+    segments = dict((network_id, []) for network_id in network_ids)
+    if not network_ids:
+        return segments
+    with session.begin(subtransactions=True):
+        records = (session.query(models.NetworkSegment).
+                   filter(models.NetworkSegment.network_id.in_(network_ids)))
+        for record in records:
+            segments[record.network_id].append(
+                {api.ID: record.id,
+                 api.NETWORK_TYPE: record.network_type,
+                 api.PHYSICAL_NETWORK: record.physical_network,
+                 api.SEGMENTATION_ID: record.segmentation_id})
+    return segments
+
+
 def ensure_port_binding(session, port_id):
     with session.begin(subtransactions=True):
         try:
@@ -76,6 +94,25 @@ def ensure_port_binding(session, port_id):
         return record
 
 
+def ensure_port_bindings(session, port_ids):
+    """Return a dict of port bindings, creating any that are missing."""
+    if not port_ids:
+        return {}
+    with session.begin(subtransactions=True):
+        records = (session.query(models.PortBinding).
+                   filter(models.PortBinding.port_id.in_(port_ids)))
+        bindings = dict((record.port_id, record) for record in records)
+        for port_id in set(port_ids) - set(bindings):
+            record = models.PortBinding(
+                port_id=port_id,
+                host='',
+                vif_type=portbindings.VIF_TYPE_UNBOUND,
+                cap_port_filter=False)
+            session.add(record)
+            bindings[port_id] = record
+        return bindings
+
+
 def get_port(session, port_id):
     """Get port record for update within transcation."""
 
@@ -93,6 +130,36 @@ def get_port(session, port_id):
             return
 
 
+def get_ports(session, port_ids):
+    """Get port records for update within transaction.
+
+    As with get_port, each port_id may be a truncated id. Returns a dict
+    mapping each port_id that matches exactly one port to its record.
+    """
+    if not port_ids:
+        return {}
+    port_ids = set(port_ids)
+    lengths = set(len(port_id) for port_id in port_ids)
+    with session.begin(subtransactions=True):
+        records = (session.query(models_v2.Port).
+                   filter(sa.or_(*[models_v2.Port.id.startswith(port_id)
+                                   for port_id in port_ids])).
+                   all())
+    matches = {}
+    for record in records:
+        for length in lengths:
+            if record.id[:length] in port_ids:
+                matches.setdefault(record.id[:length], []).append(record)
+    ports = {}
+    for port_id, records in matches.iteritems():
+        if len(records) > 1:
+            LOG.error(_("Multiple ports have port_id starting with %s"),
+                      port_id)
+            continue
+        ports[port_id] = records[0]
+    return ports
+
+
 def get_port_and_sgs(port_id):
     """Get port from database with security group info."""
 
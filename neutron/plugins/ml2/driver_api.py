@@ -285,6 +285,13 @@ class MechanismDriver(object):
 
     __metaclass__ = ABCMeta
 
+    # Whether the postcommit methods can run concurrently with the ones of
+    # the other drivers when the postcommit_pool_size option is greater
+    # than 1. They must then neither use the database session of the
+    # context, which is not safe to share between threads, nor depend on
+    # the postcommit methods of the other drivers.
+    concurrent_postcommit = False
+
     @abstractmethod
     def initialize(self):
         """Perform driver initialization.
@@ -499,6 +506,36 @@ class MechanismDriver(object):
         """
         pass
 
+    def create_port_bulk_precommit(self, contexts):
+        """Allocate resources for new ports created in bulk.
+
+        :param contexts: list of PortContext instances describing the
+        ports.
+
+        Called inside the transaction creating all the ports. The
+        default implementation calls create_port_precommit for each
+        port, drivers able to process the ports together may override
+        it. Raising an exception will result in a rollback of the
+        current transaction.
+        """
+        for context in contexts:
+            self.create_port_precommit(context)
+
+    def create_port_bulk_postcommit(self, contexts):
+        """Create ports created in bulk.
+
+        :param contexts: list of PortContext instances describing the
+        ports.
+
+        Called after the transaction creating all the ports completes.
+        The default implementation calls create_port_postcommit for each
+        port, drivers able to process the ports together, for example
+        with a single request to a controller, may override it. Raising
+        an exception will result in the deletion of all the ports.
+        """
+        for context in contexts:
+            self.create_port_postcommit(context)
+
     def update_port_precommit(self, context):
         """Update resources of a port.
 
@@ -74,93 +74,53 @@ class GreTypeDriver(type_tunnel.TunnelTypeDriver):
 
     def reserve_provider_segment(self, session, segment):
         segmentation_id = segment.get(api.SEGMENTATION_ID)
+        if self._in_tunnel_ranges(segmentation_id, self.gre_id_ranges):
+            LOG.debug(_("Reserving specific gre tunnel %s from pool"),
+                      segmentation_id)
+        else:
+            LOG.debug(_("Reserving specific gre tunnel %s outside pool"),
+                      segmentation_id)
         with session.begin(subtransactions=True):
-            try:
-                alloc = (session.query(GreAllocation).
-                         filter_by(gre_id=segmentation_id).
-                         with_lockmode('update').
-                         one())
-                if alloc.allocated:
-                    raise exc.TunnelIdInUse(tunnel_id=segmentation_id)
-                LOG.debug(_("Reserving specific gre tunnel %s from pool"),
-                          segmentation_id)
-                alloc.allocated = True
-            except sa_exc.NoResultFound:
-                LOG.debug(_("Reserving specific gre tunnel %s outside pool"),
-                          segmentation_id)
-                alloc = GreAllocation(gre_id=segmentation_id)
-                alloc.allocated = True
-                session.add(alloc)
+            alloc = GreAllocation(gre_id=segmentation_id, allocated=True)
+            if not self._add_allocation(session, alloc, segmentation_id):
+                raise exc.TunnelIdInUse(tunnel_id=segmentation_id)
 
     def allocate_tenant_segment(self, session):
         with session.begin(subtransactions=True):
-            alloc = (session.query(GreAllocation).
-                     filter_by(allocated=False).
-                     with_lockmode('update').
-                     first())
-            if alloc:
+            gre_id = self._allocate_tunnel_id(session, GreAllocation,
+                                              'gre_id', self.gre_id_ranges)
+            if gre_id is not None:
                 LOG.debug(_("Allocating gre tunnel id  %(gre_id)s"),
-                          {'gre_id': alloc.gre_id})
-                alloc.allocated = True
+                          {'gre_id': gre_id})
                 return {api.NETWORK_TYPE: TYPE_GRE,
                         api.PHYSICAL_NETWORK: None,
-                        api.SEGMENTATION_ID: alloc.gre_id}
+                        api.SEGMENTATION_ID: gre_id}
 
     def release_segment(self, session, segment):
         gre_id = segment[api.SEGMENTATION_ID]
         with session.begin(subtransactions=True):
-            try:
-                alloc = (session.query(GreAllocation).
-                         filter_by(gre_id=gre_id).
-                         with_lockmode('update').
-                         one())
-                alloc.allocated = False
-                for lo, hi in self.gre_id_ranges:
-                    if lo <= gre_id <= hi:
-                        LOG.debug(_("Releasing gre tunnel %s to pool"),
-                                  gre_id)
-                        break
-                    else:
-                        session.delete(alloc)
-                        LOG.debug(_("Releasing gre tunnel %s outside pool"),
-                                  gre_id)
-            except sa_exc.NoResultFound:
-                LOG.warning(_("gre_id %s not found"), gre_id)
+            count = (session.query(GreAllocation).
+                     filter_by(gre_id=gre_id).
+                     delete())
+        if not count:
+            LOG.warning(_("gre_id %s not found"), gre_id)
+        elif self._in_tunnel_ranges(gre_id, self.gre_id_ranges):
+            LOG.debug(_("Releasing gre tunnel %s to pool"), gre_id)
+        else:
+            LOG.debug(_("Releasing gre tunnel %s outside pool"), gre_id)
 
     def _sync_gre_allocations(self):
-        """Synchronize gre_allocations table with configured tunnel ranges."""
-
-        # determine current configured allocatable gres
-        gre_ids = set()
-        for gre_id_range in self.gre_id_ranges:
-            tun_min, tun_max = gre_id_range
-            if tun_max + 1 - tun_min > 1000000:
-                LOG.error(_("Skipping unreasonable gre ID range "
-                            "%(tun_min)s:%(tun_max)s"),
-                          {'tun_min': tun_min, 'tun_max': tun_max})
-            else:
-                gre_ids |= set(xrange(tun_min, tun_max + 1))
+        """Synchronize gre_allocations table with configured tunnel ranges.
 
+        Only allocated tunnels are stored, free ones are derived from the
+        configured ranges. Rows of free tunnels left by earlier releases
+        are removed.
+        """
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            # remove from table unallocated tunnels not currently allocatable
-            allocs = (session.query(GreAllocation).all())
-            for alloc in allocs:
-                try:
-                    # see if tunnel is allocatable
-                    gre_ids.remove(alloc.gre_id)
-                except KeyError:
-                    # it's not allocatable, so check if its allocated
-                    if not alloc.allocated:
-                        # it's not, so remove it from table
-                        LOG.debug(_("Removing tunnel %s from pool"),
-                                  alloc.gre_id)
-                        session.delete(alloc)
-
-            # add missing allocatable tunnels to table
-            for gre_id in sorted(gre_ids):
-                alloc = GreAllocation(gre_id=gre_id)
-                session.add(alloc)
+            (session.query(GreAllocation).
+             filter_by(allocated=False).
+             delete(synchronize_session=False))
 
     def get_gre_allocation(self, session, gre_id):
         return session.query(GreAllocation).filter_by(gre_id=gre_id).first()
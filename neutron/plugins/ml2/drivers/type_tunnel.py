@@ -13,9 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 from abc import ABCMeta, abstractmethod
+import random
 
 from neutron.common import exceptions as exc
 from neutron.common import topics
+from neutron.openstack.common.db import exception as db_exc
 from neutron.openstack.common import log
 from neutron.plugins.ml2 import driver_api as api
 
@@ -23,6 +25,9 @@ LOG = log.getLogger(__name__)
 
 TUNNEL = 'tunnel'
 
+# Number of random tunnel IDs looked up at once when allocating one
+ALLOCATION_CANDIDATES = 16
+
 
 class TunnelTypeDriver(api.TypeDriver):
     """Define stable abstract interface for ML2 type drivers.
@@ -64,6 +69,103 @@ class TunnelTypeDriver(api.TypeDriver):
         LOG.info(_("%(type)s ID ranges: %(range)s"),
                  {'type': tunnel_type, 'range': current_range})
 
+    @staticmethod
+    def _in_tunnel_ranges(tunnel_id, tunnel_ranges):
+        return any(tun_min <= tunnel_id <= tun_max
+                   for tun_min, tun_max in tunnel_ranges)
+
+    @staticmethod
+    def _random_tunnel_ids(tunnel_ranges, count):
+        """Pick random IDs evenly from all the tunnel ranges."""
+        sizes = [tun_max + 1 - tun_min for tun_min, tun_max in tunnel_ranges]
+        total = sum(sizes)
+        tunnel_ids = set()
+        for i in range(min(count, total)):
+            offset = random.randrange(total)
+            for (tun_min, tun_max), size in zip(tunnel_ranges, sizes):
+                if offset < size:
+                    tunnel_ids.add(tun_min + offset)
+                    break
+                offset -= size
+        return tunnel_ids
+
+    @staticmethod
+    def _first_free_tunnel_id(session, column, tunnel_ranges, excluded):
+        for tun_min, tun_max in tunnel_ranges:
+            tunnel_id = tun_min
+            allocated = (session.query(column).
+                         filter(column.between(tun_min, tun_max)).
+                         order_by(column))
+            for allocated_id, in allocated:
+                while tunnel_id < allocated_id:
+                    if tunnel_id not in excluded:
+                        return tunnel_id
+                    tunnel_id += 1
+                tunnel_id = allocated_id + 1
+            while tunnel_id <= tun_max:
+                if tunnel_id not in excluded:
+                    return tunnel_id
+                tunnel_id += 1
+
+    def _free_tunnel_id(self, session, column, tunnel_ranges, excluded):
+        candidates = self._random_tunnel_ids(tunnel_ranges,
+                                             ALLOCATION_CANDIDATES)
+        candidates -= excluded
+        if candidates:
+            allocated = set(tunnel_id for tunnel_id, in
+                            session.query(column).
+                            filter(column.in_(candidates)))
+            free = candidates - allocated
+            if free:
+                return free.pop()
+        return self._first_free_tunnel_id(session, column, tunnel_ranges,
+                                          excluded)
+
+    @staticmethod
+    def _add_allocation(session, alloc, tunnel_id):
+        """Insert the allocation of a tunnel ID.
+
+        Returns False if the tunnel ID has been allocated concurrently.
+        """
+        if session.bind.dialect.name == 'sqlite':
+            # pysqlite does not support savepoints, and the transactions
+            # are serialized by SQLite anyway
+            if session.query(type(alloc)).get(tunnel_id):
+                return False
+            session.add(alloc)
+            return True
+        try:
+            with session.begin_nested():
+                session.add(alloc)
+        except db_exc.DBDuplicateEntry:
+            LOG.debug(_("Tunnel ID %s was allocated concurrently"), tunnel_id)
+            return False
+        return True
+
+    def _allocate_tunnel_id(self, session, model, id_name, tunnel_ranges):
+        """Store the allocation of a free tunnel ID of the ranges.
+
+        Returns the allocated tunnel ID, or None if none is left. Only the
+        allocated tunnel IDs are stored, the free ones being the
+        rest of the configured ranges. Random IDs are tried first, so
+        that concurrent allocations seldom pick the same ID and ranges
+        of any size cost nothing until they are used, the lowest free ID
+        is searched for when the random ones are all taken. The primary
+        key of the allocations rejects an ID allocated concurrently, in
+        which case another one is picked.
+        """
+        column = getattr(model, id_name)
+        excluded = set()
+        while True:
+            tunnel_id = self._free_tunnel_id(session, column, tunnel_ranges,
+                                             excluded)
+            if tunnel_id is None:
+                return
+            alloc = model(allocated=True, **{id_name: tunnel_id})
+            if self._add_allocation(session, alloc, tunnel_id):
+                return tunnel_id
+            excluded.add(tunnel_id)
+
     def validate_provider_segment(self, segment):
         physical_network = segment.get(api.PHYSICAL_NETWORK)
         if physical_network:
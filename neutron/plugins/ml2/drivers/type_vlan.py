@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
 import sys
 
 from oslo.config import cfg
@@ -31,6 +32,9 @@ LOG = log.getLogger(__name__)
 
 TYPE_VLAN = 'vlan'
 
+# Number of free VLANs a tenant VLAN is randomly picked from
+ALLOCATION_CANDIDATES = 100
+
 vlan_opts = [
     cfg.ListOpt('network_vlan_ranges',
                 default=[],
@@ -217,20 +221,47 @@ class VlanTypeDriver(api.TypeDriver):
                 session.add(alloc)
 
     def allocate_tenant_segment(self, session):
-        with session.begin(subtransactions=True):
-            alloc = (session.query(VlanAllocation).
-                     filter_by(allocated=False).
-                     with_lockmode('update').
-                     first())
-            if alloc:
+        """Allocate a free VLAN of the pool, or return None if none is left.
+
+        Rather than locking the first free VLAN, which every concurrent
+        allocation would wait for, a random one of the first free VLANs
+        is picked and marked allocated only if it is still free. Another
+        one is picked when a concurrent allocation won it, until no free
+        VLAN is left: each lost pick is a VLAN allocated by another request.
+        """
+        # VLANs won by concurrent allocations, which may still be seen as
+        # free by the queries of this transaction
+        lost = set()
+        while True:
+            with session.begin(subtransactions=True):
+                candidates = (session.query(VlanAllocation.physical_network,
+                                            VlanAllocation.vlan_id).
+                              filter_by(allocated=False).
+                              limit(ALLOCATION_CANDIDATES + len(lost)).all())
+                candidates = [candidate for candidate in candidates
+                              if tuple(candidate) not in lost]
+                if not candidates:
+                    return
+                physical_network, vlan_id = random.choice(candidates)
+                count = (session.query(VlanAllocation).
+                         filter_by(physical_network=physical_network,
+                                   vlan_id=vlan_id,
+                                   allocated=False).
+                         update({'allocated': True}))
+            if count:
                 LOG.debug(_("Allocating vlan %(vlan_id)s on physical network "
                             "%(physical_network)s from pool"),
-                          {'vlan_id': alloc.vlan_id,
-                           'physical_network': alloc.physical_network})
-                alloc.allocated = True
+                          {'vlan_id': vlan_id,
+                           'physical_network': physical_network})
                 return {api.NETWORK_TYPE: TYPE_VLAN,
-                        api.PHYSICAL_NETWORK: alloc.physical_network,
-                        api.SEGMENTATION_ID: alloc.vlan_id}
+                        api.PHYSICAL_NETWORK: physical_network,
+                        api.SEGMENTATION_ID: vlan_id}
+            LOG.debug(_("Vlan %(vlan_id)s on physical network "
+                        "%(physical_network)s was allocated concurrently, "
+                        "retrying"),
+                      {'vlan_id': vlan_id,
+                       'physical_network': physical_network})
+            lost.add((physical_network, vlan_id))
 
     def release_segment(self, session, segment):
         physical_network = segment[api.PHYSICAL_NETWORK]
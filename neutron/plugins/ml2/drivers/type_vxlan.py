@@ -78,98 +78,65 @@ class VxlanTypeDriver(type_tunnel.TunnelTypeDriver):
             self.vxlan_vni_ranges,
             TYPE_VXLAN
         )
+        for tun_min, tun_max in list(self.vxlan_vni_ranges):
+            if tun_max + 1 - tun_min > MAX_VXLAN_VNI:
+                LOG.error(_("Skipping unreasonable VXLAN VNI range "
+                            "%(tun_min)s:%(tun_max)s"),
+                          {'tun_min': tun_min, 'tun_max': tun_max})
+                self.vxlan_vni_ranges.remove((tun_min, tun_max))
         self._sync_vxlan_allocations()
 
     def reserve_provider_segment(self, session, segment):
         segmentation_id = segment.get(api.SEGMENTATION_ID)
+        if self._in_tunnel_ranges(segmentation_id, self.vxlan_vni_ranges):
+            LOG.debug(_("Reserving specific vxlan tunnel %s from pool"),
+                      segmentation_id)
+        else:
+            LOG.debug(_("Reserving specific vxlan tunnel %s outside pool"),
+                      segmentation_id)
         with session.begin(subtransactions=True):
-            try:
-                alloc = (session.query(VxlanAllocation).
-                         filter_by(vxlan_vni=segmentation_id).
-                         with_lockmode('update').
-                         one())
-                if alloc.allocated:
-                    raise exc.TunnelIdInUse(tunnel_id=segmentation_id)
-                LOG.debug(_("Reserving specific vxlan tunnel %s from pool"),
-                          segmentation_id)
-                alloc.allocated = True
-            except sa_exc.NoResultFound:
-                LOG.debug(_("Reserving specific vxlan tunnel %s outside pool"),
-                          segmentation_id)
-                alloc = VxlanAllocation(vxlan_vni=segmentation_id)
-                alloc.allocated = True
-                session.add(alloc)
+            alloc = VxlanAllocation(vxlan_vni=segmentation_id, allocated=True)
+            if not self._add_allocation(session, alloc, segmentation_id):
+                raise exc.TunnelIdInUse(tunnel_id=segmentation_id)
 
     def allocate_tenant_segment(self, session):
         with session.begin(subtransactions=True):
-            alloc = (session.query(VxlanAllocation).
-                     filter_by(allocated=False).
-                     with_lockmode('update').
-                     first())
-            if alloc:
+            vxlan_vni = self._allocate_tunnel_id(session, VxlanAllocation,
+                                                 'vxlan_vni',
+                                                 self.vxlan_vni_ranges)
+            if vxlan_vni is not None:
                 LOG.debug(_("Allocating vxlan tunnel vni %(vxlan_vni)s"),
-                          {'vxlan_vni': alloc.vxlan_vni})
-                alloc.allocated = True
+                          {'vxlan_vni': vxlan_vni})
                 return {api.NETWORK_TYPE: TYPE_VXLAN,
                         api.PHYSICAL_NETWORK: None,
-                        api.SEGMENTATION_ID: alloc.vxlan_vni}
+                        api.SEGMENTATION_ID: vxlan_vni}
 
     def release_segment(self, session, segment):
         vxlan_vni = segment[api.SEGMENTATION_ID]
         with session.begin(subtransactions=True):
-            try:
-                alloc = (session.query(VxlanAllocation).
-                         filter_by(vxlan_vni=vxlan_vni).
-                         with_lockmode('update').
-                         one())
-                alloc.allocated = False
-                for low, high in self.vxlan_vni_ranges:
-                    if low <= vxlan_vni <= high:
-                        LOG.debug(_("Releasing vxlan tunnel %s to pool"),
-                                  vxlan_vni)
-                        break
-                    else:
-                        session.delete(alloc)
-                        LOG.debug(_("Releasing vxlan tunnel %s outside pool"),
-                                  vxlan_vni)
-            except sa_exc.NoResultFound:
-                LOG.warning(_("vxlan_vni %s not found"), vxlan_vni)
+            count = (session.query(VxlanAllocation).
+                     filter_by(vxlan_vni=vxlan_vni).
+                     delete())
+        if not count:
+            LOG.warning(_("vxlan_vni %s not found"), vxlan_vni)
+        elif self._in_tunnel_ranges(vxlan_vni, self.vxlan_vni_ranges):
+            LOG.debug(_("Releasing vxlan tunnel %s to pool"), vxlan_vni)
+        else:
+            LOG.debug(_("Releasing vxlan tunnel %s outside pool"), vxlan_vni)
 
     def _sync_vxlan_allocations(self):
         """
         Synchronize vxlan_allocations table with configured tunnel ranges.
-        """
-
-        # determine current configured allocatable vnis
-        vxlan_vnis = set()
-        for tun_min, tun_max in self.vxlan_vni_ranges:
-            if tun_max + 1 - tun_min > MAX_VXLAN_VNI:
-                LOG.error(_("Skipping unreasonable VXLAN VNI range "
-                            "%(tun_min)s:%(tun_max)s"),
-                          {'tun_min': tun_min, 'tun_max': tun_max})
-            else:
-                vxlan_vnis |= set(xrange(tun_min, tun_max + 1))
 
+        Only allocated VNIs are stored, free ones are derived from the
+        configured ranges. Rows of free VNIs left by earlier releases are
+        removed.
+        """
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            # remove from table unallocated tunnels not currently allocatable
-            allocs = session.query(VxlanAllocation)
-            for alloc in allocs:
-                try:
-                    # see if tunnel is allocatable
-                    vxlan_vnis.remove(alloc.vxlan_vni)
-                except KeyError:
-                    # it's not allocatable, so check if its allocated
-                    if not alloc.allocated:
-                        # it's not, so remove it from table
-                        LOG.debug(_("Removing tunnel %s from pool"),
-                                  alloc.vxlan_vni)
-                        session.delete(alloc)
-
-            # add missing allocatable tunnels to table
-            for vxlan_vni in sorted(vxlan_vnis):
-                alloc = VxlanAllocation(vxlan_vni=vxlan_vni)
-                session.add(alloc)
+            (session.query(VxlanAllocation).
+             filter_by(allocated=False).
+             delete(synchronize_session=False))
 
     def get_vxlan_allocation(self, session, vxlan_vni):
         with session.begin(subtransactions=True):
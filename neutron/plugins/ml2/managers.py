@@ -14,7 +14,9 @@
 #    under the License.
 
 import sys
+import time
 
+import eventlet
 from oslo.config import cfg
 import stevedore
 
@@ -139,10 +141,41 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
             LOG.info(_("Initializing mechanism driver '%s'"), driver.name)
             driver.obj.initialize()
 
+    def _call_on_driver(self, driver, method_name, context):
+        start = time.time()
+        try:
+            getattr(driver.obj, method_name)(context)
+        finally:
+            LOG.debug(_("Mechanism driver '%(name)s' %(method)s took "
+                        "%(seconds).3f seconds"),
+                      {'name': driver.name, 'method': method_name,
+                       'seconds': time.time() - start})
+
+    def _spawn_postcommit_calls(self, method_name, context):
+        """Start the postcommit calls of the concurrent drivers.
+
+        Returns the green threads of the calls, keyed by driver name.
+        """
+        pool_size = cfg.CONF.ml2.postcommit_pool_size
+        if pool_size <= 1 or not method_name.endswith('_postcommit'):
+            return {}
+        # The pool only bounds the calls of this operation, a pool shared
+        # by all the API requests would serialize them
+        pool = eventlet.GreenPool(pool_size)
+        return dict((driver.name, pool.spawn(self._call_on_driver, driver,
+                                             method_name, context))
+                    for driver in self.ordered_mech_drivers
+                    if driver.obj.concurrent_postcommit)
+
     def _call_on_drivers(self, method_name, context,
                          continue_on_failure=False):
         """Helper method for calling a method across all mechanism drivers.
 
+        If postcommit_pool_size is greater than 1, the postcommit methods
+        of the drivers whose concurrent_postcommit attribute is True are
+        all called concurrently, and so even if another driver fails. The
+        other drivers are called in order from the calling thread.
+
         :param method_name: name of the method to call
         :param context: context parameter to pass to each method call
         :param continue_on_failure: whether or not to continue to call
@@ -150,18 +183,25 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         :raises: neutron.plugins.ml2.common.MechanismDriverError
         if any mechanism driver call fails.
         """
+        threads = self._spawn_postcommit_calls(method_name, context)
         error = False
         for driver in self.ordered_mech_drivers:
+            thread = threads.get(driver.name)
+            # After an error, the drivers called in order are skipped, but
+            # the calls already spawned are still waited for
+            if error and not continue_on_failure and thread is None:
+                continue
             try:
-                getattr(driver.obj, method_name)(context)
+                if thread is not None:
+                    thread.wait()
+                else:
+                    self._call_on_driver(driver, method_name, context)
             except Exception:
                 LOG.exception(
                     _("Mechanism driver '%(name)s' failed in %(method)s"),
                     {'name': driver.name, 'method': method_name}
                 )
                 error = True
-                if not continue_on_failure:
-                    break
         if error:
             raise ml2_exc.MechanismDriverError(
                 method=method_name
@@ -366,6 +406,29 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         """
         self._call_on_drivers("create_port_postcommit", context)
 
+    def create_port_bulk_precommit(self, contexts):
+        """Notify all mechanism drivers during bulk port creation.
+
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver create_port_bulk_precommit call fails.
+
+        Called within the database transaction creating all the ports,
+        see create_port_precommit.
+        """
+        self._call_on_drivers("create_port_bulk_precommit", contexts)
+
+    def create_port_bulk_postcommit(self, contexts):
+        """Notify all mechanism drivers of bulk port creation.
+
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver create_port_bulk_postcommit call fails.
+
+        Called after the database transaction, errors raised by
+        mechanism drivers lead to the deletion of all the ports, see
+        create_port_postcommit.
+        """
+        self._call_on_drivers("create_port_bulk_postcommit", contexts)
+
     def update_port_precommit(self, context):
         """Notify all mechanism drivers during port update.
 
@@ -14,6 +14,8 @@
 #    under the License.
 
 from oslo.config import cfg
+import sqlalchemy as sa
+from sqlalchemy import orm
 
 from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
@@ -48,6 +50,7 @@ from neutron.plugins.ml2 import driver_context
 from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import models
 from neutron.plugins.ml2 import rpc
+from neutron import policy
 
 LOG = log.getLogger(__name__)
 
@@ -118,11 +121,14 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         )
         self.callbacks = rpc.RpcCallbacks(self.notifier, self.type_manager)
         self.topic = topics.PLUGIN
+
+    def start_rpc_listeners(self):
         self.conn = c_rpc.create_connection(new=True)
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
         self.conn.create_consumer(self.topic, self.dispatcher,
                                   fanout=False)
         self.conn.consume_in_thread()
+        return [self.conn]
 
     def _process_provider_segment(self, segment):
         network_type = self._get_attribute(segment, provider.NETWORK_TYPE)
@@ -173,9 +179,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             value = None
         return value
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, segments=None):
         id = network['id']
-        segments = db.get_network_segments(context.session, id)
+        if segments is None:
+            segments = db.get_network_segments(context.session, id)
         if not segments:
             LOG.error(_("Network %s has no segments"), id)
             network[provider.NETWORK_TYPE] = None
@@ -193,10 +200,6 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             network[provider.PHYSICAL_NETWORK] = segment[api.PHYSICAL_NETWORK]
             network[provider.SEGMENTATION_ID] = segment[api.SEGMENTATION_ID]
 
-    def _filter_nets_provider(self, context, nets, filters):
-        # TODO(rkukura): Implement filtering.
-        return nets
-
     def _process_port_binding(self, mech_context, attrs):
         binding = mech_context._binding
         port = mech_context.current
@@ -267,6 +270,50 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         None,
         '_ml2_port_result_filter_hook')
 
+    def _ml2_network_result_filter_hook(self, query, filters):
+        conditions = []
+        for attr, column in ((provider.NETWORK_TYPE,
+                              models.NetworkSegment.network_type),
+                             (provider.PHYSICAL_NETWORK,
+                              models.NetworkSegment.physical_network),
+                             (provider.SEGMENTATION_ID,
+                              models.NetworkSegment.segmentation_id)):
+            values = filters and filters.get(attr, [])
+            if values:
+                conditions.append(column.in_(values))
+        if not conditions:
+            return query
+        # A network matches when one of its segments matches all the
+        # provider filters
+        return query.filter(sa.exists().where(sa.and_(
+            models.NetworkSegment.network_id == models_v2.Network.id,
+            *conditions)))
+
+    db_base_plugin_v2.NeutronDbPluginV2.register_model_query_hook(
+        models_v2.Network,
+        "ml2_network_segments",
+        None,
+        None,
+        '_ml2_network_result_filter_hook')
+
+    def _filter_nets_provider(self, context, filters):
+        """Drop the provider filters the context is not allowed to use.
+
+        Filtering on attributes the caller can't read would disclose their
+        values.
+        """
+        if not filters:
+            return filters
+        filters = dict(filters)
+        for attr in (provider.NETWORK_TYPE, provider.PHYSICAL_NETWORK,
+                     provider.SEGMENTATION_ID):
+            if (attr in filters and
+                    not policy.check(context, 'get_network:%s' % attr, {})):
+                LOG.debug(_("Ignoring the %s filter, which is not allowed "
+                            "in this context"), attr)
+                del filters[attr]
+        return filters
+
     def _notify_port_updated(self, mech_context):
         port = mech_context._port
         segment = mech_context.bound_segment
@@ -356,17 +403,33 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                      sorts=None, limit=None, marker=None, page_reverse=False):
         session = context.session
         with session.begin(subtransactions=True):
-            nets = super(Ml2Plugin,
-                         self).get_networks(context, filters, None, sorts,
-                                            limit, marker, page_reverse)
+            marker_obj = self._get_marker_obj(context, 'network', limit,
+                                              marker)
+            query = self._get_collection_query(
+                context, models_v2.Network,
+                filters=self._filter_nets_provider(context, filters),
+                sorts=sorts, limit=limit, marker_obj=marker_obj,
+                page_reverse=page_reverse)
+            # Load the subnets of all the networks in one query rather than
+            # one per network
+            query = query.options(orm.subqueryload(models_v2.Network.subnets))
+            nets = [self._make_network_dict(net) for net in query]
+            if limit and page_reverse:
+                nets.reverse()
+            segments = db.get_networks_segments(
+                session, [net['id'] for net in nets])
             for net in nets:
-                self._extend_network_dict_provider(context, net)
+                self._extend_network_dict_provider(context, net,
+                                                   segments[net['id']])
 
-            nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
 
         return [self._fields(net, fields) for net in nets]
 
+    def get_networks_count(self, context, filters=None):
+        return super(Ml2Plugin, self).get_networks_count(
+            context, self._filter_nets_provider(context, filters))
+
     def delete_network(self, context, id):
         session = context.session
         with session.begin(subtransactions=True):
@@ -470,6 +533,55 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.notify_security_groups_member_updated(context, result)
         return result
 
+    def create_port_bulk(self, context, ports):
+        if not self._uses_create_port_of(Ml2Plugin):
+            return self._create_bulk('port', context, ports)
+
+        items = ports['ports']
+        for port in items:
+            port['port']['status'] = const.PORT_STATUS_DOWN
+
+        mech_contexts = []
+        networks = {}
+        session = context.session
+        with session.begin(subtransactions=True):
+            for port in items:
+                self._ensure_default_security_group_on_port(context, port)
+            sgids = [self._get_security_groups_on_port(context, port)
+                     for port in items]
+            results = self._create_ports_bulk(context, items)
+            for port, result, port_sgids in zip(items, results, sgids):
+                attrs = port['port']
+                self._process_port_create_security_group(context, result,
+                                                         port_sgids)
+                network_id = result['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self.get_network(context,
+                                                            network_id)
+                mech_context = driver_context.PortContext(
+                    self, context, result, networks[network_id])
+                self._process_port_binding(mech_context, attrs)
+                result[addr_pair.ADDRESS_PAIRS] = (
+                    self._process_create_allowed_address_pairs(
+                        context, result,
+                        attrs.get(addr_pair.ADDRESS_PAIRS)))
+                self._process_port_create_extra_dhcp_opts(
+                    context, result, attrs.get(edo_ext.EXTRADHCPOPTS, []))
+                mech_contexts.append(mech_context)
+            self.mechanism_manager.create_port_bulk_precommit(mech_contexts)
+
+        try:
+            self.mechanism_manager.create_port_bulk_postcommit(mech_contexts)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("mechanism_manager.create_port_bulk failed, "
+                            "deleting ports %s"),
+                          [result['id'] for result in results])
+                for result in results:
+                    self.delete_port(context, result['id'])
+        self.notify_security_groups_members_updated(context, results)
+        return results
+
     def update_port(self, context, id, port):
         attrs = port['port']
         need_port_update_notify = False
@@ -543,28 +655,40 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.notify_security_groups_member_updated(context, port)
 
     def update_port_status(self, context, port_id, status):
-        updated = False
-        session = context.session
-        with session.begin(subtransactions=True):
-            port = db.get_port(session, port_id)
-            if not port:
-                LOG.warning(_("Port %(port)s updated up by agent not found"),
-                            {'port': port_id})
-                return False
+        return port_id in self.update_ports_status(context, [port_id], status)
 
-            if port.status != status:
-                original_port = self._make_port_dict(port)
-                port.status = status
-                updated_port = self._make_port_dict(port)
-                network = self.get_network(context,
-                                           original_port['network_id'])
-                mech_context = driver_context.PortContext(
-                    self, context, updated_port, network,
-                    original_port=original_port)
-                self.mechanism_manager.update_port_precommit(mech_context)
-                updated = True
+    def update_ports_status(self, context, port_ids, status):
+        """Update the status of several ports within one transaction.
 
-        if updated:
+        Returns the set of port ids that were found.
+        """
+        mech_contexts = []
+        networks = {}
+        session = context.session
+        with session.begin(subtransactions=True):
+            ports = db.get_ports(session, port_ids)
+            for port_id in port_ids:
+                port = ports.get(port_id)
+                if not port:
+                    LOG.warning(_("Port %(port)s updated up by agent not "
+                                  "found"), {'port': port_id})
+                    continue
+
+                if port.status != status:
+                    original_port = self._make_port_dict(port)
+                    port.status = status
+                    updated_port = self._make_port_dict(port)
+                    network_id = original_port['network_id']
+                    if network_id not in networks:
+                        networks[network_id] = self.get_network(context,
+                                                                network_id)
+                    mech_context = driver_context.PortContext(
+                        self, context, updated_port, networks[network_id],
+                        original_port=original_port)
+                    self.mechanism_manager.update_port_precommit(mech_context)
+                    mech_contexts.append(mech_context)
+
+        for mech_context in mech_contexts:
             self.mechanism_manager.update_port_postcommit(mech_context)
 
-        return True
+        return set(ports)
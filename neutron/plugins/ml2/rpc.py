@@ -40,10 +40,12 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
                    sg_db_rpc.SecurityGroupServerRpcCallbackMixin,
                    type_tunnel.TunnelRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.2'
     # history
     #   1.0 Initial version (from openvswitch/linuxbridge)
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list, update_devices_up and
+    #       update_devices_down
 
     def __init__(self, notifier, type_manager):
         # REVISIT(kmestery): This depends on the first three super classes
@@ -83,65 +85,85 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested by agent "
+        return self.get_devices_details_list(rpc_context,
+                                             devices=[device],
+                                             agent_id=agent_id)[0]
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests details for a list of devices."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s details requested by agent "
                     "%(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port_id = self._device_to_port_id(device)
+                  {'devices': devices, 'agent_id': agent_id})
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices)
 
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            port = db.get_port(session, port_id)
-            if not port:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s not found in database"),
-                            {'device': device, 'agent_id': agent_id})
-                return {'device': device}
-
-            segments = db.get_network_segments(session, port.network_id)
-            if not segments:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s has network %(network_id)s with "
-                              "no segments"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id})
-                return {'device': device}
-
-            binding = db.ensure_port_binding(session, port.id)
-            if not binding.segment:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s on network %(network_id)s not "
-                              "bound, vif_type: %(vif_type)s"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id,
-                             'vif_type': binding.vif_type})
-                return {'device': device}
-
-            segment = self._find_segment(segments, binding.segment)
-            if not segment:
-                LOG.warning(_("Device %(device)s requested by agent "
-                              "%(agent_id)s on network %(network_id)s "
-                              "invalid segment, vif_type: %(vif_type)s"),
-                            {'device': device,
-                             'agent_id': agent_id,
-                             'network_id': port.network_id,
-                             'vif_type': binding.vif_type})
-                return {'device': device}
-
-            new_status = (q_const.PORT_STATUS_BUILD if port.admin_state_up
-                          else q_const.PORT_STATUS_DOWN)
-            if port.status != new_status:
-                port.status = new_status
-            entry = {'device': device,
-                     'network_id': port.network_id,
-                     'port_id': port.id,
-                     'admin_state_up': port.admin_state_up,
-                     'network_type': segment[api.NETWORK_TYPE],
-                     'segmentation_id': segment[api.SEGMENTATION_ID],
-                     'physical_network': segment[api.PHYSICAL_NETWORK]}
-            LOG.debug(_("Returning: %s"), entry)
-            return entry
+            ports = db.get_ports(session, port_ids.values())
+            segments = db.get_networks_segments(
+                session, set(port.network_id for port in ports.itervalues()))
+            bindings = db.ensure_port_bindings(
+                session, [port.id for port in ports.itervalues()])
+            return [self._get_device_details(device, agent_id,
+                                             ports.get(port_ids[device]),
+                                             segments, bindings)
+                    for device in devices]
+
+    def _get_device_details(self, device, agent_id, port, segments,
+                            bindings):
+        if not port:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s not found in database"),
+                        {'device': device, 'agent_id': agent_id})
+            return {'device': device}
+
+        network_segments = segments[port.network_id]
+        if not network_segments:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s has network %(network_id)s with "
+                          "no segments"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id})
+            return {'device': device}
+
+        binding = bindings[port.id]
+        if not binding.segment:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s on network %(network_id)s not "
+                          "bound, vif_type: %(vif_type)s"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id,
+                         'vif_type': binding.vif_type})
+            return {'device': device}
+
+        segment = self._find_segment(network_segments, binding.segment)
+        if not segment:
+            LOG.warning(_("Device %(device)s requested by agent "
+                          "%(agent_id)s on network %(network_id)s "
+                          "invalid segment, vif_type: %(vif_type)s"),
+                        {'device': device,
+                         'agent_id': agent_id,
+                         'network_id': port.network_id,
+                         'vif_type': binding.vif_type})
+            return {'device': device}
+
+        new_status = (q_const.PORT_STATUS_BUILD if port.admin_state_up
+                      else q_const.PORT_STATUS_DOWN)
+        if port.status != new_status:
+            port.status = new_status
+        entry = {'device': device,
+                 'network_id': port.network_id,
+                 'port_id': port.id,
+                 'admin_state_up': port.admin_state_up,
+                 'network_type': segment[api.NETWORK_TYPE],
+                 'segmentation_id': segment[api.SEGMENTATION_ID],
+                 'physical_network': segment[api.PHYSICAL_NETWORK]}
+        LOG.debug(_("Returning: %s"), entry)
+        return entry
 
     def _find_segment(self, segments, segment_id):
         for segment in segments:
@@ -150,32 +172,50 @@ class RpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
-        # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists at agent "
+        return self.update_devices_down(rpc_context,
+                                        devices=[device],
+                                        agent_id=agent_id)[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        # TODO(garyk) - live migration and port status
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s no longer exist at agent "
                     "%(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port_id = self._device_to_port_id(device)
+                  {'devices': devices, 'agent_id': agent_id})
+        port_ids = dict((device, self._device_to_port_id(device))
+                        for device in devices)
 
         plugin = manager.NeutronManager.get_plugin()
-        port_exists = plugin.update_port_status(rpc_context, port_id,
-                                                q_const.PORT_STATUS_DOWN)
+        existing = plugin.update_ports_status(rpc_context,
+                                              port_ids.values(),
+                                              q_const.PORT_STATUS_DOWN)
 
-        return {'device': device,
-                'exists': port_exists}
+        return [{'device': device,
+                 'exists': port_ids[device] in existing}
+                for device in devices]
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s up at agent %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port_id = self._device_to_port_id(device)
+        self.update_devices_up(rpc_context, devices=[device],
+                               agent_id=agent_id)
+
+    def update_devices_up(self, rpc_context, **kwargs):
+        """Devices are up on agent."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s up at agent %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        port_ids = [self._device_to_port_id(device) for device in devices]
 
         plugin = manager.NeutronManager.get_plugin()
-        plugin.update_port_status(rpc_context, port_id,
-                                  q_const.PORT_STATUS_ACTIVE)
+        plugin.update_ports_status(rpc_context, port_ids,
+                                   q_const.PORT_STATUS_ACTIVE)
 
 
 class AgentNotifierApi(proxy.RpcProxy,
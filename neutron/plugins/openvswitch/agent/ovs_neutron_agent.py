@@ -32,6 +32,7 @@ from oslo.config import cfg
 from neutron.agent import l2population_rpc
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import polling
 from neutron.agent import rpc as agent_rpc
 from neutron.agent import securitygroups_rpc as sg_rpc
 from neutron.common import config as logging_config
@@ -116,7 +117,7 @@ class OVSSecurityGroupAgent(sg_rpc.SecurityGroupAgentRpcMixin):
         self.context = context
         self.plugin_rpc = plugin_rpc
         self.root_helper = root_helper
-        self.init_firewall()
+        self.init_firewall(defer_refresh_firewall=True)
 
 
 class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
@@ -155,7 +156,14 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
                  polling_interval, tunnel_types=None,
-                 veth_mtu=None, l2_population=False):
+                 veth_mtu=None, l2_population=False,
+                 minimize_polling=False,
+                 ovsdb_monitor_respawn_interval=(
+                     constants.DEFAULT_OVSDBMON_RESPAWN),
+                 minimize_polling_resync_interval=(
+                     constants.DEFAULT_MINIMIZE_POLLING_RESYNC),
+                 device_rpc_batch_size=(
+                     constants.DEFAULT_DEVICE_RPC_BATCH_SIZE)):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -168,6 +176,16 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                the agent. If set, will automatically set enable_tunneling to
                True.
         :param veth_mtu: MTU size for veth interfaces.
+        :param minimize_polling: Optional, whether to minimize polling by
+               monitoring ovsdb for interface changes.
+        :param ovsdb_monitor_respawn_interval: Optional, when using polling
+               minimization, the number of seconds to wait before respawning
+               the ovsdb monitor.
+        :param minimize_polling_resync_interval: Optional, when using polling
+               minimization, the maximum number of seconds between full polls
+               of local devices.
+        :param device_rpc_batch_size: Optional, the maximum number of devices
+               sent to the plugin in a single bulk device RPC call.
         '''
         self.veth_mtu = veth_mtu
         self.root_helper = root_helper
@@ -198,6 +216,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                constants.TYPE_VXLAN: {}}
 
         self.polling_interval = polling_interval
+        self.minimize_polling = minimize_polling
+        self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
+        self.minimize_polling_resync_interval = (
+            minimize_polling_resync_interval)
+        self.device_rpc_batch_size = device_rpc_batch_size
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -884,99 +907,112 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
     def treat_devices_added(self, devices):
         resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Port %s added"), device)
+        for devices_batch in q_utils.split_list(list(devices),
+                                                self.device_rpc_batch_size):
             try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
+                devices_details_list = (
+                    self.plugin_rpc.get_devices_details_list(
+                        self.context, devices_batch, self.agent_id))
             except Exception as e:
                 LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                            "%(devices)s: %(e)s"),
+                          {'devices': devices_batch, 'e': e})
                 resync = True
                 continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
-            if 'port_id' in details:
-                LOG.info(_("Port %(device)s updated. Details: %(details)s"),
-                         {'device': device, 'details': details})
-                self.treat_vif_port(port, details['port_id'],
-                                    details['network_id'],
-                                    details['network_type'],
-                                    details['physical_network'],
-                                    details['segmentation_id'],
-                                    details['admin_state_up'])
-
+            vif_ports = self.int_br.get_vif_port_snapshot()
+            devices_up = []
+            for details in devices_details_list:
+                device = details['device']
+                LOG.info(_("Port %s added"), device)
+                port = vif_ports.get(device)
+                if 'port_id' in details:
+                    LOG.info(_("Port %(device)s updated. "
+                               "Details: %(details)s"),
+                             {'device': device, 'details': details})
+                    self.treat_vif_port(port, details['port_id'],
+                                        details['network_id'],
+                                        details['network_type'],
+                                        details['physical_network'],
+                                        details['segmentation_id'],
+                                        details['admin_state_up'])
+                    devices_up.append(device)
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"), device)
+                    if (port and int(port.ofport) != -1):
+                        self.port_dead(port)
+            if devices_up:
                 # update plugin about port status
-                self.plugin_rpc.update_device_up(self.context,
-                                                 device,
-                                                 self.agent_id)
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-                if (port and int(port.ofport) != -1):
-                    self.port_dead(port)
+                self.plugin_rpc.update_devices_up(self.context,
+                                                  devices_up,
+                                                  self.agent_id)
         return resync
 
     def treat_ancillary_devices_added(self, devices):
         resync = False
-        for device in devices:
-            LOG.info(_("Ancillary Port %s added"), device)
+        for devices_batch in q_utils.split_list(list(devices),
+                                                self.device_rpc_batch_size):
+            LOG.info(_("Ancillary Ports %s added"), devices_batch)
             try:
-                self.plugin_rpc.get_device_details(self.context, device,
-                                                   self.agent_id)
+                self.plugin_rpc.get_devices_details_list(self.context,
+                                                         devices_batch,
+                                                         self.agent_id)
             except Exception as e:
                 LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                            "%(devices)s: %(e)s"),
+                          {'devices': devices_batch, 'e': e})
                 resync = True
                 continue
 
             # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id)
+            self.plugin_rpc.update_devices_up(self.context,
+                                              devices_batch,
+                                              self.agent_id)
         return resync
 
     def treat_devices_removed(self, devices):
         resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
+        for devices_batch in q_utils.split_list(list(devices),
+                                                self.device_rpc_batch_size):
+            LOG.info(_("Attachments %s removed"), devices_batch)
             try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
+                devices_details_list = self.plugin_rpc.update_devices_down(
+                    self.context, devices_batch, self.agent_id)
             except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                          {'devices': devices_batch, 'e': e})
                 resync = True
                 continue
-            if details['exists']:
-                LOG.info(_("Port %s updated."), device)
-                # Nothing to do regarding local networking
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
-                self.port_unbound(device)
+            for details in devices_details_list:
+                device = details['device']
+                if details['exists']:
+                    LOG.info(_("Port %s updated."), device)
+                    # Nothing to do regarding local networking
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"), device)
+                    self.port_unbound(device)
         return resync
 
     def treat_ancillary_devices_removed(self, devices):
         resync = False
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
+        for devices_batch in q_utils.split_list(list(devices),
+                                                self.device_rpc_batch_size):
+            LOG.info(_("Attachments %s removed"), devices_batch)
             try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
+                devices_details_list = self.plugin_rpc.update_devices_down(
+                    self.context, devices_batch, self.agent_id)
             except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
+                LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                          {'devices': devices_batch, 'e': e})
                 resync = True
                 continue
-            if details['exists']:
-                LOG.info(_("Port %s updated."), device)
-                # Nothing to do regarding local networking
-            else:
-                LOG.debug(_("Device %s not defined on plugin"), device)
+            for details in devices_details_list:
+                device = details['device']
+                if details['exists']:
+                    LOG.info(_("Port %s updated."), device)
+                    # Nothing to do regarding local networking
+                else:
+                    LOG.debug(_("Device %s not defined on plugin"), device)
         return resync
 
     def process_network_ports(self, port_info):
@@ -1022,7 +1058,10 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             resync = True
         return resync
 
-    def rpc_loop(self):
+    def rpc_loop(self, polling_manager=None):
+        if not polling_manager:
+            polling_manager = polling.AlwaysPoll()
+
         sync = True
         ports = set()
         ancillary_ports = set()
@@ -1036,28 +1075,38 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     ports.clear()
                     ancillary_ports.clear()
                     sync = False
+                    polling_manager.force_polling()
 
                 # Notify the plugin of tunnel IP
                 if self.enable_tunneling and tunnel_sync:
                     LOG.info(_("Agent tunnel out of sync with plugin!"))
                     tunnel_sync = self.tunnel_sync()
 
-                port_info = self.update_ports(ports)
+                if polling_manager.is_polling_required:
+                    port_info = self.update_ports(ports)
 
-                # notify plugin about port deltas
-                if port_info:
-                    LOG.debug(_("Agent loop has new devices!"))
-                    # If treat devices fails - must resync with plugin
-                    sync = self.process_network_ports(port_info)
-                    ports = port_info['current']
-
-                # Treat ancillary devices if they exist
-                if self.ancillary_brs:
-                    port_info = self.update_ancillary_ports(ancillary_ports)
+                    # notify plugin about port deltas
                     if port_info:
-                        rc = self.process_ancillary_network_ports(port_info)
-                        ancillary_ports = port_info['current']
-                        sync = sync | rc
+                        LOG.debug(_("Agent loop has new devices!"))
+                        # If treat devices fails - must resync with plugin
+                        sync = self.process_network_ports(port_info)
+                        ports = port_info['current']
+
+                    # Treat ancillary devices if they exist
+                    if self.ancillary_brs:
+                        port_info = self.update_ancillary_ports(
+                            ancillary_ports)
+                        if port_info:
+                            rc = self.process_ancillary_network_ports(
+                                port_info)
+                            ancillary_ports = port_info['current']
+                            sync = sync | rc
+
+                    polling_manager.polling_completed()
+
+                # Apply the security group updates received since the
+                # last iteration in a single pass
+                self.sg_agent.refresh_deferred_firewall()
 
             except Exception:
                 LOG.exception(_("Error in agent event loop"))
@@ -1075,7 +1124,13 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                            'elapsed': elapsed})
 
     def daemon_loop(self):
-        self.rpc_loop()
+        with polling.get_polling_manager(
+                self.minimize_polling,
+                self.root_helper,
+                self.ovsdb_monitor_respawn_interval,
+                self.minimize_polling_resync_interval) as pm:
+
+            self.rpc_loop(polling_manager=pm)
 
 
 def check_ovs_version(min_required_version, root_helper):
@@ -1137,6 +1192,12 @@ def create_agent_config_map(config):
         tunnel_types=config.AGENT.tunnel_types,
         veth_mtu=config.AGENT.veth_mtu,
         l2_population=config.AGENT.l2_population,
+        minimize_polling=config.AGENT.minimize_polling,
+        ovsdb_monitor_respawn_interval=(
+            config.AGENT.ovsdb_monitor_respawn_interval),
+        minimize_polling_resync_interval=(
+            config.AGENT.minimize_polling_resync_interval),
+        device_rpc_batch_size=config.AGENT.device_rpc_batch_size,
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
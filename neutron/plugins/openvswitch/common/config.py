@@ -62,6 +62,19 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('minimize_polling',
+                default=False,
+                help=_("Minimize polling by monitoring ovsdb for interface "
+                       "changes.")),
+    cfg.IntOpt('ovsdb_monitor_respawn_interval',
+               default=constants.DEFAULT_OVSDBMON_RESPAWN,
+               help=_("The number of seconds to wait before respawning the "
+                      "ovsdb monitor after losing communication with it")),
+    cfg.IntOpt('minimize_polling_resync_interval',
+               default=constants.DEFAULT_MINIMIZE_POLLING_RESYNC,
+               help=_("The maximum number of seconds between full polls of "
+                      "local devices when minimize_polling is enabled. "
+                      "Set to 0 to rely solely on the ovsdb monitor.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre and/or vxlan)")),
@@ -69,6 +82,12 @@ agent_opts = [
                help=_("The UDP port to use for VXLAN tunnels.")),
     cfg.IntOpt('veth_mtu', default=None,
                help=_("MTU size of veth interfaces")),
+    cfg.IntOpt('device_rpc_batch_size',
+               default=constants.DEFAULT_DEVICE_RPC_BATCH_SIZE,
+               help=_("The maximum number of devices the agent sends to "
+                      "the plugin in a single get_devices_details_list, "
+                      "update_devices_up or update_devices_down call. "
+                      "Set to 0 to send all devices in one call.")),
     cfg.BoolOpt('l2_population', default=False,
                 help=_("Use ml2 l2population mechanism driver to learn "
                        "remote mac and IPs and improve tunnel scalability")),
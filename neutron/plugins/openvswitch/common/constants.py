@@ -36,6 +36,9 @@ VETH_PHYSICAL_PREFIX = 'phy-'
 # The minimum version of OVS which supports VXLAN tunneling
 MINIMUM_OVS_VXLAN_VERSION = "1.10"
 
+# ofport value of an interface that OVS failed to (or has yet to) attach
+INVALID_OFPORT = -1
+
 # The different types of tunnels
 TUNNEL_NETWORK_TYPES = [TYPE_GRE, TYPE_VXLAN]
 
@@ -48,3 +51,12 @@ UCAST_TO_TUN = 20
 FLOOD_TO_TUN = 21
 # Map tunnel types to tables number
 TUN_TABLE = {TYPE_GRE: GRE_TUN_TO_LV, TYPE_VXLAN: VXLAN_TUN_TO_LV}
+
+# The default number of devices per bulk device RPC call
+DEFAULT_DEVICE_RPC_BATCH_SIZE = 100
+
+# The default respawn interval for the ovsdb monitor
+DEFAULT_OVSDBMON_RESPAWN = 30
+
+# The default interval at which a full poll is forced when minimizing polling
+DEFAULT_MINIMIZE_POLLING_RESYNC = 60
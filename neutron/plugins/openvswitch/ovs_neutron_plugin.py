@@ -73,8 +73,10 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
     # history
     #   1.0 Initial version
     #   1.1 Support Security Group RPC
+    #   1.2 Support get_devices_details_list, update_devices_up and
+    #       update_devices_down
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.2'
 
     def __init__(self, notifier, tunnel_type):
         self.notifier = notifier
@@ -100,60 +102,94 @@ class OVSRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
         """Agent requests device details."""
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested from %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = ovs_db_v2.get_port(device)
-        if port:
-            binding = ovs_db_v2.get_network_binding(None, port['network_id'])
-            entry = {'device': device,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up'],
-                     'network_type': binding.network_type,
-                     'segmentation_id': binding.segmentation_id,
-                     'physical_network': binding.physical_network}
+        return self.get_devices_details_list(rpc_context,
+                                             devices=[device],
+                                             agent_id=agent_id)[0]
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests details for a list of devices."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s details requested from %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = ovs_db_v2.get_ports(devices)
+        bindings = ovs_db_v2.get_network_bindings(
+            None, set(port['network_id'] for port in ports.itervalues()))
+        status_updates = {q_const.PORT_STATUS_ACTIVE: [],
+                          q_const.PORT_STATUS_DOWN: []}
+        entries = []
+        for device in devices:
+            port = ports.get(device)
+            binding = port and bindings.get(port['network_id'])
+            if not binding:
+                entries.append({'device': device})
+                LOG.debug(_("%s can not be found in database"), device)
+                continue
+            entries.append({'device': device,
+                            'network_id': port['network_id'],
+                            'port_id': port['id'],
+                            'admin_state_up': port['admin_state_up'],
+                            'network_type': binding.network_type,
+                            'segmentation_id': binding.segmentation_id,
+                            'physical_network': binding.physical_network})
             new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
                           else q_const.PORT_STATUS_DOWN)
             if port['status'] != new_status:
-                ovs_db_v2.set_port_status(port['id'], new_status)
-        else:
-            entry = {'device': device}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+                status_updates[new_status].append(port['id'])
+        for status, port_ids in status_updates.iteritems():
+            ovs_db_v2.set_ports_status(port_ids, status)
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
-        # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists on %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = ovs_db_v2.get_port(device)
-        if port:
-            entry = {'device': device,
-                     'exists': True}
-            if port['status'] != q_const.PORT_STATUS_DOWN:
-                # Set port status to DOWN
-                ovs_db_v2.set_port_status(port['id'], q_const.PORT_STATUS_DOWN)
-        else:
-            entry = {'device': device,
-                     'exists': False}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        return self.update_devices_down(rpc_context,
+                                        devices=[device],
+                                        agent_id=agent_id)[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent."""
+        # TODO(garyk) - live migration and port status
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = ovs_db_v2.get_ports(devices)
+        entries = []
+        for device in devices:
+            entries.append({'device': device,
+                            'exists': device in ports})
+            if device not in ports:
+                LOG.debug(_("%s can not be found in database"), device)
+        # Set port status to DOWN
+        ovs_db_v2.set_ports_status(
+            [port['id'] for port in ports.itervalues()
+             if port['status'] != q_const.PORT_STATUS_DOWN],
+            q_const.PORT_STATUS_DOWN)
+        return entries
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s up on %(agent_id)s"),
-                  {'device': device, 'agent_id': agent_id})
-        port = ovs_db_v2.get_port(device)
-        if port:
-            if port['status'] != q_const.PORT_STATUS_ACTIVE:
-                ovs_db_v2.set_port_status(port['id'],
-                                          q_const.PORT_STATUS_ACTIVE)
-        else:
-            LOG.debug(_("%s can not be found in database"), device)
+        self.update_devices_up(rpc_context, devices=[device],
+                               agent_id=agent_id)
+
+    def update_devices_up(self, rpc_context, **kwargs):
+        """Devices are up on agent."""
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        LOG.debug(_("Devices %(devices)s up on %(agent_id)s"),
+                  {'devices': devices, 'agent_id': agent_id})
+        ports = ovs_db_v2.get_ports(devices)
+        for device in devices:
+            if device not in ports:
+                LOG.debug(_("%s can not be found in database"), device)
+        ovs_db_v2.set_ports_status(
+            [port['id'] for port in ports.itervalues()
+             if port['status'] != q_const.PORT_STATUS_ACTIVE],
+            q_const.PORT_STATUS_ACTIVE)
 
     def tunnel_sync(self, rpc_context, **kwargs):
         """Update new tunnel.
@@ -320,7 +356,6 @@ class OVSNeutronPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
         # RPC support
         self.service_topics = {svc_constants.CORE: topics.PLUGIN,
                                svc_constants.L3_ROUTER_NAT: topics.L3PLUGIN}
-        self.conn = rpc.create_connection(new=True)
         self.notifier = AgentNotifierApi(topics.AGENT)
         self.agent_notifiers[q_const.AGENT_TYPE_DHCP] = (
             dhcp_rpc_agent_api.DhcpAgentNotifyAPI()
@@ -329,11 +364,15 @@ class OVSNeutronPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
             l3_rpc_agent_api.L3AgentNotify
         )
         self.callbacks = OVSRpcCallbacks(self.notifier, self.tunnel_type)
+
+    def start_rpc_listeners(self):
+        self.conn = rpc.create_connection(new=True)
         self.dispatcher = self.callbacks.create_rpc_dispatcher()
         for svc_topic in self.service_topics.values():
             self.conn.create_consumer(svc_topic, self.dispatcher, fanout=False)
         # Consume from all consumers in a thread
         self.conn.consume_in_thread()
+        return [self.conn]
 
     def _parse_network_vlan_ranges(self):
         try:
@@ -35,6 +35,10 @@ from neutron.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Rules of the policy engine compiled into functions, and the rules
+# they were compiled from
+_COMPILED_RULES = {}
+_COMPILED_FROM = None
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -61,6 +65,7 @@ def reset():
     global _POLICY_CACHE
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _reset_compiled_rules(None)
     policy.reset()
 
 
@@ -222,60 +227,74 @@ class OwnerCheck(policy.Check):
                 reason=err_reason)
         super(OwnerCheck, self).__init__(kind, match)
 
-    def __call__(self, target, creds):
-        if self.target_field not in target:
-            # policy needs a plugin check
-            # target field is in the form resource:field
-            # however if they're not separated by a colon, use an underscore
-            # as a separator for backward compatibility
+    def _get_parent_resource(self):
+        """Return the parent resource, field and foreign key to match."""
+        # target field is in the form resource:field
+        # however if they're not separated by a colon, use an underscore
+        # as a separator for backward compatibility
 
-            def do_split(separator):
-                parent_res, parent_field = self.target_field.split(
-                    separator, 1)
-                return parent_res, parent_field
+        def do_split(separator):
+            parent_res, parent_field = self.target_field.split(
+                separator, 1)
+            return parent_res, parent_field
 
-            for separator in (':', '_'):
-                try:
-                    parent_res, parent_field = do_split(separator)
-                    break
-                except ValueError:
-                    LOG.debug(_("Unable to find ':' as separator in %s."),
-                              self.target_field)
-            else:
-                # If we are here split failed with both separators
-                err_reason = (_("Unable to find resource name in %s") %
-                              self.target_field)
-                LOG.exception(err_reason)
-                raise exceptions.PolicyCheckError(
-                    policy="%s:%s" % (self.kind, self.match),
-                    reason=err_reason)
-            parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
-                "%ss" % parent_res, None)
-            if not parent_foreign_key:
-                err_reason = (_("Unable to verify match:%(match)s as the "
-                                "parent resource: %(res)s was not found") %
-                              {'match': self.match, 'res': parent_res})
-                LOG.exception(err_reason)
-                raise exceptions.PolicyCheckError(
-                    policy="%s:%s" % (self.kind, self.match),
-                    reason=err_reason)
-            # NOTE(salv-orlando): This check currently assumes the parent
-            # resource is handled by the core plugin. It might be worth
-            # having a way to map resources to plugins so to make this
-            # check more general
-            f = getattr(manager.NeutronManager.get_instance().plugin,
-                        'get_%s' % parent_res)
-            # f *must* exist, if not found it is better to let neutron
-            # explode. Check will be performed with admin context
-            context = importutils.import_module('neutron.context')
+        for separator in (':', '_'):
             try:
-                data = f(context.get_admin_context(),
-                         target[parent_foreign_key],
-                         fields=[parent_field])
-                target[self.target_field] = data[parent_field]
-            except Exception:
-                LOG.exception(_('Policy check error while calling %s!'), f)
-                raise
+                parent_res, parent_field = do_split(separator)
+                break
+            except ValueError:
+                LOG.debug(_("Unable to find ':' as separator in %s."),
+                          self.target_field)
+        else:
+            # If we are here split failed with both separators
+            err_reason = (_("Unable to find resource name in %s") %
+                          self.target_field)
+            LOG.exception(err_reason)
+            raise exceptions.PolicyCheckError(
+                policy="%s:%s" % (self.kind, self.match),
+                reason=err_reason)
+        parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+            "%ss" % parent_res, None)
+        if not parent_foreign_key:
+            err_reason = (_("Unable to verify match:%(match)s as the "
+                            "parent resource: %(res)s was not found") %
+                          {'match': self.match, 'res': parent_res})
+            LOG.exception(err_reason)
+            raise exceptions.PolicyCheckError(
+                policy="%s:%s" % (self.kind, self.match),
+                reason=err_reason)
+        return parent_res, parent_field, parent_foreign_key
+
+    def __call__(self, target, creds, owner_cache=None):
+        if self.target_field not in target:
+            # policy needs a plugin check
+            parent_res, parent_field, parent_foreign_key = (
+                self._get_parent_resource())
+            cache_key = (parent_res, target[parent_foreign_key],
+                         parent_field)
+            if owner_cache is not None and cache_key in owner_cache:
+                target[self.target_field] = owner_cache[cache_key]
+            else:
+                # NOTE(salv-orlando): This check currently assumes the
+                # parent resource is handled by the core plugin. It might
+                # be worth having a way to map resources to plugins so to
+                # make this check more general
+                f = getattr(manager.NeutronManager.get_instance().plugin,
+                            'get_%s' % parent_res)
+                # f *must* exist, if not found it is better to let neutron
+                # explode. Check will be performed with admin context
+                context = importutils.import_module('neutron.context')
+                try:
+                    data = f(context.get_admin_context(),
+                             target[parent_foreign_key],
+                             fields=[parent_field])
+                    target[self.target_field] = data[parent_field]
+                except Exception:
+                    LOG.exception(_('Policy check error while calling %s!'),
+                                  f)
+                    raise
+                if owner_cache is not None:
+                    owner_cache[cache_key] = data[parent_field]
         match = self.match % target
         if self.kind in creds:
             return match == unicode(creds[self.kind])
@@ -314,6 +333,132 @@ class FieldCheck(policy.Check):
         return target_value == self.value
 
 
+def _reset_compiled_rules(rules):
+    global _COMPILED_RULES
+    global _COMPILED_FROM
+    _COMPILED_RULES = {}
+    _COMPILED_FROM = rules
+
+
+def _is_role_only(rule, seen=None):
+    """Tell whether the outcome of a rule only depends on roles."""
+    if isinstance(rule, (policy.TrueCheck, policy.FalseCheck,
+                         policy.RoleCheck)):
+        return True
+    if isinstance(rule, policy.RuleCheck):
+        seen = seen or set()
+        if rule.match in seen:
+            return False
+        seen.add(rule.match)
+        try:
+            return _is_role_only(policy._rules[rule.match], seen)
+        except (KeyError, TypeError):
+            return True
+    if isinstance(rule, policy.NotCheck):
+        return _is_role_only(rule.rule, seen)
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        return all(_is_role_only(r, seen) for r in rule.rules)
+    return False
+
+
+def _compile(rule):
+    """Turn a check tree into a function(target, creds, roles, cache).
+
+    roles is the set of lower case roles of the credentials, and cache the
+    parent resources cache of the request, if any. Checks without a
+    compiled form are called as they are.
+    """
+    if isinstance(rule, policy.TrueCheck):
+        return lambda target, creds, roles, cache: True
+    if isinstance(rule, policy.FalseCheck):
+        return lambda target, creds, roles, cache: False
+    if isinstance(rule, policy.RoleCheck):
+        role = rule.match.lower()
+        return lambda target, creds, roles, cache: role in roles
+    if isinstance(rule, policy.RuleCheck):
+        name = rule.match
+        return lambda target, creds, roles, cache: _get_compiled_rule(
+            name)(target, creds, roles, cache)
+    if isinstance(rule, policy.NotCheck):
+        check = _compile(rule.rule)
+        return lambda target, creds, roles, cache: not check(
+            target, creds, roles, cache)
+    if isinstance(rule, policy.AndCheck):
+        checks = [_compile(r) for r in rule.rules]
+
+        def and_check(target, creds, roles, cache):
+            for check in checks:
+                if not check(target, creds, roles, cache):
+                    return False
+            return True
+        return and_check
+    if isinstance(rule, policy.OrCheck):
+        checks = [_compile(r) for r in rule.rules]
+
+        def or_check(target, creds, roles, cache):
+            for check in checks:
+                if check(target, creds, roles, cache):
+                    return True
+            return False
+        return or_check
+    if isinstance(rule, OwnerCheck):
+        return lambda target, creds, roles, cache: rule(
+            target, creds, owner_cache=cache)
+    return lambda target, creds, roles, cache: rule(target, creds)
+
+
+def _compile_named_rule(rule):
+    check = _compile(rule)
+    if not _is_role_only(rule):
+        return check
+    results = {}
+
+    def role_only_check(target, creds, roles, cache):
+        try:
+            return results[roles]
+        except KeyError:
+            result = results[roles] = check(target, creds, roles, cache)
+            return result
+    return role_only_check
+
+
+def _deny(target, creds, roles, cache):
+    return False
+
+
+def _get_compiled_rule(name):
+    """Return the compiled form of a rule of the policy engine.
+
+    Rules are compiled the first time they are used, and recompiled
+    when the policy engine loads new rules.
+    """
+    if policy._rules is not _COMPILED_FROM:
+        _reset_compiled_rules(policy._rules)
+    try:
+        return _COMPILED_RULES[name]
+    except KeyError:
+        pass
+    try:
+        rule = policy._rules[name]
+    except (KeyError, TypeError):
+        # No rule and no default rule: fail closed
+        compiled = _deny
+    else:
+        compiled = _compile_named_rule(rule)
+    _COMPILED_RULES[name] = compiled
+    return compiled
+
+
+def _check(match_rule, target, credentials, cache=None):
+    """Evaluate a check tree with the compiled rules."""
+    roles = frozenset(role.lower() for role in credentials.get('roles', []))
+    if isinstance(match_rule, policy.RuleCheck):
+        check = _get_compiled_rule(match_rule.match)
+    else:
+        check = _compile(match_rule)
+    return check(target, credentials, roles, cache)
+
+
 def _prepare_check(context, action, target):
     """Prepare rule, target, and credentials for the policy engine."""
     init()
@@ -325,6 +470,79 @@ def _prepare_check(context, action, target):
     return match_rule, target, credentials
 
 
+def _get_owner_checks(rule, seen):
+    """Yield the tenant_id checks of a rule and of the rules it uses."""
+    if isinstance(rule, OwnerCheck):
+        yield rule
+    elif isinstance(rule, policy.RuleCheck):
+        if rule.match not in seen:
+            seen.add(rule.match)
+            try:
+                referenced_rule = policy._rules[rule.match]
+            except (KeyError, TypeError):
+                return
+            for check in _get_owner_checks(referenced_rule, seen):
+                yield check
+    elif isinstance(rule, policy.NotCheck):
+        for check in _get_owner_checks(rule.rule, seen):
+            yield check
+    elif isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        for child in rule.rules:
+            for check in _get_owner_checks(child, seen):
+                yield check
+
+
+def prefetch_parent_resources(context, action, targets):
+    """Load the parent resources needed to authorize action on targets.
+
+    The parent resource fields matched by the tenant_id checks of the
+    action and of its attributes are fetched with a single plugin call
+    per parent resource, and stored in the owner cache of the context
+    instead of being fetched for each target.
+    """
+    owner_cache = getattr(context, 'owner_cache', None)
+    if owner_cache is None or not targets:
+        return
+    init()
+    seen = set()
+    parent_ids = {}
+    parent_fields = {}
+    for name, rule in policy._rules.iteritems():
+        if name != action and not name.startswith(action + ':'):
+            continue
+        for check in _get_owner_checks(rule, seen):
+            missing = [target for target in targets
+                       if check.target_field not in target]
+            if not missing:
+                continue
+            try:
+                parent_res, parent_field, parent_foreign_key = (
+                    check._get_parent_resource())
+            except exceptions.PolicyCheckError:
+                # Reported by the check of the target itself
+                continue
+            ids = set(target[parent_foreign_key] for target in missing
+                      if target.get(parent_foreign_key) is not None)
+            ids = [parent_id for parent_id in ids
+                   if (parent_res, parent_id, parent_field)
+                   not in owner_cache]
+            if ids:
+                parent_ids.setdefault(parent_res, set()).update(ids)
+                parent_fields.setdefault(parent_res, set()).add(parent_field)
+    if not parent_ids:
+        return
+    plugin = manager.NeutronManager.get_instance().plugin
+    admin_context = importutils.import_module(
+        'neutron.context').get_admin_context()
+    for parent_res, ids in parent_ids.iteritems():
+        fields = parent_fields[parent_res]
+        f = getattr(plugin, 'get_%ss' % parent_res)
+        for parent in f(admin_context, filters={'id': list(ids)},
+                        fields=['id'] + list(fields)):
+            for field in fields:
+                owner_cache[(parent_res, parent['id'], field)] = parent[field]
+
+
 def check(context, action, target, plugin=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -339,7 +557,8 @@ def check(context, action, target, plugin=None):
 
     :return: Returns True if access is permitted else False.
     """
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(*(_prepare_check(context, action, target)),
+                  cache=getattr(context, 'owner_cache', None))
 
 
 def check_if_exists(context, action, target):
@@ -355,7 +574,55 @@ def check_if_exists(context, action, target):
     # Raise if there's no match for requested action in the policy engine
     if not policy._rules or action not in policy._rules:
         raise exceptions.PolicyRuleNotFound(rule=action)
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(*(_prepare_check(context, action, target)),
+                  cache=getattr(context, 'owner_cache', None))
+
+
+def _check_without_target(rule, credentials):
+    if isinstance(rule, policy.TrueCheck):
+        return True
+    if isinstance(rule, policy.FalseCheck):
+        return False
+    if isinstance(rule, policy.RoleCheck):
+        return rule({}, credentials)
+    if isinstance(rule, policy.RuleCheck):
+        try:
+            return _check_without_target(policy._rules[rule.match],
+                                         credentials)
+        except KeyError:
+            # Unknown rules fail closed
+            return False
+    if isinstance(rule, policy.NotCheck):
+        result = _check_without_target(rule.rule, credentials)
+        return None if result is None else not result
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        decisive = isinstance(rule, policy.OrCheck)
+        results = [_check_without_target(r, credentials)
+                   for r in rule.rules]
+        if decisive in results:
+            return decisive
+        return None if None in results else not decisive
+    # Any other check depends on the target
+    return None
+
+
+def check_without_target(context, action):
+    """Verify if the action is authorized in this context for any target.
+
+    Returns True or False if the outcome of the action only depends on the
+    roles of the context, and None if it must be checked against each
+    target. Raises a PolicyRuleNotFound exception if the action is not
+    defined in the policy engine.
+    """
+    init()
+    if not policy._rules or action not in policy._rules:
+        raise exceptions.PolicyRuleNotFound(rule=action)
+    return _check_without_target(policy._rules[action], context.to_dict())
+
+
+def get_loaded_rules():
+    """Return the rules of the policy engine without reloading them."""
+    return policy._rules
 
 
 def enforce(context, action, target, plugin=None):
@@ -375,8 +642,11 @@ def enforce(context, action, target, plugin=None):
 
     init()
     rule, target, credentials = _prepare_check(context, action, target)
-    return policy.check(rule, target, credentials,
-                        exc=exceptions.PolicyNotAuthorized, action=action)
+    result = _check(rule, target, credentials,
+                    cache=getattr(context, 'owner_cache', None))
+    if not result:
+        raise exceptions.PolicyNotAuthorized(action=action)
+    return result
 
 
 def check_is_admin(context):
@@ -389,7 +659,7 @@ def check_is_admin(context):
     # found, default to validating role:admin
     admin_policy = (ADMIN_CTX_POLICY in policy._rules
                     and ADMIN_CTX_POLICY or 'role:admin')
-    return policy.check(admin_policy, target, credentials)
+    return _check(policy.RuleCheck('rule', admin_policy), target, credentials)
 
 
 def _extract_roles(rule, roles):
@@ -28,8 +28,11 @@ from neutron.common import config
 from neutron import service
 
 from neutron.openstack.common import gettextutils
+from neutron.openstack.common import log as logging
 gettextutils.install('neutron', lazy=True)
 
+LOG = logging.getLogger(__name__)
+
 
 def main():
     eventlet.monkey_patch()
@@ -41,8 +44,25 @@ def main():
                    " search paths (~/.neutron/, ~/, /etc/neutron/, /etc/) and"
                    " the '--config-file' option!"))
     try:
-        neutron_service = service.serve_wsgi(service.NeutronApiService)
-        neutron_service.wait()
+        pool = eventlet.GreenPool()
+
+        neutron_api = service.serve_wsgi(service.NeutronApiService)
+        # The API and RPC workers are supervised by the same launcher
+        api_launcher = neutron_api.wsgi_app.launcher
+        try:
+            neutron_rpc = service.serve_rpc(api_launcher)
+        except NotImplementedError:
+            LOG.info(_("RPC was already started in parent process by "
+                       "plugin."))
+            neutron_rpc = api_launcher
+        api_thread = pool.spawn(neutron_api.wait)
+        if neutron_rpc is not api_launcher:
+            rpc_thread = pool.spawn(neutron_rpc.wait)
+            # api and rpc should die together. When one dies, kill the other.
+            rpc_thread.link(lambda gt: api_thread.kill())
+            api_thread.link(lambda gt: rpc_thread.kill())
+
+        pool.waitall()
     except RuntimeError as e:
         sys.exit(_("ERROR: %s") % e)
 
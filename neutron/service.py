@@ -20,15 +20,19 @@ import logging as std_logging
 import os
 import random
 
+import eventlet.event
 from oslo.config import cfg
 
 from neutron.common import config
 from neutron.common import legacy
 from neutron import context
+from neutron.db import api
+from neutron import manager
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common.rpc import service
+from neutron.openstack.common import service as common_service
 from neutron import wsgi
 
 
@@ -41,6 +45,13 @@ service_opts = [
                help=_('Range of seconds to randomly delay when starting the '
                       'periodic task scheduler to reduce stampeding. '
                       '(Disable by setting to 0)')),
+    cfg.IntOpt('api_workers',
+               default=0,
+               help=_('Number of separate API worker processes for '
+                      'service')),
+    cfg.IntOpt('rpc_workers',
+               default=0,
+               help=_('Number of RPC worker processes for service')),
 ]
 CONF = cfg.CONF
 CONF.register_opts(service_opts)
@@ -111,7 +122,8 @@ def _run_wsgi(app_name):
         LOG.error(_('No known API applications configured.'))
         return
     server = wsgi.Server("Neutron")
-    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host)
+    server.start(app, cfg.CONF.bind_port, cfg.CONF.bind_host,
+                 workers=cfg.CONF.api_workers)
     # Dump all option values here after all options are parsed
     cfg.CONF.log_opt_values(LOG, std_logging.DEBUG)
     LOG.info(_("Neutron service started, listening on %(host)s:%(port)s"),
@@ -120,6 +132,62 @@ def _run_wsgi(app_name):
     return server
 
 
+class RpcWorker(object):
+    """Wraps the RPC listeners of a plugin to be handled by ProcessLauncher."""
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._connections = []
+        self._stopped = eventlet.event.Event()
+
+    def start(self):
+        self._connections = self._plugin.start_rpc_listeners()
+
+    def wait(self):
+        self._stopped.wait()
+
+    def stop(self):
+        for connection in self._connections:
+            try:
+                connection.close()
+            except Exception:
+                LOG.exception(_("Exception occurs when closing the RPC "
+                                "connection"))
+        self._connections = []
+        if not self._stopped.ready():
+            self._stopped.send()
+
+
+def serve_rpc(launcher=None):
+    """Start consuming the RPC topics of the core plugin.
+
+    With rpc_workers, the topics are consumed by as many worker processes
+    supervised by launcher, or by a new ProcessLauncher if not given.
+    Otherwise they are consumed by the calling process.
+
+    :returns: the RpcWorker, or the ProcessLauncher of the RPC workers.
+    :raises NotImplementedError: if the plugin consumes its topics itself.
+    """
+    plugin = manager.NeutronManager.get_plugin()
+    if not plugin.rpc_workers_supported():
+        if cfg.CONF.rpc_workers > 0:
+            LOG.error(_("'rpc_workers = %d' ignored because the core plugin "
+                        "does not implement start_rpc_listeners"),
+                      cfg.CONF.rpc_workers)
+        raise NotImplementedError()
+
+    rpc = RpcWorker(plugin)
+    if cfg.CONF.rpc_workers < 1:
+        rpc.start()
+        return rpc
+    # The connections of the database pool would be shared with the
+    # workers, which open their own ones instead
+    api.dispose_db()
+    if launcher is None:
+        launcher = common_service.ProcessLauncher()
+    launcher.launch_service(rpc, workers=cfg.CONF.rpc_workers)
+    return launcher
+
+
 class Service(service.Service):
     """Service object for binaries running on hosts.
 
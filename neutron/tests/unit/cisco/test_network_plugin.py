@@ -256,6 +256,22 @@ class TestCiscoPortsV2(CiscoNetworkPluginV2TestCase,
         if self._skip_native_bulk:
             self.skipTest("Plugin does not support native bulk port create")
 
+    def test_create_ports_bulk_native_unique_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+
+    def test_create_ports_bulk_native_with_requested_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+
+    def test_create_ports_bulk_native_duplicate_mac(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+
+    def test_create_ports_bulk_native_duplicate_ip(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+
     def test_create_ports_bulk_native_plugin_failure(self):
         if self._skip_native_bulk:
             self.skipTest("Plugin does not support native bulk port create")
@@ -157,6 +157,65 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                 agent.daemon_loop()
             self.assertEqual(3, log.call_count)
 
+    def test_treat_devices_added_batches_rpc_calls(self):
+        cfg.CONF.set_override('device_rpc_batch_size', 2, 'AGENT')
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        details_list = [[{'device': 'tap1', 'port_id': 'port1',
+                          'network_id': 'net1', 'network_type': 'local',
+                          'physical_network': None, 'segmentation_id': None,
+                          'admin_state_up': True},
+                         {'device': 'tap2'}],
+                        [{'device': 'tap3', 'port_id': 'port3',
+                          'network_id': 'net1', 'network_type': 'local',
+                          'physical_network': None, 'segmentation_id': None,
+                          'admin_state_up': True}]]
+        lbmgr_instance = self.lbmgr_mock.return_value
+        lbmgr_instance.add_interface.side_effect = [True, False]
+        with contextlib.nested(
+            mock.patch.object(agent, 'plugin_rpc'),
+            mock.patch.object(agent, 'prepare_devices_filter')
+        ) as (plugin_rpc, _):
+            plugin_rpc.get_devices_details_list.side_effect = details_list
+            self.assertFalse(agent.treat_devices_added(['tap1', 'tap2',
+                                                        'tap3']))
+        plugin_rpc.get_devices_details_list.assert_has_calls(
+            [mock.call(agent.context, ['tap1', 'tap2'], agent.agent_id),
+             mock.call(agent.context, ['tap3'], agent.agent_id)])
+        plugin_rpc.update_devices_up.assert_called_once_with(
+            agent.context, ['tap1'], agent.agent_id)
+        plugin_rpc.update_devices_down.assert_called_once_with(
+            agent.context, ['tap3'], agent.agent_id)
+
+    def test_treat_devices_added_rpc_failure_requires_resync(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(agent, 'plugin_rpc'),
+            mock.patch.object(agent, 'prepare_devices_filter')
+        ) as (plugin_rpc, _):
+            plugin_rpc.get_devices_details_list.side_effect = Exception()
+            self.assertTrue(agent.treat_devices_added(['tap1']))
+
+    def test_treat_devices_removed(self):
+        agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({},
+                                                                     0,
+                                                                     None)
+        with contextlib.nested(
+            mock.patch.object(agent, 'plugin_rpc'),
+            mock.patch.object(agent, 'remove_devices_filter')
+        ) as (plugin_rpc, _):
+            plugin_rpc.update_devices_down.return_value = [
+                {'device': 'tap1', 'exists': True},
+                {'device': 'tap2', 'exists': False}]
+            self.assertFalse(agent.treat_devices_removed(['tap1', 'tap2']))
+        plugin_rpc.update_devices_down.assert_called_once_with(
+            agent.context, ['tap1', 'tap2'], agent.agent_id)
+        self.assertEqual(
+            self.lbmgr_mock.return_value.remove_empty_bridges.call_count, 1)
+
 
 class TestLinuxBridgeManager(base.BaseTestCase):
     def setUp(self):
@@ -0,0 +1,132 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import eventlet.event
+import mock
+import testtools
+
+from neutron.plugins.ml2.common import exceptions as ml2_exc
+from neutron.plugins.ml2 import config
+from neutron.plugins.ml2 import managers
+from neutron.tests import base
+
+
+class TestMechanismManager(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMechanismManager, self).setUp()
+        self.addCleanup(config.cfg.CONF.reset)
+        self.drivers = [self._driver('first'), self._driver('second')]
+
+    def _driver(self, name):
+        driver = mock.Mock()
+        driver.name = name
+        driver.obj.concurrent_postcommit = True
+        return driver
+
+    def _manager(self, pool_size=0):
+        config.cfg.CONF.set_override('mechanism_drivers', [], group='ml2')
+        config.cfg.CONF.set_override('postcommit_pool_size', pool_size,
+                                     group='ml2')
+        manager = managers.MechanismManager()
+        manager.ordered_mech_drivers = self.drivers
+        return manager
+
+    def test_postcommit_called_in_order_by_default(self):
+        manager = self._manager()
+        self.drivers[0].obj.create_network_postcommit.side_effect = (
+            Exception())
+
+        with testtools.ExpectedException(ml2_exc.MechanismDriverError):
+            manager.create_network_postcommit(mock.sentinel.context)
+        self.assertFalse(self.drivers[1].obj.create_network_postcommit.called)
+
+    def test_postcommit_called_concurrently(self):
+        manager = self._manager(pool_size=2)
+        second_called = eventlet.event.Event()
+        # The first driver can only return once the second one is called
+        self.drivers[0].obj.create_network_postcommit.side_effect = (
+            lambda context: second_called.wait())
+        self.drivers[1].obj.create_network_postcommit.side_effect = (
+            lambda context: second_called.send())
+
+        with eventlet.Timeout(5):
+            manager.create_network_postcommit(mock.sentinel.context)
+        for driver in self.drivers:
+            driver.obj.create_network_postcommit.assert_called_once_with(
+                mock.sentinel.context)
+
+    def test_postcommit_pool_per_request(self):
+        manager = self._manager(pool_size=2)
+        started = []
+        all_started = eventlet.event.Event()
+
+        def postcommit(context):
+            started.append(context)
+            if len(started) == 4:
+                all_started.send()
+            all_started.wait()
+        for driver in self.drivers:
+            driver.obj.create_network_postcommit.side_effect = postcommit
+
+        # Both requests have their drivers called at once
+        with eventlet.Timeout(5):
+            requests = [eventlet.spawn(manager.create_network_postcommit,
+                                       context) for context in range(2)]
+            for request in requests:
+                request.wait()
+        self.assertEqual(4, len(started))
+
+    def test_postcommit_of_other_drivers_in_calling_thread(self):
+        manager = self._manager(pool_size=2)
+        self.drivers[1].obj.concurrent_postcommit = False
+        threads = {}
+        for driver in self.drivers:
+            driver.obj.create_network_postcommit.side_effect = (
+                lambda context, name=driver.name:
+                threads.setdefault(name, eventlet.getcurrent()))
+
+        manager.create_network_postcommit(mock.sentinel.context)
+        self.assertIsNot(eventlet.getcurrent(), threads['first'])
+        self.assertIs(eventlet.getcurrent(), threads['second'])
+
+    def test_concurrent_postcommit_failure(self):
+        manager = self._manager(pool_size=2)
+        self.drivers[0].obj.create_network_postcommit.side_effect = (
+            Exception())
+
+        with testtools.ExpectedException(ml2_exc.MechanismDriverError):
+            manager.create_network_postcommit(mock.sentinel.context)
+        self.drivers[1].obj.create_network_postcommit.assert_called_once_with(
+            mock.sentinel.context)
+
+    def test_precommit_called_in_order_with_pool(self):
+        manager = self._manager(pool_size=2)
+        self.drivers[0].obj.create_network_precommit.side_effect = Exception()
+
+        with testtools.ExpectedException(ml2_exc.MechanismDriverError):
+            manager.create_network_precommit(mock.sentinel.context)
+        self.assertFalse(self.drivers[1].obj.create_network_precommit.called)
+
+    def test_driver_call_time_logged(self):
+        manager = self._manager(pool_size=2)
+        with mock.patch.object(managers.LOG, 'debug') as debug:
+            manager.create_network_postcommit(mock.sentinel.context)
+
+        timed = [call[0][1]['name'] for call in debug.call_args_list
+                 if call[0][1].get('method') == 'create_network_postcommit'
+                 and 'seconds' in call[0][1]]
+        self.assertEqual(['first', 'second'], sorted(timed))
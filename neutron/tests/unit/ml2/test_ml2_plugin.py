@@ -13,9 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+import mock
+
+from neutron import context
 from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as pnet
+from neutron import manager
+from neutron.openstack.common.db.sqlalchemy import session as db_session
+from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import config
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 from neutron.tests.unit import test_db_plugin as test_plugin
@@ -52,6 +60,21 @@ class Ml2PluginV2TestCase(test_plugin.NeutronDbPluginV2TestCase):
         self.port_create_status = 'DOWN'
 
 
+class TestMl2RpcListeners(Ml2PluginV2TestCase):
+
+    def test_start_rpc_listeners(self):
+        plugin = manager.NeutronManager.get_plugin()
+        self.assertTrue(plugin.rpc_workers_supported())
+        with mock.patch('neutron.openstack.common.rpc.'
+                        'create_connection') as create_connection:
+            connections = plugin.start_rpc_listeners()
+        conn = create_connection.return_value
+        self.assertEqual([conn], connections)
+        conn.create_consumer.assert_called_once_with(
+            plugin.topic, mock.ANY, fanout=False)
+        conn.consume_in_thread.assert_called_once_with()
+
+
 class TestMl2BasicGet(test_plugin.TestBasicGet,
                       Ml2PluginV2TestCase):
     pass
@@ -64,7 +87,40 @@ class TestMl2V2HTTPResponse(test_plugin.TestV2HTTPResponse,
 
 class TestMl2NetworksV2(test_plugin.TestNetworksV2,
                         Ml2PluginV2TestCase):
-    pass
+
+    def _count_queries(self, func, *args):
+        dialect = db_session.get_engine(sqlite_fk=True).dialect
+        with mock.patch.object(dialect, 'do_execute',
+                               wraps=dialect.do_execute) as do_execute:
+            result = func(context.get_admin_context(), *args)
+        return result, do_execute.call_count
+
+    def _count_get_networks_queries(self):
+        plugin = manager.NeutronManager.get_plugin()
+        nets, count = self._count_queries(plugin.get_networks)
+        return len(nets), count
+
+    def test_list_networks_constant_queries(self):
+        def make_subnets(nets, first):
+            for i, net in enumerate(nets, first):
+                self._make_subnet(self.fmt, net, '10.0.%d.1' % i,
+                                  '10.0.%d.0/24' % i)
+
+        with contextlib.nested(self.network(), self.network()) as nets:
+            make_subnets(nets, 0)
+            count, queries = self._count_get_networks_queries()
+            self.assertEqual(2, count)
+            with contextlib.nested(self.network(), self.network()) as more:
+                make_subnets(more, 2)
+                self.assertEqual((4, queries),
+                                 self._count_get_networks_queries())
+
+    def test_get_network_model_does_not_load_subnets(self):
+        with self.subnet() as subnet:
+            plugin = manager.NeutronManager.get_plugin()
+            network, count = self._count_queries(
+                plugin._get_network, subnet['subnet']['network_id'])
+            self.assertEqual(1, count)
 
 
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
@@ -74,6 +130,38 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def test_create_ports_bulk_calls_mechanism_drivers_once(self):
+        mech_manager = manager.NeutronManager.get_plugin().mechanism_manager
+        with contextlib.nested(
+            mock.patch.object(mech_manager, 'create_port_bulk_precommit'),
+            mock.patch.object(mech_manager, 'create_port_bulk_postcommit'),
+            mock.patch.object(mech_manager, 'create_port_postcommit'),
+            self.network()
+        ) as (precommit, postcommit, port_postcommit, net):
+            res = self._create_port_bulk(self.fmt, 3, net['network']['id'],
+                                         'test', True)
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize(self.fmt, res)['ports']
+            for bulk_call in (precommit, postcommit):
+                contexts = bulk_call.call_args[0][0]
+                self.assertEqual([p['id'] for p in ports],
+                                 [c.current['id'] for c in contexts])
+            self.assertFalse(port_postcommit.called)
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_postcommit_failure_deletes_ports(self):
+        mech_manager = manager.NeutronManager.get_plugin().mechanism_manager
+        with contextlib.nested(
+            mock.patch.object(mech_manager, 'create_port_bulk_postcommit',
+                              side_effect=ml2_exc.MechanismDriverError(
+                                  method='create_port_bulk_postcommit')),
+            self.network()
+        ) as (postcommit, net):
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True)
+            self._validate_behavior_on_bulk_failure(res, 'ports', 500)
+
 
 class TestMl2PortBinding(Ml2PluginV2TestCase,
                          test_bindings.PortBindingsTestCase):
@@ -117,6 +205,64 @@ class TestMultiSegmentNetworks(Ml2PluginV2TestCase):
         self.assertEqual(network['network'][pnet.SEGMENTATION_ID], 1)
         self.assertNotIn(mpnet.SEGMENTS, network['network'])
 
+    def test_list_networks_with_provider_filters(self):
+        net_ids = []
+        for vlan_id in (1, 2):
+            data = {'network': {'name': 'net%d' % vlan_id,
+                                pnet.NETWORK_TYPE: 'vlan',
+                                pnet.PHYSICAL_NETWORK: 'physnet1',
+                                pnet.SEGMENTATION_ID: vlan_id,
+                                'tenant_id': 'tenant_one'}}
+            network_req = self.new_create_request('networks', data)
+            network = self.deserialize(self.fmt,
+                                       network_req.get_response(self.api))
+            net_ids.append(network['network']['id'])
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+
+        def get_network_ids(**filters):
+            return sorted(net['id'] for net in
+                          plugin.get_networks(ctx, filters=filters))
+
+        self.assertEqual(sorted(net_ids), get_network_ids(**{
+            pnet.PHYSICAL_NETWORK: ['physnet1']}))
+        self.assertEqual([net_ids[1]], get_network_ids(**{
+            pnet.NETWORK_TYPE: ['vlan'],
+            pnet.PHYSICAL_NETWORK: ['physnet1'],
+            pnet.SEGMENTATION_ID: [2]}))
+        self.assertEqual([], get_network_ids(**{
+            pnet.NETWORK_TYPE: ['gre'],
+            pnet.SEGMENTATION_ID: [2]}))
+        nets = plugin.get_networks(ctx, filters={
+            pnet.PHYSICAL_NETWORK: ['physnet1']},
+            sorts=[('name', False), ('id', True)], limit=1)
+        self.assertEqual([net_ids[1]], [net['id'] for net in nets])
+        self.assertEqual(1, plugin.get_networks_count(ctx, filters={
+            pnet.SEGMENTATION_ID: [2]}))
+
+    def test_list_networks_with_provider_filters_not_admin(self):
+        data = {'network': {'name': 'net1',
+                            pnet.NETWORK_TYPE: 'vlan',
+                            pnet.PHYSICAL_NETWORK: 'physnet1',
+                            pnet.SEGMENTATION_ID: 1,
+                            'shared': True,
+                            'tenant_id': 'tenant_one'}}
+        network_req = self.new_create_request('networks', data)
+        network = self.deserialize(self.fmt,
+                                   network_req.get_response(self.api))
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.Context('', 'tenant_two')
+
+        # The filters on the admin only provider attributes are ignored,
+        # or they would disclose the segments of the network
+        for vlan_id in (1, 2):
+            nets = plugin.get_networks(ctx, filters={
+                pnet.SEGMENTATION_ID: [vlan_id]})
+            self.assertEqual([network['network']['id']],
+                             [net['id'] for net in nets])
+            self.assertEqual(1, plugin.get_networks_count(ctx, filters={
+                pnet.SEGMENTATION_ID: [vlan_id]}))
+
     def test_create_network_single_multiprovider(self):
         data = {'network': {'name': 'net1',
                             mpnet.SEGMENTS:
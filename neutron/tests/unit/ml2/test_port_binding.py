@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+from neutron import context
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.plugins.ml2 import config as config
@@ -76,3 +79,29 @@ class PortBindingTestCase(test_plugin.NeutronDbPluginV2TestCase):
         self._test_port_binding("host-bridge-filter",
                                 portbindings.VIF_TYPE_BRIDGE,
                                 True, True)
+
+    def test_get_devices_details_list(self):
+        host_arg = {portbindings.HOST_ID: "host-ovs-no_filter"}
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg),
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg)
+            ) as (port1, port2):
+                port_ids = [port1['port']['id'], port2['port']['id']]
+                devices = port_ids + ['unknown']
+                details = self.plugin.callbacks.get_devices_details_list(
+                    None, agent_id="theAgentId", devices=devices)
+                self.assertEqual([d['device'] for d in details], devices)
+                self.assertEqual([d.get('port_id') for d in details],
+                                 port_ids + [None])
+                self.assertEqual(details[0]['network_type'], 'local')
+
+                result = self.plugin.callbacks.update_devices_down(
+                    context.get_admin_context(), agent_id="theAgentId",
+                    devices=devices)
+                self.assertEqual(result,
+                                 [{'device': port_ids[0], 'exists': True},
+                                  {'device': port_ids[1], 'exists': True},
+                                  {'device': 'unknown', 'exists': False}])
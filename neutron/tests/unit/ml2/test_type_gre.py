@@ -13,11 +13,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
+import mock
 import testtools
 from testtools import matchers
 
 from neutron.common import exceptions as exc
 import neutron.db.api as db
+from neutron.openstack.common.db import exception as db_exc
 from neutron.plugins.ml2 import db as ml2_db
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers import type_gre
@@ -40,6 +44,7 @@ class GreTypeTest(base.BaseTestCase):
         self.driver.gre_id_ranges = TUNNEL_RANGES
         self.driver._sync_gre_allocations()
         self.session = db.get_session()
+        self.addCleanup(db.clear_db)
 
     def test_validate_provider_segment(self):
         segment = {api.NETWORK_TYPE: 'gre',
@@ -54,58 +59,82 @@ class GreTypeTest(base.BaseTestCase):
             self.driver.validate_provider_segment(segment)
 
     def test_sync_tunnel_allocations(self):
-        self.assertIsNone(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MIN - 1))
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MIN)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MIN + 1)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MAX - 1)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MAX)).allocated
-        )
-        self.assertIsNone(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MAX + 1))
-        )
+        with self.session.begin():
+            self.session.add(type_gre.GreAllocation(gre_id=TUN_MIN,
+                                                    allocated=False))
+        segment = {api.NETWORK_TYPE: 'gre',
+                   api.PHYSICAL_NETWORK: 'None',
+                   api.SEGMENTATION_ID: TUN_MAX}
+        self.driver.reserve_provider_segment(self.session, segment)
 
         self.driver.gre_id_ranges = UPDATED_TUNNEL_RANGES
         self.driver._sync_gre_allocations()
 
         self.assertIsNone(
+            self.driver.get_gre_allocation(self.session, TUN_MIN))
+        self.assertTrue(
+            self.driver.get_gre_allocation(self.session, TUN_MAX).allocated)
+        for x in xrange(TUN_MIN + 5, TUN_MAX + 5):
+            segment = self.driver.allocate_tenant_segment(self.session)
+            self.assertThat(segment[api.SEGMENTATION_ID],
+                            matchers.GreaterThan(TUN_MIN + 5 - 1))
+            self.assertThat(segment[api.SEGMENTATION_ID],
+                            matchers.LessThan(TUN_MAX + 5 + 1))
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
+    def test_sync_large_tunnel_range(self):
+        self.driver.gre_id_ranges = [(1, 2 ** 31 - 1)]
+        self.driver._sync_gre_allocations()
+
+        self.assertEqual(
+            0, self.session.query(type_gre.GreAllocation).count())
+        segment = self.driver.allocate_tenant_segment(self.session)
+        alloc = self.driver.get_gre_allocation(self.session,
+                                               segment[api.SEGMENTATION_ID])
+        self.assertTrue(alloc.allocated)
+
+    def test_allocate_all_taken_random_candidates(self):
+        self.driver.reserve_provider_segment(
+            self.session, {api.NETWORK_TYPE: 'gre',
+                           api.PHYSICAL_NETWORK: 'None',
+                           api.SEGMENTATION_ID: TUN_MIN})
+        with mock.patch.object(self.driver, '_random_tunnel_ids',
+                               return_value=set([TUN_MIN])):
+            segment = self.driver.allocate_tenant_segment(self.session)
+        self.assertEqual(TUN_MIN + 1, segment[api.SEGMENTATION_ID])
+
+    def _allocate_concurrently(self, tunnel_id):
+        # Another server allocates the tunnel ID just before this one
+        add_allocation = self.driver._add_allocation
+
+        def concurrent_add_allocation(session, alloc, allocated_id):
+            if allocated_id == tunnel_id:
+                concurrent_session = db.get_session()
+                with concurrent_session.begin():
+                    concurrent_session.add(type_gre.GreAllocation(
+                        gre_id=tunnel_id, allocated=True))
+            return add_allocation(session, alloc, allocated_id)
+        return mock.patch.object(self.driver, '_add_allocation',
+                                 side_effect=concurrent_add_allocation)
+
+    def test_allocate_tenant_segment_allocated_concurrently(self):
+        with contextlib.nested(
+            mock.patch.object(self.driver, '_random_tunnel_ids',
+                              return_value=set([TUN_MIN])),
+            self._allocate_concurrently(TUN_MIN)):
+            segment = self.driver.allocate_tenant_segment(self.session)
+        self.assertEqual(TUN_MIN + 1, segment[api.SEGMENTATION_ID])
+        self.assertTrue(
             self.driver.get_gre_allocation(self.session,
-                                           (TUN_MIN + 5 - 1))
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MIN + 5)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MIN + 5 + 1)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MAX + 5 - 1)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MAX + 5)).allocated
-        )
-        self.assertIsNone(
-            self.driver.get_gre_allocation(self.session,
-                                           (TUN_MAX + 5 + 1))
-        )
+                                           TUN_MIN + 1).allocated)
+
+    def test_reserve_provider_segment_reserved_concurrently(self):
+        segment = {api.NETWORK_TYPE: 'gre',
+                   api.PHYSICAL_NETWORK: 'None',
+                   api.SEGMENTATION_ID: TUN_MIN}
+        with self._allocate_concurrently(TUN_MIN):
+            with testtools.ExpectedException(exc.TunnelIdInUse):
+                self.driver.reserve_provider_segment(self.session, segment)
 
     def test_reserve_provider_segment(self):
         segment = {api.NETWORK_TYPE: 'gre',
@@ -122,7 +151,7 @@ class GreTypeTest(base.BaseTestCase):
         self.driver.release_segment(self.session, segment)
         alloc = self.driver.get_gre_allocation(self.session,
                                                segment[api.SEGMENTATION_ID])
-        self.assertFalse(alloc.allocated)
+        self.assertIsNone(alloc)
 
         segment[api.SEGMENTATION_ID] = 1000
         self.driver.reserve_provider_segment(self.session, segment)
@@ -174,3 +203,16 @@ class GreTypeTest(base.BaseTestCase):
         for endpoint in endpoints:
             self.assertIn(endpoint['ip_address'],
                           [TUNNEL_IP_ONE, TUNNEL_IP_TWO])
+
+
+class GreTypeAllocationTest(base.BaseTestCase):
+
+    def test_add_allocation_allocated_concurrently(self):
+        session = mock.MagicMock()
+        session.bind.dialect.name = 'mysql'
+        begin_nested = session.begin_nested.return_value
+        begin_nested.__exit__.side_effect = db_exc.DBDuplicateEntry()
+        alloc = type_gre.GreAllocation(gre_id=TUN_MIN, allocated=True)
+        self.assertFalse(type_gre.GreTypeDriver._add_allocation(
+            session, alloc, TUN_MIN))
+        session.add.assert_called_once_with(alloc)
@@ -0,0 +1,122 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+from sqlalchemy.orm import query
+
+from neutron.db import api as db
+from neutron.plugins.ml2 import db as ml2_db
+from neutron.plugins.ml2 import driver_api as api
+from neutron.plugins.ml2.drivers import type_vlan
+from neutron.tests import base
+
+PROVIDER_NET = 'phys_net1'
+VLAN_MIN = 200
+VLAN_MAX = 219
+
+
+class VlanTypeTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(VlanTypeTest, self).setUp()
+        ml2_db.initialize()
+        cfg.CONF.set_override('network_vlan_ranges',
+                              ['%s:%s:%s' % (PROVIDER_NET, VLAN_MIN,
+                                             VLAN_MAX)],
+                              group='ml2_type_vlan')
+        self.driver = type_vlan.VlanTypeDriver()
+        self.driver._sync_vlan_allocations()
+        self.session = db.get_session()
+        self.addCleanup(cfg.CONF.reset)
+        self.addCleanup(db.clear_db)
+
+    def _get_allocation(self, vlan_id):
+        return (self.session.query(type_vlan.VlanAllocation).
+                filter_by(physical_network=PROVIDER_NET,
+                          vlan_id=vlan_id).first())
+
+    def test_allocate_tenant_segment(self):
+        vlan_ids = set()
+        for x in xrange(VLAN_MIN, VLAN_MAX + 1):
+            segment = self.driver.allocate_tenant_segment(self.session)
+            self.assertEqual(PROVIDER_NET, segment[api.PHYSICAL_NETWORK])
+            vlan_ids.add(segment[api.SEGMENTATION_ID])
+            self.assertTrue(
+                self._get_allocation(segment[api.SEGMENTATION_ID]).allocated)
+        self.assertEqual(set(xrange(VLAN_MIN, VLAN_MAX + 1)), vlan_ids)
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
+    def test_allocate_tenant_segment_retries_concurrent_allocation(self):
+        picks = []
+
+        def pick(candidates):
+            # Another server allocates the first pick before this one
+            picks.append(candidates[0])
+            if len(picks) == 1:
+                self.driver.reserve_provider_segment(
+                    db.get_session(),
+                    {api.NETWORK_TYPE: type_vlan.TYPE_VLAN,
+                     api.PHYSICAL_NETWORK: candidates[0][0],
+                     api.SEGMENTATION_ID: candidates[0][1]})
+            return candidates[0]
+
+        with mock.patch.object(type_vlan.random, 'choice', side_effect=pick):
+            segment = self.driver.allocate_tenant_segment(self.session)
+
+        self.assertEqual(2, len(picks))
+        self.assertNotEqual(picks[0][1], segment[api.SEGMENTATION_ID])
+        self.assertTrue(self._get_allocation(picks[0][1]).allocated)
+        self.assertTrue(
+            self._get_allocation(segment[api.SEGMENTATION_ID]).allocated)
+
+    def test_allocate_tenant_segment_retries_until_allocated(self):
+        # The first 12 picks are lost to concurrent allocations, which this
+        # transaction still sees as free
+        update = query.Query.update
+        lost = iter(range(12))
+
+        def concurrent_update(self, values):
+            if next(lost, None) is not None:
+                return 0
+            return update(self, values)
+
+        with contextlib.nested(
+            mock.patch.object(type_vlan.random, 'choice',
+                              side_effect=lambda candidates: candidates[0]),
+            mock.patch.object(query.Query, 'update', new=concurrent_update)
+        ) as (choice, update_mock):
+            segment = self.driver.allocate_tenant_segment(self.session)
+
+        self.assertEqual(13, choice.call_count)
+        picks = [call[0][0][0] for call in choice.call_args_list]
+        self.assertEqual(13, len(set(picks)))
+        self.assertEqual(picks[-1], (segment[api.PHYSICAL_NETWORK],
+                                     segment[api.SEGMENTATION_ID]))
+        self.assertTrue(
+            self._get_allocation(segment[api.SEGMENTATION_ID]).allocated)
+
+    def test_allocate_tenant_segment_all_lost(self):
+        with contextlib.nested(
+            mock.patch.object(type_vlan.random, 'choice',
+                              side_effect=lambda candidates: candidates[0]),
+            mock.patch.object(query.Query, 'update', return_value=0)
+        ) as (choice, update):
+            segment = self.driver.allocate_tenant_segment(self.session)
+
+        self.assertIsNone(segment)
+        self.assertEqual(VLAN_MAX - VLAN_MIN + 1, choice.call_count)
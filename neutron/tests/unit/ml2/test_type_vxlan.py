@@ -14,6 +14,9 @@
 #    under the License.
 # @author: Kyle Mestery, Cisco Systems, Inc.
 
+import contextlib
+
+import mock
 from oslo.config import cfg
 import testtools
 from testtools import matchers
@@ -69,52 +72,75 @@ class VxlanTypeTest(base.BaseTestCase):
             self.driver.validate_provider_segment(segment)
 
     def test_sync_tunnel_allocations(self):
-        self.assertIsNone(
-            self.driver.get_vxlan_allocation(self.session,
-                                             (TUN_MIN - 1))
-        )
-        self.assertFalse(
-            self.driver.get_vxlan_allocation(self.session,
-                                             (TUN_MIN)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_vxlan_allocation(self.session,
-                                             (TUN_MIN + 1)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_vxlan_allocation(self.session,
-                                             (TUN_MAX - 1)).allocated
-        )
-        self.assertFalse(
-            self.driver.get_vxlan_allocation(self.session,
-                                             (TUN_MAX)).allocated
-        )
-        self.assertIsNone(
-            self.driver.get_vxlan_allocation(self.session,
-                                             (TUN_MAX + 1))
-        )
+        with self.session.begin():
+            self.session.add(type_vxlan.VxlanAllocation(vxlan_vni=TUN_MIN,
+                                                        allocated=False))
+        segment = {api.NETWORK_TYPE: 'vxlan',
+                   api.PHYSICAL_NETWORK: 'None',
+                   api.SEGMENTATION_ID: TUN_MAX}
+        self.driver.reserve_provider_segment(self.session, segment)
 
         self.driver.vxlan_vni_ranges = UPDATED_TUNNEL_RANGES
         self.driver._sync_vxlan_allocations()
 
-        self.assertIsNone(self.driver.
-                          get_vxlan_allocation(self.session,
-                          (TUN_MIN + 5 - 1)))
-        self.assertFalse(self.driver.
-                         get_vxlan_allocation(self.session, (TUN_MIN + 5)).
-                         allocated)
-        self.assertFalse(self.driver.
-                         get_vxlan_allocation(self.session, (TUN_MIN + 5 + 1)).
-                         allocated)
-        self.assertFalse(self.driver.
-                         get_vxlan_allocation(self.session, (TUN_MAX + 5 - 1)).
-                         allocated)
-        self.assertFalse(self.driver.
-                         get_vxlan_allocation(self.session, (TUN_MAX + 5)).
-                         allocated)
-        self.assertIsNone(self.driver.
-                          get_vxlan_allocation(self.session,
-                          (TUN_MAX + 5 + 1)))
+        self.assertIsNone(
+            self.driver.get_vxlan_allocation(self.session, TUN_MIN))
+        self.assertTrue(
+            self.driver.get_vxlan_allocation(self.session,
+                                             TUN_MAX).allocated)
+        for x in xrange(TUN_MIN + 5, TUN_MAX + 5):
+            segment = self.driver.allocate_tenant_segment(self.session)
+            self.assertThat(segment[api.SEGMENTATION_ID],
+                            matchers.GreaterThan(TUN_MIN + 5 - 1))
+            self.assertThat(segment[api.SEGMENTATION_ID],
+                            matchers.LessThan(TUN_MAX + 5 + 1))
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
+    def test_initialize_large_vni_range(self):
+        cfg.CONF.set_override('vni_ranges',
+                              ['1:%s' % type_vxlan.MAX_VXLAN_VNI],
+                              group='ml2_type_vxlan')
+        self.driver.initialize()
+
+        self.assertEqual(
+            0, self.session.query(type_vxlan.VxlanAllocation).count())
+        segment = self.driver.allocate_tenant_segment(self.session)
+        alloc = self.driver.get_vxlan_allocation(self.session,
+                                                 segment[api.SEGMENTATION_ID])
+        self.assertTrue(alloc.allocated)
+
+    def _allocate_concurrently(self, tunnel_id):
+        # Another server allocates the tunnel ID just before this one
+        add_allocation = self.driver._add_allocation
+
+        def concurrent_add_allocation(session, alloc, allocated_id):
+            if allocated_id == tunnel_id:
+                concurrent_session = db.get_session()
+                with concurrent_session.begin():
+                    concurrent_session.add(type_vxlan.VxlanAllocation(
+                        vxlan_vni=tunnel_id, allocated=True))
+            return add_allocation(session, alloc, allocated_id)
+        return mock.patch.object(self.driver, '_add_allocation',
+                                 side_effect=concurrent_add_allocation)
+
+    def test_allocate_tenant_segment_allocated_concurrently(self):
+        with contextlib.nested(
+            mock.patch.object(self.driver, '_random_tunnel_ids',
+                              return_value=set([TUN_MIN])),
+            self._allocate_concurrently(TUN_MIN)):
+            segment = self.driver.allocate_tenant_segment(self.session)
+        self.assertEqual(TUN_MIN + 1, segment[api.SEGMENTATION_ID])
+        self.assertTrue(
+            self.driver.get_vxlan_allocation(self.session,
+                                             TUN_MIN + 1).allocated)
+
+    def test_reserve_provider_segment_reserved_concurrently(self):
+        segment = {api.NETWORK_TYPE: 'vxlan',
+                   api.PHYSICAL_NETWORK: 'None',
+                   api.SEGMENTATION_ID: TUN_MIN}
+        with self._allocate_concurrently(TUN_MIN):
+            with testtools.ExpectedException(exc.TunnelIdInUse):
+                self.driver.reserve_provider_segment(self.session, segment)
 
     def test_reserve_provider_segment(self):
         segment = {api.NETWORK_TYPE: 'vxlan',
@@ -131,7 +157,7 @@ class VxlanTypeTest(base.BaseTestCase):
         self.driver.release_segment(self.session, segment)
         alloc = self.driver.get_vxlan_allocation(self.session,
                                                  segment[api.SEGMENTATION_ID])
-        self.assertFalse(alloc.allocated)
+        self.assertIsNone(alloc)
 
         segment[api.SEGMENTATION_ID] = 1000
         self.driver.reserve_provider_segment(self.session, segment)
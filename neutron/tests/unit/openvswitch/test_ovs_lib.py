@@ -267,7 +267,7 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
-        ofport = "6"
+        ofport = 6
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
 
@@ -275,18 +275,20 @@ class OVS_Lib_Test(base.BaseTestCase):
                       root_helper=self.root_helper).AndReturn("%s\n" % pname)
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {"xs-vif-uuid": vif_id, "attached-mac": mac}
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = {"iface-id": vif_id, "attached-mac": mac}
 
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "external_ids"],
-                      root_helper=self.root_helper).AndReturn(external_ids)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+        # A single call returns all the interfaces, including those
+        # of other bridges
+        headings = ['name', 'ofport', 'external_ids']
+        data = [[pname, ofport, external_ids],
+                ['tap88', 7, {"iface-id": "tap88id", "attached-mac": mac}]]
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--", "--columns=name,ofport,external_ids",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          self._encode_ovs_json(headings, data))
         if is_xen:
             utils.execute(["xe", "vif-param-get", "param-name=other-config",
                            "param-key=nicira-iface-id", "uuid=" + vif_id],
@@ -310,12 +312,15 @@ class OVS_Lib_Test(base.BaseTestCase):
             ovs_row = []
             r["data"].append(ovs_row)
             for cell in row:
-                if isinstance(cell, str):
+                if isinstance(cell, (str, int)):
                     ovs_row.append(cell)
                 elif isinstance(cell, dict):
                     ovs_row.append(["map", cell.items()])
+                elif isinstance(cell, set):
+                    ovs_row.append(["set", list(cell)])
                 else:
-                    raise TypeError('%r not str or dict' % type(cell))
+                    raise TypeError('%r not str, int, dict or set' %
+                                    type(cell))
         return jsonutils.dumps(r)
 
     def _test_get_vif_port_set(self, is_xen):
@@ -327,18 +332,18 @@ class OVS_Lib_Test(base.BaseTestCase):
         else:
             id_key = 'iface-id'
 
-        headings = ['name', 'external_ids']
+        headings = ['name', 'ofport', 'external_ids']
         data = [
             # A vif port on this bridge:
-            ['tap99', {id_key: 'tap99id', 'attached-mac': 'tap99mac'}],
+            ['tap99', 1, {id_key: 'tap99id', 'attached-mac': 'tap99mac'}],
             # A vif port on another bridge:
-            ['tap88', {id_key: 'tap88id', 'attached-mac': 'tap88id'}],
+            ['tap88', 2, {id_key: 'tap88id', 'attached-mac': 'tap88id'}],
             # Non-vif port on this bridge:
-            ['tun22', {}],
+            ['tun22', 3, {}],
         ]
 
         utils.execute(["ovs-vsctl", self.TO, "--format=json",
-                       "--", "--columns=name,external_ids",
+                       "--", "--columns=name,ofport,external_ids",
                        "list", "Interface"],
                       root_helper=self.root_helper).AndReturn(
                           self._encode_ovs_json(headings, data))
@@ -369,10 +374,11 @@ class OVS_Lib_Test(base.BaseTestCase):
         utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
                       root_helper=self.root_helper).AndRaise(RuntimeError())
         utils.execute(["ovs-vsctl", self.TO, "--format=json",
-                       "--", "--columns=name,external_ids",
+                       "--", "--columns=name,ofport,external_ids",
                        "list", "Interface"],
                       root_helper=self.root_helper).AndReturn(
-                          self._encode_ovs_json(['name', 'external_ids'], []))
+                          self._encode_ovs_json(
+                              ['name', 'ofport', 'external_ids'], []))
         self.mox.ReplayAll()
         self.assertEqual(set(), self.br.get_vif_port_set())
         self.mox.VerifyAll()
@@ -381,7 +387,7 @@ class OVS_Lib_Test(base.BaseTestCase):
         utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
                       root_helper=self.root_helper).AndRaise('tap99\n')
         utils.execute(["ovs-vsctl", self.TO, "--format=json",
-                       "--", "--columns=name,external_ids",
+                       "--", "--columns=name,ofport,external_ids",
                        "list", "Interface"],
                       root_helper=self.root_helper).AndRaise(RuntimeError())
         self.mox.ReplayAll()
@@ -396,20 +402,52 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.br.clear_db_attribute("Port", pname, "tag")
         self.mox.VerifyAll()
 
-    def test_port_id_regex(self):
-        result = ('external_ids        : {attached-mac="fa:16:3e:23:5b:f2",'
-                  ' iface-id="5c1321a7-c73f-4a77-95e6-9f86402e5c8f",'
-                  ' iface-status=active}\nname                :'
-                  ' "dhc5c1321a7-c7"\nofport              : 2\n')
-        match = self.br.re_id.search(result)
-        vif_mac = match.group('vif_mac')
-        vif_id = match.group('vif_id')
-        port_name = match.group('port_name')
-        ofport = int(match.group('ofport'))
-        self.assertEqual(vif_mac, 'fa:16:3e:23:5b:f2')
-        self.assertEqual(vif_id, '5c1321a7-c73f-4a77-95e6-9f86402e5c8f')
-        self.assertEqual(port_name, 'dhc5c1321a7-c7')
-        self.assertEqual(ofport, 2)
+    def test_get_vif_port_set_ignores_invalid_json(self):
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn('tap99\n')
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--", "--columns=name,ofport,external_ids",
+                       "list", "Interface"],
+                      root_helper=self.root_helper).AndReturn('garbage')
+        self.mox.ReplayAll()
+        self.assertEqual(set(), self.br.get_vif_port_set())
+        self.mox.VerifyAll()
+
+    def _test_get_vif_port_by_id(self, data):
+        vif_id = '5c1321a7-c73f-4a77-95e6-9f86402e5c8f'
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--", "--columns=name,ofport,external_ids",
+                       "find", "Interface",
+                       'external_ids:iface-id="%s"' % vif_id],
+                      root_helper=self.root_helper).AndReturn(
+                          self._encode_ovs_json(
+                              ['name', 'ofport', 'external_ids'], data))
+        self.mox.ReplayAll()
+        vif_port = self.br.get_vif_port_by_id(vif_id)
+        self.mox.VerifyAll()
+        return vif_port
+
+    def test_get_vif_port_by_id(self):
+        external_ids = {'attached-mac': 'fa:16:3e:23:5b:f2',
+                        'iface-id': '5c1321a7-c73f-4a77-95e6-9f86402e5c8f',
+                        'iface-status': 'active'}
+        vif_port = self._test_get_vif_port_by_id(
+            [['dhc5c1321a7-c7', 2, external_ids]])
+        self.assertEqual(vif_port.vif_mac, 'fa:16:3e:23:5b:f2')
+        self.assertEqual(vif_port.vif_id,
+                         '5c1321a7-c73f-4a77-95e6-9f86402e5c8f')
+        self.assertEqual(vif_port.port_name, 'dhc5c1321a7-c7')
+        self.assertEqual(vif_port.ofport, 2)
+
+    def test_get_vif_port_by_id_without_ofport(self):
+        external_ids = {'attached-mac': 'fa:16:3e:23:5b:f2',
+                        'iface-id': '5c1321a7-c73f-4a77-95e6-9f86402e5c8f'}
+        vif_port = self._test_get_vif_port_by_id(
+            [['dhc5c1321a7-c7', set(), external_ids]])
+        self.assertEqual(vif_port.ofport, -1)
+
+    def test_get_vif_port_by_id_not_found(self):
+        self.assertIsNone(self._test_get_vif_port_by_id([]))
 
     def test_iface_to_br(self):
         iface = 'tap0'
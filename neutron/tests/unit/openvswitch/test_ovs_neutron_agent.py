@@ -168,7 +168,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         self.assertEqual(expected, actual)
 
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -176,16 +177,19 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         """Mock treat devices added.
 
         :param details: the details to return for the device
-        :param port: the port that get_vif_port_by_id should return
+        :param port: the port that the vif port snapshot should return
         :param func_name: the function that should be called
         :returns: whether the named function was called
         """
+        vif_ports = mock.Mock()
+        vif_ports.get.return_value = port
         with contextlib.nested(
-            mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                              return_value=details),
-            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
-                              return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_snapshot',
+                              return_value=vif_ports),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, get_vif_func, upd_dev_up, func):
             self.assertFalse(self.agent.treat_devices_added([{}]))
@@ -210,15 +214,44 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                                                        mock.Mock(),
                                                        'treat_vif_port'))
 
+    def test_treat_devices_added_batches_rpc_calls(self):
+        self.agent.device_rpc_batch_size = 2
+        devices = ['dev1', 'dev2', 'dev3']
+        details_list = [[{'device': 'dev1', 'port_id': 'dev1',
+                          'network_id': 'net1', 'network_type': 'local',
+                          'physical_network': None, 'segmentation_id': None,
+                          'admin_state_up': True},
+                         {'device': 'dev2'}],
+                        [{'device': 'dev3'}]]
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              side_effect=details_list),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_snapshot',
+                              return_value={}),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ) as (get_dev_fn, get_vif_func, upd_dev_up, treat_vif_port):
+            self.assertFalse(self.agent.treat_devices_added(devices))
+        # one snapshot of the bridge per batch rather than one per device
+        self.assertEqual(get_vif_func.call_count, 2)
+        get_dev_fn.assert_has_calls(
+            [mock.call(self.agent.context, ['dev1', 'dev2'],
+                       self.agent.agent_id),
+             mock.call(self.agent.context, ['dev3'], self.agent.agent_id)])
+        upd_dev_up.assert_called_once_with(self.agent.context, ['dev1'],
+                                           self.agent.agent_id)
+        self.assertEqual(treat_vif_port.call_count, 1)
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='dev1', exists=port_exists)
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                               return_value=[details]):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
                 self.assertFalse(self.agent.treat_devices_removed([{}]))
         self.assertEqual(port_unbound.called, not port_exists)
@@ -241,6 +274,37 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                 self.assertTrue(device_added.called)
                 self.assertTrue(device_removed.called)
 
+    def _test_rpc_loop_polling(self, polling_required):
+        pm = mock.Mock()
+        pm.is_polling_required = polling_required
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'update_ports',
+                              return_value=None),
+            mock.patch.object(ovs_neutron_agent.time, 'sleep',
+                              side_effect=KeyboardInterrupt)
+        ) as (update_ports, sleep):
+            self.assertRaises(KeyboardInterrupt,
+                              self.agent.rpc_loop, polling_manager=pm)
+        pm.force_polling.assert_called_once_with()
+        self.assertEqual(update_ports.called, polling_required)
+        self.assertEqual(pm.polling_completed.called, polling_required)
+
+    def test_rpc_loop_polls_when_required(self):
+        self._test_rpc_loop_polling(True)
+
+    def test_rpc_loop_skips_polling_when_not_required(self):
+        self._test_rpc_loop_polling(False)
+
+    def test_daemon_loop_uses_polling_manager(self):
+        with mock.patch(
+            'neutron.agent.linux.polling.get_polling_manager') as mock_get_pm:
+            with mock.patch.object(self.agent, 'rpc_loop') as mock_loop:
+                self.agent.daemon_loop()
+        mock_get_pm.assert_called_with(
+            False, 'sudo', constants.DEFAULT_OVSDBMON_RESPAWN,
+            constants.DEFAULT_MINIMIZE_POLLING_RESYNC)
+        mock_loop.assert_called_once_with(polling_manager=mock.ANY)
+
     def test_report_state(self):
         with mock.patch.object(self.agent.state_rpc,
                                "report_state") as report_st:
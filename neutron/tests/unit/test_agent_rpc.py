@@ -32,6 +32,8 @@ class AgentRPCPluginApi(base.BaseTestCase):
             func_obj = getattr(agent, method)
             if method == 'tunnel_sync':
                 actual_val = func_obj(ctxt, 'fake_tunnel_ip')
+            elif method.startswith(('get_devices', 'update_devices')):
+                actual_val = func_obj(ctxt, ['fake_device'], 'fake_agent_id')
             else:
                 actual_val = func_obj(ctxt, 'fake_device', 'fake_agent_id')
         self.assertEqual(actual_val, expect_val)
@@ -42,6 +44,15 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_get_devices_details_list(self):
+        self._test_rpc_call('get_devices_details_list')
+
+    def test_update_devices_down(self):
+        self._test_rpc_call('update_devices_down')
+
+    def test_update_devices_up(self):
+        self._test_rpc_call('update_devices_up')
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
@@ -36,6 +36,7 @@ from neutron.manager import NeutronManager
 from neutron.openstack.common.notifier import api as notifer_api
 from neutron.openstack.common import policy as common_policy
 from neutron.openstack.common import uuidutils
+from neutron import policy
 from neutron.tests import base
 from neutron.tests.unit import testlib_api
 
@@ -890,6 +891,35 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
                             content_type='application/' + self.fmt)
         self.assertEqual(res.status_int, exc.HTTPCreated.code)
 
+    def test_create_bulk_ports_fetches_networks_once(self):
+        net_id = _uuid()
+        tenant_id = _uuid()
+        ports = [{'network_id': net_id, 'tenant_id': tenant_id,
+                  'mac_address': 'ca:fe:de:ad:be:%02x' % i}
+                 for i in range(3)]
+        data = {'ports': ports}
+
+        def side_effect(context, port):
+            return dict(port['port'], id=_uuid(), status='ACTIVE')
+
+        instance = self.plugin.return_value
+        instance.create_port.side_effect = side_effect
+        instance.get_ports_count.return_value = 0
+        instance.get_network.return_value = {'tenant_id': tenant_id}
+        instance.get_networks.return_value = [{'id': net_id,
+                                               'tenant_id': tenant_id}]
+        env = {'neutron.context': context.Context('', tenant_id)}
+        res = self.api.post(_get_path('ports', fmt=self.fmt),
+                            self.serialize(data),
+                            content_type='application/' + self.fmt,
+                            extra_environ=env)
+        self.assertEqual(exc.HTTPCreated.code, res.status_int)
+        self.assertEqual(3, instance.create_port.call_count)
+        # one lookup for the ownership of the network, and one for the
+        # network:tenant_id policy checks of all the ports
+        self.assertEqual(1, instance.get_network.call_count)
+        self.assertEqual(1, instance.get_networks.call_count)
+
     def test_create_bulk_no_networks(self):
         data = {'networks': []}
         res = self.api.post(_get_path('networks', fmt=self.fmt),
@@ -1248,6 +1278,69 @@ class V2Views(base.BaseTestCase):
         self._view(keys, 'subnets', 'subnet')
 
 
+class V2ViewsVisibilityPlan(base.BaseTestCase):
+    def setUp(self):
+        super(V2ViewsVisibilityPlan, self).setUp()
+        self.addCleanup(policy.reset)
+        init_p = mock.patch('neutron.policy.init')
+        init_p.start()
+        self.addCleanup(init_p.stop)
+        self._set_rules({"context_is_admin": "role:admin",
+                         "get_network:shared": "rule:context_is_admin"})
+        attr_info = attributes.RESOURCE_ATTRIBUTE_MAP['networks']
+        self.controller = v2_base.Controller(None, 'networks', 'network',
+                                             attr_info)
+        self.data = {'id': 'net1', 'tenant_id': 'tenant1', 'shared': True}
+
+    def _set_rules(self, rules):
+        common_policy.set_rules(common_policy.Rules(
+            dict((k, common_policy.parse_rule(v))
+                 for k, v in rules.items())))
+
+    def _view(self, ctx):
+        with mock.patch('neutron.policy.check') as check:
+            check.side_effect = lambda context, action, data: (
+                data['tenant_id'] == context.tenant_id)
+            res = [self.controller._view(ctx, self.data) for i in range(3)]
+        return res[0], check.call_count
+
+    def test_role_only_rule_is_not_checked_per_object(self):
+        user = context.Context('', 'tenant1', roles=['member'])
+        res, checks = self._view(user)
+        self.assertEqual(res, {'id': 'net1', 'tenant_id': 'tenant1'})
+        self.assertEqual(checks, 0)
+
+        res, checks = self._view(context.get_admin_context())
+        self.assertEqual(res, self.data)
+        self.assertEqual(checks, 0)
+
+    def test_target_dependent_rule_is_checked_per_object(self):
+        self._set_rules({"get_network:shared": "tenant_id:%(tenant_id)s"})
+        res, checks = self._view(
+            context.Context('', 'tenant1', roles=['member']))
+        self.assertEqual(res, self.data)
+        self.assertEqual(checks, 3)
+
+        res, checks = self._view(
+            context.Context('', 'tenant2', roles=['member']))
+        self.assertEqual(res, {'id': 'net1', 'tenant_id': 'tenant1'})
+        self.assertEqual(checks, 3)
+
+    def test_plan_is_compiled_once_until_policy_reload(self):
+        user = context.Context('', 'tenant1', roles=['member'])
+        with mock.patch.object(self.controller, '_compile_visibility_plan',
+                               wraps=self.controller._compile_visibility_plan
+                               ) as compile_plan:
+            self._view(user)
+            self._view(user)
+            self.assertEqual(compile_plan.call_count, 1)
+
+            self._set_rules({"get_network:shared": "@"})
+            res, checks = self._view(user)
+            self.assertEqual(compile_plan.call_count, 2)
+        self.assertEqual(res, self.data)
+
+
 class NotificationTest(APIv2TestBase):
     def _resource_op_notifier(self, opname, resource, expected_errors=False,
                               notification_level='INFO'):
@@ -287,3 +287,16 @@ class TestParseVlanRangeList(UtilTestParseVlanRanges):
                                       (1000, 1099)],
                              "net2": [(200, 299)]}
         self.assertEqual(self.parse_list(config_list), expected_networks)
+
+
+class TestSplitList(base.BaseTestCase):
+
+    def test_split_list_empty(self):
+        self.assertEqual([], utils.split_list([], 2))
+
+    def test_split_list_into_chunks(self):
+        self.assertEqual([[1, 2], [3, 4], [5]],
+                         utils.split_list([1, 2, 3, 4, 5], 2))
+
+    def test_split_list_unbounded(self):
+        self.assertEqual([[1, 2, 3]], utils.split_list([1, 2, 3], 0))
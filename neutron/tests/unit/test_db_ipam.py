@@ -0,0 +1,279 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import netaddr
+from oslo.config import cfg
+import webob.exc
+
+from neutron.common import exceptions as q_exc
+from neutron.db import ipam
+from neutron.db import models_v2
+from neutron.openstack.common.db import exception as db_exc
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+
+class TestGetDriver(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestGetDriver, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+
+    def test_default_driver(self):
+        self.assertIsInstance(ipam.get_driver(),
+                              ipam.AvailabilityRangeIpamDriver)
+
+    def test_driver_follows_configuration(self):
+        driver = ipam.get_driver()
+        cfg.CONF.set_override('ipam_driver',
+                              'neutron.db.ipam.RandomIpamDriver')
+        self.assertIsInstance(ipam.get_driver(), ipam.RandomIpamDriver)
+        cfg.CONF.clear_override('ipam_driver')
+        self.assertIsNot(driver, ipam.get_driver())
+
+
+class TestIpValues(base.BaseTestCase):
+
+    def test_ip_to_value_ordering(self):
+        for ips in (['10.0.0.10', '10.0.0.9', '9.255.255.255', '10.0.1.0'],
+                    ['fe80::1', '2001:db8::10', '::1', '2001:db8::9']):
+            self.assertEqual(sorted(ips, key=netaddr.IPAddress),
+                             sorted(ips, key=models_v2.ip_to_value))
+
+    def test_ip_to_value_width(self):
+        self.assertEqual(32, len(models_v2.ip_to_value('10.0.0.1')))
+        self.assertEqual(32, len(models_v2.ip_to_value(
+            'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff')))
+
+    def test_models_keep_values_in_sync(self):
+        ip_range = models_v2.IPAvailabilityRange(first_ip='10.0.0.2',
+                                                 last_ip='10.0.0.254')
+        self.assertEqual(models_v2.ip_to_value('10.0.0.2'),
+                         ip_range.first_ip_value)
+        ip_range.last_ip = '10.0.0.100'
+        self.assertEqual(models_v2.ip_to_value('10.0.0.100'),
+                         ip_range.last_ip_value)
+        allocation = models_v2.IPAllocation(ip_address='2001:db8::5')
+        self.assertEqual(models_v2.ip_to_value('2001:db8::5'),
+                         allocation.ip_address_value)
+
+
+class TestRandomIpamDriverReserve(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRandomIpamDriverReserve, self).setUp()
+        self.context = mock.MagicMock()
+        self.context.session.bind.dialect.name = 'mysql'
+        self.subnet = {'id': 'subnet', 'network_id': 'net', 'ip_version': 4}
+
+    def test_reserve_ip(self):
+        self.assertTrue(ipam.RandomIpamDriver._reserve_ip(
+            self.context, self.subnet, '10.0.0.2'))
+        self.assertTrue(self.context.session.begin_nested.called)
+        self.assertTrue(self.context.session.add.called)
+
+    def test_reserve_ip_allocated_concurrently(self):
+        begin_nested = self.context.session.begin_nested.return_value
+        begin_nested.__exit__.side_effect = db_exc.DBDuplicateEntry()
+        self.assertFalse(ipam.RandomIpamDriver._reserve_ip(
+            self.context, self.subnet, '10.0.0.2'))
+
+
+class TestRandomIpamDriver(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        super(TestRandomIpamDriver, self).setUp()
+        cfg.CONF.set_override('ipam_driver',
+                              'neutron.db.ipam.RandomIpamDriver')
+
+    def _port_ips(self, port):
+        return [ip['ip_address'] for ip in port['port']['fixed_ips']]
+
+    def _delete_ports(self, ports):
+        for port in ports:
+            self._delete('ports', port['port']['id'])
+
+    def test_allocate_all_addresses(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            net_id = subnet['subnet']['network_id']
+            ports = [self._make_port(self.fmt, net_id) for i in range(5)]
+            ips = sum([self._port_ips(port) for port in ports], [])
+            self.assertEqual(['10.0.0.%d' % i for i in range(2, 7)],
+                             sorted(ips))
+            res = self._create_port(self.fmt, net_id)
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            self._delete_ports(ports)
+
+    def test_recycled_address_allocated_again(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            net_id = subnet['subnet']['network_id']
+            port = self._make_port(self.fmt, net_id)
+            self.assertEqual(['10.0.0.2'], self._port_ips(port))
+            self._delete('ports', port['port']['id'])
+            port = self._make_port(self.fmt, net_id)
+            self.assertEqual(['10.0.0.2'], self._port_ips(port))
+            self._delete_ports([port])
+
+    def test_allocate_specific_ip(self):
+        with self.subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.5'}]
+            with self.port(subnet=subnet, fixed_ips=fixed_ips) as port:
+                self.assertEqual(['10.0.0.5'], self._port_ips(port))
+                res = self._create_port(self.fmt, net_id,
+                                        fixed_ips=fixed_ips)
+                self.assertEqual(webob.exc.HTTPConflict.code,
+                                 res.status_int)
+
+    def test_update_port_adds_ip(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port:
+                fixed_ips = port['port']['fixed_ips'] + [
+                    {'subnet_id': subnet['subnet']['id']}]
+                req = self.new_update_request(
+                    'ports', {'port': {'fixed_ips': fixed_ips}},
+                    port['port']['id'])
+                port = self.deserialize(self.fmt, req.get_response(self.api))
+                ips = self._port_ips(port)
+                self.assertEqual(2, len(set(ips)))
+
+    def test_create_ports_bulk(self):
+        with self.subnet(cidr='10.0.0.0/28') as subnet:
+            net_id = subnet['subnet']['network_id']
+            port = self._make_port(self.fmt, net_id)
+            res = self._create_port_bulk(self.fmt, 12, net_id, 'test', True)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ips = set(self._port_ips(port))
+            for p in ports:
+                ips.update(ip['ip_address'] for ip in p['fixed_ips'])
+            self.assertEqual(set('10.0.0.%d' % i for i in range(2, 15)), ips)
+            self._delete_ports([port] + [{'port': p} for p in ports])
+
+    def test_create_ports_bulk_with_requested_addresses(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            net_id = subnet['subnet']['network_id']
+            subnet_id = subnet['subnet']['id']
+            overrides = {0: {'fixed_ips': [{'subnet_id': subnet_id}]},
+                         1: {'fixed_ips': [{'subnet_id': subnet_id,
+                                            'ip_address': '10.0.0.2'}]}}
+            # Always draw the requested address first
+            with mock.patch.object(ipam.random, 'randrange', return_value=0):
+                res = self._create_port_bulk(self.fmt, 5, net_id, 'test',
+                                             True, override=overrides)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(['10.0.0.2'],
+                             [ip['ip_address'] for ip in
+                              ports[1]['fixed_ips']])
+            ips = set(ip['ip_address'] for p in ports for ip in p['fixed_ips'])
+            self.assertEqual(set('10.0.0.%d' % i for i in range(2, 7)), ips)
+            self._delete_ports([{'port': p} for p in ports])
+
+    def test_allocate_ipv6_addresses(self):
+        with self.subnet(cidr='2001:db8::/125', ip_version=6) as subnet:
+            net_id = subnet['subnet']['network_id']
+            ports = [self._make_port(self.fmt, net_id) for i in range(3)]
+            ips = sum([self._port_ips(port) for port in ports], [])
+            self.assertEqual(3, len(set(ips)))
+            for ip in ips:
+                self.assertIn(netaddr.IPAddress(ip),
+                              netaddr.IPRange('2001:db8::2', '2001:db8::6'))
+            self._delete_ports(ports)
+
+    def test_allocate_all_ipv6_addresses(self):
+        with self.subnet(cidr='2001:db8::/125', ip_version=6) as subnet:
+            net_id = subnet['subnet']['network_id']
+            ports = [self._make_port(self.fmt, net_id) for i in range(5)]
+            res = self._create_port(self.fmt, net_id)
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            self._delete_ports(ports)
+
+    def test_generated_ip_is_not_requested_ip(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet_id = subnet['subnet']['id']
+            fixed_ips = [{'subnet_id': subnet_id},
+                         {'subnet_id': subnet_id, 'ip_address': '10.0.0.2'}]
+            # Always draw the requested address
+            with mock.patch.object(ipam.random, 'randrange', return_value=0):
+                with self.port(subnet=subnet, fixed_ips=fixed_ips) as port:
+                    self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                                     sorted(self._port_ips(port)))
+
+    def test_store_allocation_of_other_port(self):
+        context = mock.MagicMock()
+        allocated = context.session.query.return_value.get.return_value
+        allocated.port_id = 'other_port'
+        self.assertRaises(
+            q_exc.IpAddressInUse, ipam.RandomIpamDriver().store_allocation,
+            context, 'net', 'subnet', '10.0.0.2', 'port')
+
+
+class TestSwitchIpamDriver(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def _set_driver(self, name):
+        cfg.CONF.set_override('ipam_driver', 'neutron.db.ipam.%s' % name)
+
+    def _port_ips(self, ports):
+        return sorted(ip['ip_address'] for port in ports
+                      for ip in port['port']['fixed_ips'])
+
+    def _delete_ports(self, ports):
+        for port in ports:
+            self._delete('ports', port['port']['id'])
+
+    def test_switch_back_skips_random_allocations(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            net_id = subnet['subnet']['network_id']
+            self._set_driver('RandomIpamDriver')
+            # Allocate 10.0.0.3 and 10.0.0.5
+            random_ports = []
+            for index in (1, 3):
+                with mock.patch.object(ipam.random, 'randrange',
+                                       return_value=index):
+                    random_ports.append(self._make_port(self.fmt, net_id))
+            self.assertEqual(['10.0.0.3', '10.0.0.5'],
+                             self._port_ips(random_ports))
+            self._set_driver('AvailabilityRangeIpamDriver')
+            ports = [self._make_port(self.fmt, net_id) for i in range(2)]
+            res = self._create_port_bulk(self.fmt, 1, net_id, 'test', True)
+            ports.append({'port': self.deserialize(self.fmt, res)['ports'][0]})
+            self.assertEqual(['10.0.0.2', '10.0.0.4', '10.0.0.6'],
+                             self._port_ips(ports))
+            res = self._create_port(self.fmt, net_id)
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+
+            # The addresses recycled by either driver are allocated again
+            self._delete_ports(random_ports[:1] + ports[:1])
+            new_ports = [self._make_port(self.fmt, net_id) for i in range(2)]
+            self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                             self._port_ips(new_ports))
+            self._delete_ports(random_ports[1:] + ports[1:] + new_ports)
+
+    def test_random_driver_returns_recycled_addresses_to_ranges(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            net_id = subnet['subnet']['network_id']
+            ports = [self._make_port(self.fmt, net_id) for i in range(5)]
+            self._set_driver('RandomIpamDriver')
+            self._delete_ports(ports[1:3])
+            self._set_driver('AvailabilityRangeIpamDriver')
+            new_ports = [self._make_port(self.fmt, net_id) for i in range(2)]
+            self.assertEqual(['10.0.0.3', '10.0.0.4'],
+                             self._port_ips(new_ports))
+            res = self._create_port(self.fmt, net_id)
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            self._delete_ports(ports[:1] + ports[3:] + new_ports)
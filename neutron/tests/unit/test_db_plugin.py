@@ -925,6 +925,103 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
                 # We expect a 500 as we injected a fault in the plugin
                 self._validate_behavior_on_bulk_failure(res, 'ports', 500)
 
+    def test_create_ports_bulk_native_unique_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet(cidr='10.0.0.0/28') as subnet:
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port_bulk(self.fmt, 13, net_id, 'test', True)
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize(self.fmt, res)['ports']
+            macs = set(p['mac_address'] for p in ports)
+            ips = set(ip['ip_address'] for p in ports for ip in p['fixed_ips'])
+            self.assertEqual(13, len(macs))
+            self.assertEqual(set('10.0.0.%d' % i for i in range(2, 15)), ips)
+            res = self._create_port(self.fmt, net_id)
+            self.assertEqual(res.status_int, 409)
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_native_with_requested_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.10'}]
+            overrides = {0: {'mac_address': '00:11:22:33:44:55'},
+                         1: {'fixed_ips': fixed_ips}}
+            res = self._create_port_bulk(self.fmt, 3, net_id, 'test', True,
+                                         override=overrides)
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual('00:11:22:33:44:55', ports[0]['mac_address'])
+            self.assertEqual(['10.0.0.10'],
+                             [ip['ip_address'] for ip in
+                              ports[1]['fixed_ips']])
+            ips = set(ip['ip_address'] for p in ports for ip in p['fixed_ips'])
+            self.assertEqual(3, len(ips))
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_native_mixed_requested_addresses(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            net_id = subnet['subnet']['network_id']
+            subnet_id = subnet['subnet']['id']
+            # The addresses generated for the ports 0, 2 and 4 must not be
+            # the ones requested by the ports 1 and 3 of the full pool
+            overrides = {0: {'fixed_ips': [{'subnet_id': subnet_id}]},
+                         1: {'fixed_ips': [{'subnet_id': subnet_id,
+                                            'ip_address': '10.0.0.2'}]},
+                         3: {'fixed_ips': [{'subnet_id': subnet_id,
+                                            'ip_address': '10.0.0.3'}]}}
+            plugin = NeutronManager.get_plugin()
+            with mock.patch.object(plugin, '_create_ports_bulk',
+                                   wraps=plugin._create_ports_bulk) as bulk:
+                res = self._create_port_bulk(self.fmt, 5, net_id, 'test',
+                                             True, override=overrides)
+            if not bulk.called:
+                # The ports are created one at a time, as by create_port
+                self.skipTest("Plugin does not allocate the addresses of "
+                              "bulk ports together")
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(['10.0.0.2'],
+                             [ip['ip_address'] for ip in
+                              ports[1]['fixed_ips']])
+            self.assertEqual(['10.0.0.3'],
+                             [ip['ip_address'] for ip in
+                              ports[3]['fixed_ips']])
+            ips = set(ip['ip_address'] for p in ports for ip in p['fixed_ips'])
+            self.assertEqual(set('10.0.0.%d' % i for i in range(2, 7)), ips)
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_native_duplicate_mac(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.network() as net:
+            mac = {'mac_address': '00:11:22:33:44:55'}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True,
+                                         override={0: mac, 1: mac})
+            self._validate_behavior_on_bulk_failure(res, 'ports', 409)
+
+    def test_create_ports_bulk_native_duplicate_ip(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet() as subnet:
+            fixed_ips = {'fixed_ips': [{'subnet_id': subnet['subnet']['id'],
+                                        'ip_address': '10.0.0.5'}]}
+            res = self._create_port_bulk(self.fmt, 2,
+                                         subnet['subnet']['network_id'],
+                                         'test', True,
+                                         override={0: fixed_ips,
+                                                   1: fixed_ips})
+            self._validate_behavior_on_bulk_failure(res, 'ports', 409)
+
     def test_list_ports(self):
         # for this test we need to enable overlapping ips
         cfg.CONF.set_default('allow_overlapping_ips', True)
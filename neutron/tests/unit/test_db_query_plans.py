@@ -0,0 +1,98 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Check that the most frequent queries on ports are served by indexes."""
+
+import re
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from neutron.common import constants
+from neutron.db import model_base
+from neutron.db import models_v2
+from neutron.db import securitygroups_db
+from neutron.tests import base
+
+
+class TestQueryPlans(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestQueryPlans, self).setUp()
+        self.engine = sa.create_engine('sqlite://')
+        model_base.BASEV2.metadata.create_all(self.engine)
+        self.session = orm.sessionmaker(bind=self.engine)()
+        self.addCleanup(self.session.close)
+
+    def _query_plan(self, query):
+        compiled = query.statement.compile(dialect=self.engine.dialect)
+        params = [compiled.params[key] for key in compiled.positiontup]
+        return [list(row)[-1] for row in self.engine.execute(
+            'EXPLAIN QUERY PLAN %s' % compiled, params)]
+
+    def assertUsesIndex(self, query, table_name):
+        plan = self._query_plan(query)
+        lookups = [step for step in plan
+                   if re.match(r'(SCAN|SEARCH)( TABLE)? %s\b' % table_name,
+                               step)]
+        self.assertTrue(lookups, plan)
+        for step in lookups:
+            self.assertTrue(step.startswith('SEARCH'), plan)
+            self.assertFalse('AUTOMATIC' in step, plan)
+
+    def _ports(self, *columns):
+        return self.session.query(*(columns or (models_v2.Port,)))
+
+    def test_ports_by_device_id(self):
+        # metadata agent and L3 get_sync_interfaces
+        query = self._ports().filter(
+            models_v2.Port.device_id.in_(['router1', 'router2']),
+            models_v2.Port.device_owner.in_(
+                [constants.DEVICE_OWNER_ROUTER_INTF]))
+        self.assertUsesIndex(query, 'ports')
+
+    def test_ports_by_device_owner(self):
+        query = self._ports().filter(
+            models_v2.Port.device_owner == constants.DEVICE_OWNER_ROUTER_GW)
+        self.assertUsesIndex(query, 'ports')
+
+    def test_dhcp_ports_of_networks(self):
+        # security group rules for devices
+        query = self._ports(models_v2.Port,
+                            models_v2.IPAllocation.ip_address)
+        query = query.join(models_v2.IPAllocation).filter(
+            models_v2.Port.network_id.in_(['net1', 'net2']),
+            models_v2.Port.device_owner == constants.DEVICE_OWNER_DHCP)
+        self.assertUsesIndex(query, 'ports')
+
+    def test_mac_address_on_network(self):
+        # _check_unique_mac and the bulk creation of ports
+        query = self._ports(models_v2.Port.mac_address).filter(
+            models_v2.Port.network_id == 'net1',
+            models_v2.Port.mac_address.in_(['fa:16:3e:00:00:01']))
+        self.assertUsesIndex(query, 'ports')
+
+    def test_allocation_of_ip_address_on_network(self):
+        query = self.session.query(models_v2.IPAllocation).filter_by(
+            network_id='net1', ip_address='10.0.0.2')
+        self.assertUsesIndex(query, 'ipallocations')
+
+    def test_ports_of_security_group(self):
+        binding = securitygroups_db.SecurityGroupPortBinding
+        query = self.session.query(binding.port_id).filter(
+            binding.security_group_id.in_(['sg1', 'sg2']))
+        self.assertUsesIndex(query, 'securitygroupportbindings')
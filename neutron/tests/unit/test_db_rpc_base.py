@@ -49,6 +49,42 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
 
         self.assertEqual(len(self.log.mock_calls), 1)
 
+    def test_get_active_networks_info(self):
+        self.plugin.get_networks.return_value = [dict(id='a'), dict(id='b')]
+        self.plugin.get_subnets.return_value = [dict(id='s1', network_id='b')]
+        self.plugin.get_ports.return_value = [dict(id='p1', network_id='a'),
+                                              dict(id='p2', network_id='b')]
+
+        networks = self.callbacks.get_active_networks_info(mock.Mock(),
+                                                           host='host')
+
+        self.assertEqual(
+            [dict(id='a', subnets=[], ports=[dict(id='p1', network_id='a')]),
+             dict(id='b', subnets=[dict(id='s1', network_id='b')],
+                  ports=[dict(id='p2', network_id='b')])],
+            networks)
+
+    def test_get_active_networks_info_of_networks(self):
+        self.plugin.get_networks.return_value = [dict(id='a')]
+        self.plugin.get_subnets.return_value = []
+        self.plugin.get_ports.return_value = []
+
+        self.callbacks.get_active_networks_info(mock.Mock(), host='host',
+                                                network_ids=['a'])
+
+        self.plugin.assert_has_calls([
+            mock.call.get_networks(
+                mock.ANY, filters=dict(id=['a'], admin_state_up=[True])),
+            mock.call.get_ports(mock.ANY, filters=dict(network_id=['a'])),
+            mock.call.get_subnets(
+                mock.ANY, filters=dict(network_id=['a'],
+                                       enable_dhcp=[True]))])
+
+    def test_get_active_networks_info_of_no_networks(self):
+        self.assertEqual([], self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', network_ids=[]))
+        self.assertFalse(self.plugin.get_ports.called)
+
     def test_get_network_info(self):
         network_retval = dict(id='a')
 
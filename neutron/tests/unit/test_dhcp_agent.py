@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import os
 import sys
@@ -148,6 +149,10 @@ class TestDhcpAgent(base.BaseTestCase):
 
     def test_dhcp_agent_manager(self):
         state_rpc_str = 'neutron.agent.rpc.PluginReportStateAPI'
+        updates_p = mock.patch.object(DhcpAgentWithStateReport,
+                                      'periodic_network_updates')
+        mock_network_updates = updates_p.start()
+        self.addCleanup(updates_p.stop)
         with mock.patch.object(DhcpAgentWithStateReport,
                                'sync_state',
                                autospec=True) as mock_sync_state:
@@ -170,6 +175,7 @@ class TestDhcpAgent(base.BaseTestCase):
                         agent_mgr.after_start()
                         mock_sync_state.assert_called_once_with(agent_mgr)
                         mock_periodic_resync.assert_called_once_with(agent_mgr)
+                        mock_network_updates.assert_called_once_with()
                         state_rpc.assert_has_calls(
                             [mock.call(mock.ANY),
                              mock.call().report_state(mock.ANY, mock.ANY,
@@ -193,11 +199,13 @@ class TestDhcpAgent(base.BaseTestCase):
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
             attrs_to_mock = dict(
                 [(a, mock.DEFAULT) for a in
-                 ['sync_state', 'periodic_resync']])
+                 ['sync_state', 'periodic_resync',
+                  'periodic_network_updates']])
             with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
                 dhcp.run()
                 mocks['sync_state'].assert_called_once_with()
                 mocks['periodic_resync'].assert_called_once_with()
+                mocks['periodic_network_updates'].assert_called_once_with()
 
     def test_call_driver(self):
         network = mock.Mock()
@@ -225,31 +233,42 @@ class TestDhcpAgent(base.BaseTestCase):
             self.assertEqual(log.call_count, 1)
             self.assertTrue(dhcp.needs_resync)
 
-    def _test_sync_state_helper(self, known_networks, active_networks):
+    def _test_sync_state_helper(self, known_networks, active_networks,
+                                page_size=100):
+        cfg.CONF.set_override('sync_page_size', page_size)
+        networks = [dhcp.NetModel(True, dict(id=net_id))
+                    for net_id in active_networks]
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.return_value = active_networks
+            mock_plugin.get_active_networks.return_value = active_networks
+            mock_plugin.iter_active_networks_info.return_value = iter(
+                networks)
+            mock_plugin.get_active_networks_info.return_value = networks
             plug.return_value = mock_plugin
 
-            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            dhcp_agt = dhcp_agent.DhcpAgent(HOSTNAME)
 
             attrs_to_mock = dict(
                 [(a, mock.DEFAULT) for a in
-                 ['refresh_dhcp_helper', 'disable_dhcp_helper', 'cache']])
+                 ['configure_dhcp_for_network', 'disable_dhcp_helper',
+                  'cache']])
 
-            with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
+            with mock.patch.multiple(dhcp_agt, **attrs_to_mock) as mocks:
                 mocks['cache'].get_network_ids.return_value = known_networks
-                dhcp.sync_state()
+                dhcp_agt.sync_state()
+                eventlet.sleep(0)
 
-                exp_refresh = [
-                    mock.call(net_id) for net_id in active_networks]
+                exp_configure = [mock.call(net) for net in networks]
 
                 diff = set(known_networks) - set(active_networks)
                 exp_disable = [mock.call(net_id) for net_id in diff]
 
                 mocks['cache'].assert_has_calls([mock.call.get_network_ids()])
-                mocks['refresh_dhcp_helper'].assert_has_called(exp_refresh)
-                mocks['disable_dhcp_helper'].assert_has_called(exp_disable)
+                mocks['configure_dhcp_for_network'].assert_has_calls(
+                    exp_configure)
+                mocks['disable_dhcp_helper'].assert_has_calls(exp_disable)
+                self.assertFalse(dhcp_agt.needs_resync)
+            return mock_plugin
 
     def test_sync_state_initial(self):
         self._test_sync_state_helper([], ['a'])
@@ -260,10 +279,21 @@ class TestDhcpAgent(base.BaseTestCase):
     def test_sync_state_disabled_net(self):
         self._test_sync_state_helper(['b'], ['a'])
 
+    def test_sync_state_in_pages(self):
+        mock_plugin = self._test_sync_state_helper(['b'], ['c', 'a'], 1)
+        mock_plugin.iter_active_networks_info.assert_called_once_with(
+            ['a', 'c'], 1)
+        self.assertFalse(mock_plugin.get_active_networks_info.called)
+
+    def test_sync_state_without_pages(self):
+        mock_plugin = self._test_sync_state_helper(['b'], ['a'], 0)
+        mock_plugin.get_active_networks_info.assert_called_once_with()
+        self.assertFalse(mock_plugin.get_active_networks.called)
+
     def test_sync_state_plugin_error(self):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.side_effect = Exception
+            mock_plugin.get_active_networks.side_effect = Exception
             plug.return_value = mock_plugin
 
             with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
@@ -291,6 +321,26 @@ class TestDhcpAgent(base.BaseTestCase):
                 sleep.assert_called_once_with(dhcp.conf.resync_interval)
                 self.assertFalse(dhcp.needs_resync)
 
+    def test_periodic_network_updates(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
+            dhcp.periodic_network_updates()
+            spawn.assert_called_once_with(
+                dhcp._periodic_network_updates_helper)
+
+    def test_periodic_network_updates_helper(self):
+        with mock.patch.object(dhcp_agent.eventlet, 'sleep') as sleep:
+            sleep.side_effect = [None, RuntimeError]
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(dhcp,
+                                   'update_dirty_networks') as update:
+                update.side_effect = Exception
+                with testtools.ExpectedException(RuntimeError):
+                    dhcp._periodic_network_updates_helper()
+                # The failure of an update doesn't stop the thread
+                update.assert_called_once_with()
+                sleep.assert_called_with(dhcp.conf.network_update_interval)
+
     def test_populate_cache_on_start_without_active_networks_support(self):
         # emul dhcp driver that doesn't support retrieving of active networks
         self.driver.existing_dhcp_networks.side_effect = NotImplementedError
@@ -681,6 +731,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_network
 
         self.dhcp.subnet_update_end(None, payload)
+        self.dhcp.update_dirty_networks()
 
         self.cache.assert_has_calls([mock.call.put(fake_network)])
         self.call_driver.assert_called_once_with('reload_allocations',
@@ -698,6 +749,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = new_state
 
         self.dhcp.subnet_update_end(None, payload)
+        self.dhcp.update_dirty_networks()
 
         self.cache.assert_has_calls([mock.call.put(new_state)])
         self.call_driver.assert_called_once_with('restart',
@@ -716,6 +768,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.plugin.get_network_info.return_value = fake_network
 
         self.dhcp.subnet_delete_end(None, payload)
+        self.dhcp.update_dirty_networks()
 
         self.cache.assert_has_calls([
             mock.call.get_network_by_subnet_id(
@@ -728,8 +781,9 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
     def test_port_update_end(self):
         payload = dict(port=vars(fake_port2))
         self.cache.get_network_by_id.return_value = fake_network
-        self.cache.get_port_by_id.return_value = fake_port2
+        self.cache.get_port_by_id.return_value = None
         self.dhcp.port_update_end(None, payload)
+        self.dhcp.update_dirty_networks()
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port2.network_id),
              mock.call.get_port_by_id(fake_port2.id),
@@ -737,6 +791,29 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
 
+    def test_port_update_end_unchanged_dhcp_settings(self):
+        port = dict(vars(fake_port1), status='ACTIVE', name='renamed')
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port1
+        self.dhcp.port_update_end(None, dict(port=port))
+        self.dhcp.update_dirty_networks()
+        self.cache.assert_has_calls(
+            [mock.call.get_network_by_id(fake_port1.network_id),
+             mock.call.get_port_by_id(fake_port1.id),
+             mock.call.put_port(mock.ANY)])
+        self.assertFalse(self.call_driver.called)
+
+    def test_port_update_end_changed_extra_dhcp_opts(self):
+        port = dict(vars(fake_port1),
+                    extra_dhcp_opts=[dict(opt_name='bootfile-name',
+                                          opt_value='pxelinux.0')])
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port1
+        self.dhcp.port_update_end(None, dict(port=port))
+        self.dhcp.update_dirty_networks()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
     def test_port_update_change_ip_on_port(self):
         payload = dict(port=vars(fake_port1))
         self.cache.get_network_by_id.return_value = fake_network
@@ -744,6 +821,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         updated_fake_port1.fixed_ips[0].ip_address = '172.9.9.99'
         self.cache.get_port_by_id.return_value = updated_fake_port1
         self.dhcp.port_update_end(None, payload)
+        self.dhcp.update_dirty_networks()
         self.cache.assert_has_calls(
             [mock.call.get_network_by_id(fake_port1.network_id),
              mock.call.get_port_by_id(fake_port1.id),
@@ -762,6 +840,7 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_port_by_id.return_value = fake_port2
 
         self.dhcp.port_delete_end(None, payload)
+        self.dhcp.update_dirty_networks()
         removed_ips = [fixed_ip.ip_address
                        for fixed_ip in fake_port2.fixed_ips]
         self.cache.assert_has_calls(
@@ -780,10 +859,100 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.get_port_by_id.return_value = None
 
         self.dhcp.port_delete_end(None, payload)
+        self.dhcp.update_dirty_networks()
 
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_events_are_merged(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = None
+        for port in (fake_port1, fake_port2):
+            self.dhcp.port_create_end(None, dict(port=vars(port)))
+        self.assertFalse(self.call_driver.called)
+        self.assertEqual(self.dhcp.dirty_networks, {fake_network.id: False})
+
+        self.dhcp.update_dirty_networks()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual(self.dhcp.dirty_networks, {})
+        self.assertEqual(self.cache.put_port.call_count, 2)
+        self.assertFalse(self.plugin.get_network_info.called)
+
+    def test_subnet_and_port_events_are_merged(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = None
+        self.plugin.get_network_info.return_value = fake_network
+        self.dhcp.subnet_update_end(
+            None, dict(subnet=dict(network_id=fake_network.id)))
+        self.dhcp.port_create_end(None, dict(port=vars(fake_port1)))
+        self.assertEqual(self.dhcp.dirty_networks, {fake_network.id: True})
+
+        self.dhcp.update_dirty_networks()
+        self.plugin.get_network_info.assert_called_once_with(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_network_delete_end_drops_pending_update(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = None
+        self.dhcp.port_create_end(None, dict(port=vars(fake_port1)))
+        with mock.patch.object(self.dhcp, 'disable_dhcp_helper'):
+            self.dhcp.network_delete_end(
+                None, dict(network_id=fake_network.id))
+        self.dhcp.update_dirty_networks()
+        self.assertFalse(self.call_driver.called)
+
+    def test_network_deleted_while_refreshed(self):
+        self.cache.get_network_by_id.return_value = fake_network
+
+        def get_network_info(network_id):
+            with mock.patch.object(self.dhcp, 'disable_dhcp_helper'):
+                self.dhcp.network_delete_end(
+                    None, dict(network_id=network_id))
+            return fake_network
+        self.plugin.get_network_info.side_effect = get_network_info
+        self.dhcp.mark_network_dirty(fake_network.id, refresh=True)
+        self.dhcp.update_dirty_networks()
+
+        self.plugin.get_network_info.assert_called_once_with(fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        self.assertFalse(self.cache.put.called)
+        self.assertEqual(self.dhcp.updating_networks, {})
+
+    def test_refresh_of_dirty_network_failed(self):
+        self.plugin.get_network_info.side_effect = Exception
+        self.dhcp.mark_network_dirty(fake_network.id, refresh=True)
+        with mock.patch.object(dhcp_agent.LOG, 'exception'):
+            self.dhcp.update_dirty_networks()
+        self.assertTrue(self.dhcp.needs_resync)
+        self.assertFalse(self.call_driver.called)
+        self.assertEqual(self.dhcp.updating_networks, {})
+
+    def test_dirty_network_updated_with_lock(self):
+        self.cache.get_network_by_id.return_value = fake_network
+        self.plugin.get_network_info.return_value = fake_network
+        lockutils = dhcp_agent.utils.lockutils
+        locked = []
+        with contextlib.nested(
+            mock.patch.object(lockutils, '_semaphores', {}),
+            mock.patch.object(lockutils, 'semaphore')
+        ) as (semaphores, semaphore):
+            lock = semaphore.Semaphore.return_value
+            self.call_driver.side_effect = (
+                lambda *args: locked.append(lock.__enter__.called))
+            self.dhcp.mark_network_dirty(fake_network.id, refresh=True)
+            self.dhcp.update_dirty_networks()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual([True], locked)
+
+    def test_update_dirty_networks_deleted_network(self):
+        self.dhcp.mark_network_dirty(fake_network.id)
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp.update_dirty_networks()
+        self.assertFalse(self.call_driver.called)
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def setUp(self):
@@ -820,11 +989,41 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
                                               device_id='devid',
                                               host='foo')
 
+    def test_get_active_networks(self):
+        self.call.return_value = ['a']
+        self.assertEqual(['a'], self.proxy.get_active_networks())
+        self.make_msg.assert_called_once_with('get_active_networks',
+                                              host='foo')
+
     def test_get_active_networks_info(self):
         self.proxy.get_active_networks_info()
         self.make_msg.assert_called_once_with('get_active_networks_info',
                                               host='foo')
 
+    def test_get_active_networks_info_of_networks(self):
+        self.proxy.get_active_networks_info(['a'])
+        self.make_msg.assert_called_once_with('get_active_networks_info',
+                                              network_ids=['a'],
+                                              host='foo')
+
+    def test_iter_active_networks_info(self):
+        self.call.side_effect = [[dict(id='a'), dict(id='b')],
+                                 [dict(id='c')]]
+        networks = self.proxy.iter_active_networks_info(['a', 'b', 'c'], 2)
+        self.assertEqual(['a', 'b', 'c'], [n.id for n in networks])
+        self.make_msg.assert_has_calls([
+            mock.call('get_active_networks_info',
+                      network_ids=['a', 'b'], host='foo'),
+            mock.call('get_active_networks_info',
+                      network_ids=['c'], host='foo')])
+
+    def test_iter_active_networks_info_old_server(self):
+        # The network_ids argument is ignored by the server
+        self.call.return_value = [dict(id='a'), dict(id='b'), dict(id='c')]
+        networks = self.proxy.iter_active_networks_info(['a', 'b', 'c'], 2)
+        self.assertEqual(['a', 'b', 'c'], [n.id for n in networks])
+        self.assertEqual(1, self.call.call_count)
+
     def test_create_dhcp_port(self):
         port_body = (
             {'port':
@@ -23,6 +23,7 @@ from oslo.config import cfg
 
 from neutron.agent.common import config as a_cfg
 from neutron.agent.linux.iptables_firewall import IptablesFirewallDriver
+from neutron.agent.linux.iptables_manager import IptablesManager
 from neutron.tests import base
 from neutron.tests.unit import test_api_v2
 
@@ -1008,6 +1009,33 @@ class IptablesFirewallTestCase(base.BaseTestCase):
         chain_applies.assert_has_calls([call.remove({}),
                                         call.setup(device2port)])
 
+    def test_defer_apply_updates_only_updated_ports(self):
+        port1 = self._fake_port()
+        port2 = dict(self._fake_port(), device='tapfake_dev2')
+        self.firewall.prepare_port_filter(port1)
+        self.firewall.prepare_port_filter(port2)
+        chain_applies = self._mock_chain_applies()
+        self.v4filter_inst.reset_mock()
+        with self.firewall.defer_apply():
+            self.firewall.update_port_filter(port1)
+        self.assertFalse(chain_applies.setup.called)
+        self.assertFalse(chain_applies.remove.called)
+        self.v4filter_inst.empty_chains.assert_has_calls(
+            [call(['ifake_dev']), call(['sfake_dev', 'ofake_dev'])])
+        self.assertNotIn(call.add_chain('sg-chain'),
+                         self.v4filter_inst.mock_calls)
+        self.assertNotIn(call.add_chain('ifake_dev2'),
+                         self.v4filter_inst.mock_calls)
+
+    def test_defer_apply_without_changes(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        chain_applies = self._mock_chain_applies()
+        self.v4filter_inst.reset_mock()
+        with self.firewall.defer_apply():
+            pass
+        self.assertFalse(chain_applies.setup.called)
+        self.assertEqual([], self.v4filter_inst.mock_calls)
+
     def test_ip_spoofing_filter_with_multiple_ips(self):
         port = {'device': 'tapfake_dev',
                 'mac_address': 'ff:ff:ff:ff',
@@ -1126,3 +1154,103 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  call.add_rule('ofake_dev', '-j $sg-fallback'),
                  call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallIpsetTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(IptablesFirewallIpsetTestCase, self).setUp()
+        cfg.CONF.register_opts(a_cfg.ROOT_HELPER_OPTS, 'AGENT')
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+        self.addCleanup(mock.patch.stopall)
+        mock.patch('neutron.agent.linux.utils.execute').start()
+        iptables_cls = mock.patch(
+            'neutron.agent.linux.iptables_manager.IptablesManager').start()
+        self.iptables_inst = mock.Mock()
+        self.v4filter_inst = mock.Mock()
+        self.v6filter_inst = mock.Mock()
+        self.iptables_inst.ipv4 = {'filter': self.v4filter_inst}
+        self.iptables_inst.ipv6 = {'filter': self.v6filter_inst}
+        iptables_cls.return_value = self.iptables_inst
+        ipset_cls = mock.patch(
+            'neutron.agent.linux.ipset_manager.IpsetManager').start()
+        self.ipset = ipset_cls.return_value
+        self.ipset.sets = {}
+
+        self.firewall = IptablesFirewallDriver()
+        self.sg_id = _uuid()
+        self.set_name = ('NETIPv4' + self.sg_id)[:31]
+
+    def _fake_port(self):
+        rule = {'ethertype': 'IPv4',
+                'direction': 'ingress',
+                'protocol': 'tcp',
+                'port_range_min': 22,
+                'port_range_max': 22,
+                'remote_group_id': self.sg_id}
+        return {'device': 'tapfake_dev',
+                'mac_address': 'ff:ff:ff:ff',
+                'fixed_ips': [FAKE_IP['IPv4']],
+                'security_group_rules': [rule],
+                'security_group_member_ips': {
+                    self.sg_id: ['10.0.0.2', 'fe80::2']}}
+
+    def test_prepare_port_filter_with_remote_group(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.ipset.set_members.assert_called_once_with(
+            self.set_name, 'IPv4', ['10.0.0.2'])
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev',
+            '-p tcp -m tcp --dport 22 -m set --match-set %s src -j RETURN'
+            % self.set_name)
+
+    def test_remote_group_rule_counters_preserved(self):
+        port = self._fake_port()
+        port['security_group_rules'][0]['port_range_max'] = 23
+        self.firewall.prepare_port_filter(port)
+        rules = [call[0][1] for call in
+                 self.v4filter_inst.add_rule.call_args_list
+                 if call[0][0] == 'ifake_dev' and 'match-set' in call[0][1]]
+        self.assertEqual(1, len(rules))
+
+        # The order in which iptables-save displays the rule
+        saved = ('[5:300] -A test-ifake_dev -p tcp -m tcp -m multiport '
+                 '--dports 22:23 -m set --match-set %s src -j RETURN'
+                 % self.set_name)
+        manager = IptablesManager(binary_name='test')
+        table = manager.ipv4['filter']
+        table.add_chain('ifake_dev')
+        table.add_rule('ifake_dev', rules[0])
+        new_lines = manager._modify_rules(['*filter', saved, 'COMMIT'],
+                                          table, 'filter')
+        self.assertIn(saved, new_lines)
+
+    def test_rule_with_ip_prefix_is_not_matched_by_set(self):
+        port = self._fake_port()
+        port['security_group_rules'][0]['source_ip_prefix'] = '10.0.0.2/32'
+        self.firewall.prepare_port_filter(port)
+        self.assertFalse(self.ipset.set_members.called)
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev', '-s 10.0.0.2/32 -p tcp -m tcp --dport 22 -j RETURN')
+
+    def test_update_security_group_members(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.iptables_inst.reset_mock()
+        self.ipset.set_exists.side_effect = lambda name: (
+            name == self.set_name)
+        self.firewall.update_security_group_members(
+            self.sg_id, ['10.0.0.3', 'fe80::3'])
+        self.ipset.set_members.assert_called_with(
+            self.set_name, 'IPv4', ['10.0.0.3'])
+        self.assertEqual(['10.0.0.3', 'fe80::3'],
+                         port['security_group_member_ips'][self.sg_id])
+        self.assertFalse(self.iptables_inst.apply.called)
+
+    def test_remove_port_filter_destroys_unused_set(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.assertFalse(self.ipset.destroy_set.called)
+        self.ipset.sets = {self.set_name: set(['10.0.0.2'])}
+        self.firewall.remove_port_filter(port)
+        self.ipset.destroy_set.assert_called_once_with(self.set_name)
@@ -20,7 +20,9 @@
 import inspect
 import os
 
+import mock
 import mox
+from oslo.config import cfg
 
 from neutron.agent.linux import iptables_manager
 from neutron.tests import base
@@ -554,6 +556,34 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.mox.VerifyAll()
 
 
+class IptablesTableTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesTableTestCase, self).setUp()
+        self.table = iptables_manager.IptablesTable()
+        for chain in ('a', 'b', 'c'):
+            self.table.add_chain(chain)
+        for rule in ('a1', 'b1', 'b2', 'c1'):
+            self.table.add_rule(rule[0], rule)
+
+    def _rules(self):
+        return [rule.rule for rule in self.table.rules]
+
+    def test_empty_chains_and_move_chain_rules(self):
+        position = self.table.empty_chains(['b'])
+        self.assertEqual(1, position)
+        self.assertEqual(['a1', 'c1'], self._rules())
+        self.table.add_rule('b', 'b3')
+        self.table.add_rule('b', 'b4')
+        self.table.move_chain_rules(['b'], position)
+        self.assertEqual(['a1', 'b3', 'b4', 'c1'], self._rules())
+
+    def test_empty_chains_unknown_chain(self):
+        self.assertIsNone(self.table.empty_chains(['d']))
+        self.table.move_chain_rules(['d'], None)
+        self.assertEqual(['a1', 'b1', 'b2', 'c1'], self._rules())
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -562,3 +592,105 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_nat_not_found(self):
         self.assertFalse('nat' in self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        self.execute = mock.Mock(return_value='')
+        self.iptables = iptables_manager.IptablesManager(
+            _execute=self.execute, state_less=True)
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _restore_inputs(self):
+        return [kwargs['process_input']
+                for args, kwargs in self.execute.call_args_list]
+
+    def test_first_apply_is_full(self):
+        iptables = iptables_manager.IptablesManager(
+            _execute=self.execute, state_less=True)
+        iptables.apply()
+        self.execute.assert_has_calls(
+            [mock.call(['iptables-save', '-c'], root_helper=None),
+             mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                       root_helper=None)])
+
+    def test_apply_without_changes(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_only_changed_chains(self):
+        self.iptables.ipv4['filter'].add_chain('port')
+        self.iptables.ipv4['filter'].add_rule('port', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $port')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'], process_input=mock.ANY,
+            root_helper=None)
+        self.assertEqual(['*filter\n'
+                          ':%(bn)s-INPUT - [0:0]\n'
+                          ':%(bn)s-port - [0:0]\n'
+                          '-A %(bn)s-INPUT -j %(bn)s-port\n'
+                          '-A %(bn)s-port -j DROP\n'
+                          'COMMIT\n' % IPTABLES_ARG],
+                         self._restore_inputs())
+
+    def test_apply_removed_chain(self):
+        self.iptables.ipv4['filter'].add_chain('port')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $port')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['filter'].remove_chain('port')
+        self.iptables.apply()
+
+        self.assertEqual(['*filter\n'
+                          ':%(bn)s-INPUT - [0:0]\n'
+                          ':%(bn)s-port - [0:0]\n'
+                          '-X %(bn)s-port\n'
+                          'COMMIT\n' % IPTABLES_ARG],
+                         self._restore_inputs())
+
+    def test_apply_skips_recreated_identical_chain(self):
+        self.iptables.ipv4['filter'].add_chain('port')
+        self.iptables.ipv4['filter'].add_rule('port', '-j DROP')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['filter'].remove_chain('port')
+        self.iptables.ipv4['filter'].add_chain('port')
+        self.iptables.ipv4['filter'].add_rule('port', '-j DROP')
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_unwrapped_change_applies_full(self):
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+        self.assertEqual(['iptables-save', '-c'],
+                         self.execute.call_args_list[0][0][0])
+
+    def test_full_sync_interval(self):
+        cfg.CONF.set_override('iptables_full_sync_interval', 60, 'AGENT')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        with mock.patch('time.time',
+                        return_value=self.iptables.last_full_apply + 61):
+            self.iptables.apply()
+        self.assertEqual(['iptables-save', '-c'],
+                         self.execute.call_args_list[0][0][0])
+
+    def test_incremental_failure_applies_full(self):
+        self.execute.side_effect = [RuntimeError(), '', '']
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j DROP')
+        self.iptables.apply()
+        self.assertEqual(
+            [['iptables-restore', '--noflush'], ['iptables-save', '-c'],
+             ['iptables-restore', '-c']],
+            [args[0] for args, kwargs in self.execute.call_args_list])
+        self.assertEqual(['-A %(bn)s-INPUT -j DROP' % IPTABLES_ARG],
+                         self.iptables.ipv4['filter'].applied_rules['INPUT'])
@@ -16,6 +16,7 @@
 #    under the License.
 
 import copy
+import datetime
 
 import mock
 from oslo.config import cfg
@@ -34,6 +35,60 @@ HOSTNAME = 'myhost'
 FAKE_ID = _uuid()
 
 
+class TestRouterProcessingQueue(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRouterProcessingQueue, self).setUp()
+        self.queue = l3_agent.RouterProcessingQueue()
+        self.now = datetime.datetime(2013, 10, 1)
+
+    def _update(self, router_id, priority=l3_agent.PRIORITY_RPC, delta=0):
+        return l3_agent.RouterUpdate(
+            router_id, priority,
+            timestamp=self.now + datetime.timedelta(seconds=delta))
+
+    def test_updates_ordered_by_priority_then_age(self):
+        self.queue.add(
+            self._update('sync', l3_agent.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(self._update('rpc2', delta=2))
+        self.queue.add(self._update('rpc1', delta=1))
+        router_ids = []
+        while self.queue.qsize():
+            router_ids.extend(
+                update.id for update in
+                self.queue.each_update_to_next_router())
+        self.assertEqual(['rpc1', 'rpc2', 'sync'], router_ids)
+
+    def test_update_handed_over_to_router_owner(self):
+        self.queue.add(self._update(FAKE_ID))
+        self.queue.add(self._update(FAKE_ID, delta=1))
+        owner = self.queue.each_update_to_next_router()
+        first = next(owner)
+        # another worker picks the second update while the router is
+        # being processed
+        self.assertEqual([], list(self.queue.each_update_to_next_router()))
+        second = next(owner)
+        self.assertEqual(self.now, first.timestamp)
+        self.assertEqual(self.now + datetime.timedelta(seconds=1),
+                         second.timestamp)
+        self.assertEqual([], list(owner))
+        self.assertEqual(0, self.queue.qsize())
+
+    def test_outdated_update_discarded(self):
+        self.queue.processed(FAKE_ID, self.now)
+        self.queue.add(self._update(FAKE_ID, delta=-1))
+        self.assertEqual([], list(self.queue.each_update_to_next_router()))
+        self.queue.add(self._update(FAKE_ID, delta=1))
+        self.assertEqual(1, len(list(
+            self.queue.each_update_to_next_router())))
+
+    def test_processed_keeps_latest_timestamp(self):
+        self.queue.processed(FAKE_ID, self.now)
+        self.queue.processed(FAKE_ID, self.now - datetime.timedelta(1))
+        self.queue.add(self._update(FAKE_ID, delta=-1))
+        self.assertEqual([], list(self.queue.each_update_to_next_router()))
+
+
 class TestBasicRouterOperations(base.BaseTestCase):
 
     def setUp(self):
@@ -524,47 +579,116 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent._process_routers(routers)
         self.assertNotIn(routers[0]['id'], agent.router_info)
 
+    def _queued_updates(self, agent):
+        updates = []
+        while agent._queue.qsize():
+            updates.extend(agent._queue.each_update_to_next_router())
+        return updates
+
+    def _assert_queued_update(self, agent, action):
+        updates = self._queued_updates(agent)
+        self.assertEqual(1, len(updates))
+        self.assertEqual(FAKE_ID, updates[0].id)
+        self.assertEqual(l3_agent.PRIORITY_RPC, updates[0].priority)
+        self.assertEqual(action, updates[0].action)
+
     def test_router_deleted(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_deleted(None, FAKE_ID)
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self._assert_queued_update(agent, l3_agent.DELETE_ROUTER)
 
     def test_routers_updated(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.routers_updated(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self._assert_queued_update(agent, None)
 
     def test_removed_from_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_removed_from_agent(None, {'router_id': FAKE_ID})
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.removed_routers)
+        self._assert_queued_update(agent, l3_agent.DELETE_ROUTER)
 
     def test_added_to_agent(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         agent.router_added_to_agent(None, [FAKE_ID])
-        # verify that will set fullsync
-        self.assertIn(FAKE_ID, agent.updated_routers)
+        self._assert_queued_update(agent, None)
 
-    def test_process_router_delete(self):
-        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+    def _fake_router(self):
         ex_gw_port = {'id': _uuid(),
                       'network_id': _uuid(),
                       'fixed_ips': [{'ip_address': '19.4.4.4',
                                      'subnet_id': _uuid()}],
                       'subnet': {'cidr': '19.4.4.0/24',
                                  'gateway_ip': '19.4.4.1'}}
-        router = {
-            'id': _uuid(),
-            'enable_snat': True,
-            'routes': [],
-            'gw_port': ex_gw_port}
+        return {'id': _uuid(),
+                'admin_state_up': True,
+                'enable_snat': True,
+                'routes': [],
+                'external_gateway_info': {},
+                'gw_port': ex_gw_port}
+
+    def test_process_router_delete(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._fake_router()
         agent._router_added(router['id'], router)
         agent.router_deleted(None, router['id'])
-        agent._process_router_delete()
-        self.assertFalse(list(agent.removed_routers))
+        agent._process_router_update()
+        self.assertNotIn(router['id'], agent.router_info)
+        self.assertFalse(self.plugin_api.get_routers.called)
+
+    def test_process_router_update_fetches_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._fake_router()
+        self.plugin_api.get_routers.return_value = [router]
+        agent.routers_updated(None, [router['id']])
+        with mock.patch.object(agent, '_process_routers') as process:
+            agent._process_router_update()
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [router['id']])
+        process.assert_called_once_with([router])
+
+    def test_process_router_update_removes_missing_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_routers.return_value = []
+        agent.routers_updated(None, [FAKE_ID])
+        with mock.patch.object(agent, '_router_removed') as removed:
+            agent._process_router_update()
+        removed.assert_called_once_with(FAKE_ID)
+
+    def test_process_router_update_fetch_failure_sets_fullsync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        self.plugin_api.get_routers.side_effect = Exception()
+        agent.routers_updated(None, [FAKE_ID])
+        with mock.patch.object(agent, '_process_routers') as process:
+            agent._process_router_update()
+        self.assertFalse(process.called)
+        self.assertTrue(agent.fullsync)
+
+    def test_sync_routers_task_queues_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._fake_router()
+        stale = self._fake_router()
+        agent._router_added(stale['id'], stale)
+        self.plugin_api.get_routers.return_value = [router]
+        agent._sync_routers_task(agent.context)
+        self.assertFalse(agent.fullsync)
+        updates = dict((u.id, u) for u in self._queued_updates(agent))
+        self.assertEqual(set([router['id'], stale['id']]), set(updates))
+        self.assertEqual(router, updates[router['id']].router)
+        self.assertEqual(l3_agent.DELETE_ROUTER,
+                         updates[stale['id']].action)
+        for update in updates.values():
+            self.assertEqual(l3_agent.PRIORITY_SYNC_ROUTERS_TASK,
+                             update.priority)
+
+    def test_rpc_update_processed_before_sync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = self._fake_router()
+        self.plugin_api.get_routers.return_value = [router]
+        agent._sync_routers_task(agent.context)
+        agent.routers_updated(None, [FAKE_ID])
+        updates = self._queued_updates(agent)
+        self.assertEqual([FAKE_ID, router['id']], [u.id for u in updates])
 
     def testDestroyNamespace(self):
 
@@ -16,18 +16,23 @@
 #    under the License.
 
 import os
+import tempfile
 
+import fixtures
 import mock
 from oslo.config import cfg
 
 from neutron.agent.common import config
 from neutron.agent.linux import dhcp
+from neutron.agent.linux import utils
 from neutron.common import config as base_config
 from neutron.openstack.common import log as logging
 from neutron.tests import base
 
 LOG = logging.getLogger(__name__)
 
+real_replace_file = utils.replace_file
+
 
 class FakeIPAllocation:
     def __init__(self, address):
@@ -892,6 +897,86 @@ tag:tag1,249,%s,%s""".lstrip() % (fake_v6,
                                     mock.call(exp_opt_name, exp_opt_data)])
         self.execute.assert_called_once_with(exp_args, 'sudo')
 
+    def _reload_allocations_in_tempdir(self, network):
+        self.safe.side_effect = real_replace_file
+        with mock.patch.object(dhcp.Dnsmasq, 'active') as active:
+            active.__get__ = mock.Mock(return_value=True)
+            with mock.patch.object(dhcp.Dnsmasq, 'pid') as pid:
+                pid.__get__ = mock.Mock(return_value=5)
+                with mock.patch.object(dhcp.Dnsmasq,
+                                       '_make_subnet_interface_ip_map'):
+                    dm = dhcp.Dnsmasq(self.conf, network,
+                                      version=float(2.59))
+                    dm.reload_allocations()
+        return dm
+
+    def test_reload_allocations_unchanged(self):
+        self.conf.set_override(
+            'dhcp_confs', self.useFixture(fixtures.TempDir()).path)
+        network = FakeDualNetwork()
+        self._reload_allocations_in_tempdir(network)
+        self.assertEqual(self.safe.call_count, 2)
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+        self._reload_allocations_in_tempdir(network)
+        self.assertFalse(self.safe.called)
+        self.assertFalse(self.execute.called)
+
+        network.ports = [FakePort1(), FakePort3()]
+        self._reload_allocations_in_tempdir(network)
+        self.safe.assert_called_once_with(
+            os.path.join(self.conf.dhcp_confs, network.id, 'host'), mock.ANY)
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+    def test_reload_allocations_hostsdir(self):
+        self.conf.set_override(
+            'dhcp_confs', self.useFixture(fixtures.TempDir()).path)
+        self.conf.set_override('dnsmasq_hostsdir', True)
+        network = FakeDualNetwork()
+        network.ports = [FakePort1(), FakePort2()]
+        dm = self._reload_allocations_in_tempdir(network)
+        hosts_dir = dm.get_conf_file_name('hosts')
+        self.assertEqual(sorted(os.listdir(hosts_dir)),
+                         [FakePort1.id, FakePort2.id])
+        with open(os.path.join(hosts_dir, FakePort1.id)) as f:
+            self.assertEqual(f.read(), '00:00:80:aa:bb:cc,'
+                             'host-192-168-0-2.openstacklocal,192.168.0.2\n')
+        # The options file has been created as well
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+        network.ports = [FakePort1(), FakePort2(), FakePort3()]
+        self._reload_allocations_in_tempdir(network)
+        self.safe.assert_called_once_with(
+            os.path.join(hosts_dir, FakePort3.id), mock.ANY,
+            tmp_dir=os.path.dirname(hosts_dir))
+        # dnsmasq reads new files without being signaled
+        self.assertFalse(self.execute.called)
+
+        self.safe.reset_mock()
+        network.ports = [FakePort1(), FakePort3()]
+        self._reload_allocations_in_tempdir(network)
+        self.assertFalse(self.safe.called)
+        self.assertEqual(sorted(os.listdir(hosts_dir)),
+                         [FakePort3.id, FakePort1.id])
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
+        # Changed files aren't written in the hosts dir either
+        self.safe.reset_mock()
+        self.execute.reset_mock()
+        network.ports = [FakePort1(), FakePort3()]
+        network.ports[0].mac_address = '00:00:80:aa:bb:dd'
+        with mock.patch('tempfile.NamedTemporaryFile',
+                        wraps=tempfile.NamedTemporaryFile) as ntf:
+            self._reload_allocations_in_tempdir(network)
+        self.assertEqual(1, ntf.call_count)
+        self.assertEqual(os.path.dirname(hosts_dir),
+                         ntf.call_args[1]['dir'])
+        self.execute.assert_called_once_with(['kill', '-HUP', 5], 'sudo')
+
     def test_make_subnet_interface_ip_map(self):
         with mock.patch('neutron.agent.linux.ip_lib.IPDevice') as ip_dev:
             ip_dev.return_value.addr.list.return_value = [
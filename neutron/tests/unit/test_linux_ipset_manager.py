@@ -0,0 +1,80 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+
+SG_ID = '0123456789abcdef0123456789abcdef'
+
+
+class TestIpsetManager(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestIpsetManager, self).setUp()
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(execute=self.execute,
+                                                root_helper='sudo')
+        self.name = ipset_manager.get_ipset_name(SG_ID, 'IPv4')
+
+    def _assert_restore(self, lines):
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join(lines) + '\n', root_helper='sudo')
+
+    def test_get_ipset_name(self):
+        self.assertEqual('NETIPv40123456789abcdef01234567', self.name)
+        self.assertEqual(ipset_manager.MAX_IPSET_NAME_LENGTH, len(self.name))
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members(self.name, 'IPv4', ['10.0.0.2', '10.0.0.1'])
+        self._assert_restore(['create %s hash:net family inet' % self.name,
+                              'flush %s' % self.name,
+                              'add %s 10.0.0.1' % self.name,
+                              'add %s 10.0.0.2' % self.name])
+        self.assertTrue(self.ipset.set_exists(self.name))
+
+    def test_set_members_applies_delta(self):
+        self.ipset.set_members(self.name, 'IPv4', ['10.0.0.1', '10.0.0.2'])
+        self.execute.reset_mock()
+        self.ipset.set_members(self.name, 'IPv4', ['10.0.0.2', '10.0.0.3'])
+        self._assert_restore(['add %s 10.0.0.3' % self.name,
+                              'del %s 10.0.0.1' % self.name])
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members(self.name, 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members(self.name, 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_destroy_set(self):
+        self.ipset.set_members(self.name, 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.destroy_set(self.name)
+        self.execute.assert_called_once_with(
+            ['ipset', 'destroy', self.name], process_input=None,
+            root_helper='sudo')
+        self.assertFalse(self.ipset.set_exists(self.name))
+
+    def test_namespace(self):
+        self.ipset.namespace = 'ns'
+        self.ipset.destroy_set(self.name)
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'ipset', 'destroy', self.name],
+            process_input=None, root_helper='sudo')
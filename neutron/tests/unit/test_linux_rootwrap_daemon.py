@@ -0,0 +1,164 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import sys
+
+import fixtures
+import mock
+from oslo.config import cfg
+
+from neutron.agent.linux import rootwrap_daemon
+from neutron.agent.linux import utils
+from neutron.openstack.common.rootwrap import cmd
+from neutron.openstack.common.rootwrap import wrapper
+from neutron.tests import base
+
+
+FILTERS = """[Filters]
+echo: CommandFilter, /bin/echo, root
+cat: CommandFilter, /bin/cat, root
+missing: CommandFilter, /nonexistent/missing, root
+"""
+
+
+class TestRootwrapDaemon(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRootwrapDaemon, self).setUp()
+        config = mock.Mock()
+        config.exec_dirs = []
+        config.use_syslog = False
+        filters = []
+        for name, exec_path in (('echo', '/bin/echo'), ('cat', '/bin/cat'),
+                                ('missing', '/nonexistent/missing')):
+            f = wrapper.build_filter('CommandFilter', exec_path, 'root')
+            f.name = name
+            filters.append(f)
+        socket_path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                   rootwrap_daemon.SOCKET_NAME)
+        self.daemon = rootwrap_daemon.RootwrapDaemon(
+            socket_path, 'key', 'neutron-rootwrap-daemon', config, filters)
+        self.addCleanup(self.daemon.server_close)
+
+    def _run_command(self, userargs, process_input=None):
+        return self.daemon.run_command(userargs, process_input)
+
+    def test_run_command(self):
+        self.assertEqual((0, 'hello\n', ''),
+                         self._run_command(['echo', 'hello']))
+
+    def test_run_command_with_input(self):
+        self.assertEqual((0, 'hello', ''),
+                         self._run_command(['cat'], 'hello'))
+
+    def test_run_command_unauthorized(self):
+        returncode, stdout, stderr = self._run_command(['ls', '/'])
+        self.assertEqual(cmd.RC_UNAUTHORIZED, returncode)
+        self.assertEqual('neutron-rootwrap-daemon: Unauthorized command: '
+                         'ls / (no filter matched)\n', stdout)
+
+    def test_run_command_not_executable(self):
+        returncode, stdout, stderr = self._run_command(['missing'])
+        self.assertEqual(cmd.RC_NOEXECFOUND, returncode)
+
+    def test_run_command_without_command(self):
+        returncode, stdout, stderr = self._run_command([])
+        self.assertEqual(cmd.RC_NOCOMMAND, returncode)
+
+    def test_encode_data_round_trip(self):
+        data = ''.join(chr(i) for i in range(256))
+        self.assertEqual(data, rootwrap_daemon.decode_data(
+            rootwrap_daemon.encode_data(data)))
+
+
+class TestRootwrapDaemonClient(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRootwrapDaemonClient, self).setUp()
+        temp_dir = self.useFixture(fixtures.TempDir()).path
+        filters_dir = os.path.join(temp_dir, 'rootwrap.d')
+        os.mkdir(filters_dir)
+        with open(os.path.join(filters_dir, 'test.filters'), 'w') as f:
+            f.write(FILTERS)
+        conf_file = os.path.join(temp_dir, 'rootwrap.conf')
+        with open(conf_file, 'w') as f:
+            f.write("[DEFAULT]\nfilters_path=%s\n" % filters_dir)
+        bin_path = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                                'bin', 'neutron-rootwrap-daemon')
+        self.client = utils.RootwrapDaemonClient(
+            '%s %s %s' % (sys.executable, os.path.abspath(bin_path),
+                          conf_file))
+        self.addCleanup(self.client.stop)
+
+    def test_execute(self):
+        self.assertEqual((0, 'hello\n', ''),
+                         self.client.execute(['echo', 'hello']))
+        self.assertEqual((0, 'input', ''),
+                         self.client.execute(['cat'], 'input'))
+        self.assertEqual(cmd.RC_UNAUTHORIZED,
+                         self.client.execute(['ls'])[0])
+
+    def test_execute_restarts_daemon(self):
+        self.client.execute(['echo'])
+        socket_path = self.client._socket_path
+        self.client.stop()
+        self.assertFalse(os.path.exists(socket_path))
+        self.assertEqual((0, 'hello\n', ''),
+                         self.client.execute(['echo', 'hello']))
+
+    def test_execute_rejects_wrong_authkey(self):
+        self.client.execute(['echo'])
+        self.client._authkey = 'x' * len(self.client._authkey)
+        self.assertRaises(RuntimeError, self.client.execute, ['echo'])
+
+    def test_start_failure(self):
+        client = utils.RootwrapDaemonClient('true')
+        self.assertRaises(RuntimeError, client.execute, ['echo'])
+
+
+class TestExecuteWithRootHelperDaemon(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestExecuteWithRootHelperDaemon, self).setUp()
+        cfg.CONF.set_override('root_helper_daemon', 'daemon', 'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        client_p = mock.patch.object(utils, 'RootwrapDaemonClient')
+        self.client = client_p.start().return_value
+        self.addCleanup(client_p.stop)
+        self.addCleanup(setattr, utils, '_root_helper_daemon_client', None)
+        self.client.daemon_cmd = 'daemon'
+
+    def test_execute_uses_daemon(self):
+        self.client.execute.return_value = (0, 'out', '')
+        with mock.patch.object(utils, 'create_process') as create_process:
+            self.assertEqual('out', utils.execute(['ls', 1], 'sudo',
+                                                  process_input='in'))
+        self.assertFalse(create_process.called)
+        self.client.execute.assert_called_once_with(['ls', '1'], 'in')
+
+    def test_execute_raises_on_failure(self):
+        self.client.execute.return_value = (1, '', 'error')
+        self.assertRaises(RuntimeError, utils.execute, ['ls'], 'sudo')
+
+    def test_execute_without_root_helper_forks(self):
+        with mock.patch.object(utils, 'create_process') as create_process:
+            obj = mock.Mock(returncode=0)
+            obj.communicate.return_value = ('out', '')
+            create_process.return_value = (obj, ['ls'])
+            self.assertEqual('out', utils.execute(['ls']))
+        self.assertFalse(self.client.execute.called)
@@ -38,6 +38,67 @@ class FakeConf(object):
     nova_metadata_ip = '9.9.9.9'
     nova_metadata_port = 8775
     metadata_proxy_shared_secret = 'secret'
+    metadata_cache_ttl = 5
+    metadata_cache_size = 1000
+
+
+class TestLookupCache(base.BaseTestCase):
+    def setUp(self):
+        super(TestLookupCache, self).setUp()
+        self.now = 100
+        self.cache = agent.LookupCache(5, 2, timer=lambda: self.now)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1},
+                         self.cache.stats())
+
+    def test_entry_expires(self):
+        self.cache.set('a', 1)
+        self.now += 5
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, self.cache.stats()['size'])
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_least_recently_used_evicted_after_many_hits(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        for i in range(10):
+            self.cache.get('b')
+            self.cache.get('a')
+        self.assertTrue(len(self.cache._uses) <= 4)
+        self.cache.set('c', 3)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_reset_entry_not_evicted_by_stale_use(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.set('a', 3)
+        self.cache.set('c', 4)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('a'))
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_disabled(self):
+        cache = agent.LookupCache(0, 2)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
 
 
 class TestMetadataProxyHandler(base.BaseTestCase):
@@ -182,6 +243,74 @@ class TestMetadataProxyHandler(base.BaseTestCase):
             self._get_instance_id_helper(headers, ports, networks=['the_id'])
         )
 
+    def _mock_list_ports(self, *list_ports_retvals):
+        retvals = list(list_ports_retvals)
+
+        def mock_list_ports(*args, **kwargs):
+            return {'ports': retvals.pop(0)}
+
+        list_ports = self.qclient.return_value.list_ports
+        list_ports.side_effect = mock_list_ports
+        return list_ports
+
+    def _get_instance_id(self, **headers):
+        headers['X-Forwarded-For'] = '192.168.1.1'
+        return self.handler._get_instance_id(mock.Mock(headers=headers))
+
+    def test_get_instance_id_cached(self):
+        list_ports = self._mock_list_ports([{'network_id': 'net1'}],
+                                           [{'device_id': 'device_id'}])
+        for i in range(2):
+            self.assertEqual(
+                'device_id',
+                self._get_instance_id(**{'X-Neutron-Router-ID': 'r'}))
+        self.assertEqual(2, list_ports.call_count)
+        self.assertEqual(1, self.qclient.call_count)
+        self.assertEqual(
+            {'hits': 1, 'misses': 1, 'size': 1},
+            self.handler.cache_stats()['instance_id'])
+
+    def test_get_instance_id_no_match_not_cached(self):
+        list_ports = self._mock_list_ports([], [{'device_id': 'device_id'}])
+        self.assertIsNone(
+            self._get_instance_id(**{'X-Neutron-Network-ID': 'net1'}))
+        self.assertEqual(
+            'device_id',
+            self._get_instance_id(**{'X-Neutron-Network-ID': 'net1'}))
+        self.assertEqual(2, list_ports.call_count)
+
+    def test_get_instance_id_router_networks_refreshed_after_miss(self):
+        list_ports = self._mock_list_ports(
+            [{'network_id': 'net1'}], [{'device_id': 'device1'}],
+            # the instance is not found on the cached networks
+            [],
+            [{'network_id': 'net1'}, {'network_id': 'net2'}],
+            [{'device_id': 'device2'}])
+        self.assertEqual('device1', self.handler._get_instance_id(
+            mock.Mock(headers={'X-Forwarded-For': '192.168.1.1',
+                               'X-Neutron-Router-ID': 'r'})))
+        self.assertEqual('device2', self.handler._get_instance_id(
+            mock.Mock(headers={'X-Forwarded-For': '192.168.1.2',
+                               'X-Neutron-Router-ID': 'r'})))
+        self.assertEqual(5, list_ports.call_count)
+        list_ports.assert_called_with(
+            network_id=['net1', 'net2'],
+            fixed_ips=['ip_address=192.168.1.2'])
+        self.assertEqual(
+            ['net1', 'net2'], self.handler.networks_cache.get('r'))
+
+    def test_proxy_request_reuses_connection(self):
+        req = mock.Mock(path_info='/the_path', query_string='',
+                        headers={'X-Forwarded-For': '8.8.8.8'},
+                        method='GET', body='')
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=200), 'content')
+            for i in range(2):
+                self.handler._proxy_request('the_id', req)
+            self.assertEqual(1, mock_http.call_count)
+            self.assertEqual(2, mock_http.return_value.request.call_count)
+
     def _proxy_request_test_helper(self, response_code=200, method='GET'):
         hdrs = {'X-Forwarded-For': '8.8.8.8'}
         body = 'body'
@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+import mock
+from oslo.config import cfg
+
+from neutron.db import db_base_plugin_v2
+from neutron import service
+from neutron.tests import base
+
+
+class FakeRpcPlugin(db_base_plugin_v2.NeutronDbPluginV2):
+
+    def __init__(self):
+        self.connection = mock.Mock()
+
+    def start_rpc_listeners(self):
+        return [self.connection]
+
+
+class TestServeRpc(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServeRpc, self).setUp()
+        self.addCleanup(cfg.CONF.reset)
+        self.plugin = FakeRpcPlugin()
+        get_plugin = mock.patch('neutron.manager.NeutronManager.get_plugin',
+                                return_value=self.plugin)
+        get_plugin.start()
+        self.addCleanup(get_plugin.stop)
+
+    def test_rpc_workers_supported(self):
+        self.assertTrue(self.plugin.rpc_workers_supported())
+        self.assertFalse(
+            db_base_plugin_v2.NeutronDbPluginV2().rpc_workers_supported())
+
+    def test_plugin_without_rpc_listeners(self):
+        with mock.patch.object(FakeRpcPlugin, 'rpc_workers_supported',
+                               return_value=False):
+            self.assertRaises(NotImplementedError, service.serve_rpc)
+
+    def test_serve_rpc_in_process(self):
+        with mock.patch.object(service.common_service,
+                               'ProcessLauncher') as launcher_cls:
+            rpc = service.serve_rpc()
+        self.assertIsInstance(rpc, service.RpcWorker)
+        self.assertFalse(launcher_cls.called)
+        rpc.stop()
+        self.plugin.connection.close.assert_called_once_with()
+        # returns once the listeners are stopped
+        rpc.wait()
+
+    def test_serve_rpc_workers(self):
+        cfg.CONF.set_override('rpc_workers', 2)
+        with contextlib.nested(
+            mock.patch.object(service.common_service, 'ProcessLauncher'),
+            mock.patch.object(service.api, 'dispose_db')
+        ) as (launcher_cls, dispose_db):
+            launcher = service.serve_rpc()
+        self.assertEqual(launcher_cls.return_value, launcher)
+        dispose_db.assert_called_once_with()
+        launcher.launch_service.assert_called_once_with(mock.ANY, workers=2)
+        rpc = launcher.launch_service.call_args[0][0]
+        self.assertIsInstance(rpc, service.RpcWorker)
+
+    def test_serve_rpc_workers_with_api_launcher(self):
+        cfg.CONF.set_override('rpc_workers', 2)
+        api_launcher = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(service.common_service, 'ProcessLauncher'),
+            mock.patch.object(service.api, 'dispose_db')
+        ) as (launcher_cls, dispose_db):
+            launcher = service.serve_rpc(api_launcher)
+        self.assertEqual(api_launcher, launcher)
+        self.assertFalse(launcher_cls.called)
+        api_launcher.launch_service.assert_called_once_with(mock.ANY,
+                                                            workers=2)
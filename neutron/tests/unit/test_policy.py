@@ -15,6 +15,7 @@
 
 """Test of Policy Engine For Neutron"""
 
+import contextlib
 import json
 import StringIO
 import urllib2
@@ -139,6 +140,13 @@ class PolicyTestCase(base.BaseTestCase):
             self.assertRaises(exceptions.PolicyNotAuthorized, policy.enforce,
                               self.context, action, target)
 
+    def test_enforce_check_returning_none(self):
+        # A user-defined check may return any false value to deny
+        with mock.patch.object(common_policy.HttpCheck, '__call__',
+                               return_value=None):
+            self.assertRaises(exceptions.PolicyNotAuthorized, policy.enforce,
+                              self.context, "example:get_http", {})
+
     def test_templatized_enforcement(self):
         target_mine = {'tenant_id': 'fake'}
         target_not_mine = {'tenant_id': 'another'}
@@ -165,6 +173,54 @@ class PolicyTestCase(base.BaseTestCase):
         policy.enforce(admin_context, lowercase_action, self.target)
         policy.enforce(admin_context, uppercase_action, self.target)
 
+    def test_role_only_rule_results_per_roles(self):
+        action = "example:lowercase_admin"
+        admin_context = context.Context('admin', 'fake', roles=['admin'])
+        for i in range(2):
+            self.assertTrue(policy.check(admin_context, action, self.target))
+            self.assertFalse(policy.check(self.context, action, self.target))
+
+    def test_target_dependent_rule_is_not_memoized(self):
+        action = "example:my_file"
+        self.assertTrue(policy.check(self.context, action,
+                                     {'tenant_id': 'fake'}))
+        self.assertFalse(policy.check(self.context, action,
+                                      {'tenant_id': 'another'}))
+
+    def test_rules_are_compiled_once(self):
+        action = "example:allowed"
+        with mock.patch.object(policy, '_compile_named_rule',
+                               wraps=policy._compile_named_rule) as compile:
+            policy.enforce(self.context, action, self.target)
+            policy.enforce(self.context, action, self.target)
+            self.assertEqual(compile.call_count, 1)
+
+    def test_rules_are_recompiled_after_reload(self):
+        action = "example:allowed"
+        policy.enforce(self.context, action, self.target)
+        common_policy.set_rules(common_policy.Rules(
+            {action: common_policy.parse_rule('!')}))
+        self.assertRaises(exceptions.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+    def test_not_check(self):
+        common_policy._rules['example:not_admin'] = (
+            common_policy.parse_rule('not role:admin'))
+        self.assertTrue(policy.check(self.context, 'example:not_admin',
+                                     self.target))
+
+    def test_is_role_only(self):
+        rules = dict((k, common_policy.parse_rule(v)) for k, v in {
+            "admin": "role:admin",
+            "admin_or_owner": "rule:admin or tenant_id:%(tenant_id)s",
+            "loop1": "rule:loop2",
+            "loop2": "rule:loop1",
+        }.items())
+        common_policy.set_rules(common_policy.Rules(rules))
+        self.assertTrue(policy._is_role_only(rules['admin']))
+        self.assertFalse(policy._is_role_only(rules['admin_or_owner']))
+        self.assertFalse(policy._is_role_only(rules['loop1']))
+
 
 class DefaultPolicyTestCase(base.BaseTestCase):
 
@@ -442,6 +498,50 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             result = policy.enforce(self.context, action, target)
             self.assertTrue(result)
 
+    def test_parent_resource_is_fetched_once_per_context(self):
+        plugin = manager.NeutronManager.get_instance().plugin
+        with mock.patch.object(plugin, 'get_network',
+                               return_value={'tenant_id': 'fake'}) as f:
+            for i in range(2):
+                target = {'network_id': 'whatever'}
+                self.assertTrue(policy.enforce(self.context,
+                                               'create_port:mac', target))
+            self.assertEqual(1, f.call_count)
+            other_context = context.Context('fake', 'fake', roles=['user'])
+            policy.enforce(other_context, 'create_port:mac',
+                           {'network_id': 'whatever'})
+            self.assertEqual(2, f.call_count)
+
+    def test_prefetch_parent_resources(self):
+        plugin = manager.NeutronManager.get_instance().plugin
+        networks = [{'id': 'net1', 'tenant_id': 'fake'},
+                    {'id': 'net2', 'tenant_id': 'other'}]
+        targets = [{'network_id': 'net1'}, {'network_id': 'net2'},
+                   {'network_id': 'net1'}]
+        with contextlib.nested(
+            mock.patch.object(plugin, 'get_networks', return_value=networks),
+            mock.patch.object(plugin, 'get_network')
+        ) as (get_networks, get_network):
+            policy.prefetch_parent_resources(self.context, 'create_port',
+                                             targets)
+            results = [policy.check(self.context, 'create_port:mac', target)
+                       for target in targets]
+        self.assertEqual([True, False, True], results)
+        self.assertEqual(1, get_networks.call_count)
+        filters = get_networks.call_args[1]['filters']
+        self.assertEqual(['net1', 'net2'], sorted(filters['id']))
+        self.assertFalse(get_network.called)
+
+    def test_prefetch_parent_resources_not_needed(self):
+        plugin = manager.NeutronManager.get_instance().plugin
+        with mock.patch.object(plugin, 'get_networks') as get_networks:
+            policy.prefetch_parent_resources(
+                self.context, 'create_port',
+                [{'network_id': 'net1', 'network:tenant_id': 'fake'}])
+            policy.prefetch_parent_resources(
+                self.context, 'get_network', [{'tenant_id': 'fake'}])
+        self.assertFalse(get_networks.called)
+
     def test_tenant_id_check_no_target_field_raises(self):
         # Try and add a bad rule
         self.assertRaises(
@@ -464,6 +564,45 @@ class NeutronPolicyTestCase(base.BaseTestCase):
     def test_enforce_tenant_id_check_invalid_parent_resource_raises(self):
         self._test_enforce_tenant_id_raises('tenant_id:%(foobaz_tenant_id)s')
 
+    def test_check_without_target_role_only_rule(self):
+        admin_context = context.get_admin_context()
+        self.assertTrue(policy.check_without_target(
+            admin_context, 'create_network:shared'))
+        self.assertIs(False, policy.check_without_target(
+            self.context, 'create_network:shared'))
+        self.assertTrue(policy.check_without_target(
+            self.context, 'update_network'))
+
+    def test_check_without_target_target_dependent_rule(self):
+        admin_context = context.get_admin_context()
+        # admin_or_owner does not depend on the target for admins
+        self.assertTrue(policy.check_without_target(
+            admin_context, 'create_network'))
+        self.assertIsNone(policy.check_without_target(
+            self.context, 'create_network'))
+        self.assertIsNone(policy.check_without_target(
+            self.context, 'get_network'))
+
+    def test_check_without_target_not_and_checks(self):
+        self.rules['not_admin'] = common_policy.parse_rule(
+            "not rule:context_is_admin")
+        self.rules['user_and_owner'] = common_policy.parse_rule(
+            "role:user and tenant_id:%(tenant_id)s")
+        admin_context = context.get_admin_context()
+        self.assertIs(False, policy.check_without_target(
+            admin_context, 'not_admin'))
+        self.assertTrue(policy.check_without_target(
+            self.context, 'not_admin'))
+        self.assertIs(False, policy.check_without_target(
+            admin_context, 'user_and_owner'))
+        self.assertIsNone(policy.check_without_target(
+            self.context, 'user_and_owner'))
+
+    def test_check_without_target_non_existent_action_raises(self):
+        self.assertRaises(exceptions.PolicyRuleNotFound,
+                          policy.check_without_target,
+                          self.context, 'get_network:foo')
+
     def test_get_roles_context_is_admin_rule_missing(self):
         rules = dict((k, common_policy.parse_rule(v)) for k, v in {
             "some_other_rule": "role:admin",
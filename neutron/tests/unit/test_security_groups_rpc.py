@@ -31,6 +31,7 @@ from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.manager import NeutronManager
+from neutron.openstack.common.rpc import common as rpc_common
 from neutron.openstack.common.rpc import proxy
 from neutron.tests import base
 from neutron.tests.unit import test_extension_security_group as test_sg
@@ -278,6 +279,120 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_rules_for_devices_without_expanding(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id,
+                                     sg2_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                ports_rpc = self.rpc.security_group_rules_for_devices(
+                    ctx, devices=[port_id1], expand_remote_groups=False)
+                port_rpc = ports_rpc[port_id1]
+                expected_rule = {'direction': u'ingress',
+                                 'protocol': u'tcp', 'ethertype': u'IPv4',
+                                 'port_range_max': 25, 'port_range_min': 24,
+                                 'remote_group_id': sg2_id,
+                                 'security_group_id': sg1_id}
+                self.assertIn(expected_rule,
+                              port_rpc['security_group_rules'])
+                self.assertEqual([sg2_id],
+                                 port_rpc['security_group_source_groups'])
+                self.assertEqual(
+                    ['10.0.0.2', '10.0.0.3'],
+                    sorted(port_rpc['security_group_member_ips'][sg2_id]))
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def test_security_group_info_for_devices(self):
+        with self.network() as n:
+            with nested(self.subnet(n),
+                        self.security_group(),
+                        self.security_group()) as (subnet_v4,
+                                                   sg1,
+                                                   sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', 'tcp', '24',
+                    '25', remote_group_id=sg2_id)
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, 201)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id,
+                                     sg2_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                self.assertEqual([port_id1], sg_info['devices'].keys())
+                self.assertEqual(
+                    [], sg_info['devices'][port_id1]['security_group_rules'])
+                expected = {
+                    sg1_id: [{'direction': 'egress', 'ethertype': 'IPv4',
+                              'security_group_id': sg1_id},
+                             {'direction': 'egress', 'ethertype': 'IPv6',
+                              'security_group_id': sg1_id},
+                             {'direction': u'ingress',
+                              'protocol': u'tcp', 'ethertype': u'IPv4',
+                              'port_range_max': 25, 'port_range_min': 24,
+                              'remote_group_id': sg2_id,
+                              'security_group_id': sg1_id}],
+                    sg2_id: [{'direction': 'egress', 'ethertype': 'IPv4',
+                              'security_group_id': sg2_id},
+                             {'direction': 'egress', 'ethertype': 'IPv6',
+                              'security_group_id': sg2_id}]}
+                for sg_id, rules in expected.items():
+                    self.assertEqual(
+                        sorted(rules),
+                        sorted(sg_info['security_groups'][sg_id]))
+                self.assertEqual([sg2_id], sg_info['sg_member_ips'].keys())
+                self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                                 sorted(sg_info['sg_member_ips'][sg2_id]))
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = test_fw.FAKE_PREFIX['IPv6']
         with self.network() as n:
@@ -492,6 +607,7 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         super(SecurityGroupAgentRpcTestCase, self).setUp()
         self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
         self.agent.context = None
+        self.agent.use_enhanced_rpc = False
         self.addCleanup(mock.patch.stopall)
         mock.patch('neutron.agent.linux.iptables_manager').start()
         self.agent.root_helper = 'sudo'
@@ -551,6 +667,20 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.security_groups_member_updated(['fake_sgid3', 'fake_sgid4'])
         self.agent.refresh_firewall.assert_has_calls([])
 
+    def test_security_groups_member_updated_with_ipset(self):
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+        self.fake_device['security_group_member_ips'] = {
+            'fake_sgid2': ['10.0.0.2']}
+        self.agent.security_groups_member_updated(['fake_sgid2',
+                                                   'fake_sgid3'])
+        self.agent.plugin_rpc.security_group_rules_for_devices.\
+            assert_called_once_with(None, ['fake_device'],
+                                    expand_remote_groups=False)
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', ['10.0.0.2'])
+        self.assertFalse(self.firewall.update_port_filter.called)
+
     def test_security_groups_provider_updated(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.security_groups_provider_updated()
@@ -580,6 +710,195 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.firewall.assert_has_calls([])
 
 
+class SecurityGroupAgentEnhancedRpcTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupAgentEnhancedRpcTestCase, self).setUp()
+        set_firewall_driver(FIREWALL_NOOP_DRIVER)
+        self.addCleanup(cfg.CONF.reset)
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.agent.init_firewall()
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.agent.firewall = self.firewall
+        self.rpc = mock.Mock()
+        self.agent.plugin_rpc = self.rpc
+        self.provider_rule = {'direction': 'ingress', 'ethertype': 'IPv4',
+                              'protocol': 'udp',
+                              'source_ip_prefix': '10.0.0.1/32'}
+        self.remote_rule = {'direction': 'ingress', 'ethertype': 'IPv4',
+                            'security_group_id': 'fake_sgid1',
+                            'remote_group_id': 'fake_sgid2'}
+        self.egress_rule = {'direction': 'egress', 'ethertype': 'IPv4',
+                            'security_group_id': 'fake_sgid2'}
+        self.rpc.security_group_info_for_devices.return_value = {
+            'devices': {'fake_device': {
+                'device': 'fake_device',
+                'fixed_ips': ['10.0.0.2'],
+                'security_groups': ['fake_sgid1', 'fake_sgid2'],
+                'security_group_rules': [self.provider_rule]}},
+            'security_groups': {'fake_sgid1': [self.remote_rule],
+                                'fake_sgid2': [self.egress_rule]},
+            'sg_member_ips': {'fake_sgid2': ['10.0.0.2', '10.0.0.3',
+                                             'fe80::3']}}
+
+    def _prepared_device(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.assertEqual(1, self.firewall.prepare_port_filter.call_count)
+        return self.firewall.prepare_port_filter.call_args[0][0]
+
+    def test_prepare_devices_filter(self):
+        device = self._prepared_device()
+        expanded_rule = dict(self.remote_rule,
+                             source_ip_prefix='10.0.0.3/32')
+        self.assertEqual([expanded_rule, self.egress_rule,
+                          self.provider_rule],
+                         device['security_group_rules'])
+        self.assertEqual(['fake_sgid2'],
+                         device['security_group_source_groups'])
+        self.assertTrue(self.agent.use_enhanced_rpc)
+        self.assertFalse(self.rpc.security_group_rules_for_devices.called)
+
+    def test_prepare_devices_filter_with_ipset(self):
+        cfg.CONF.set_override('enable_ipset', True, 'SECURITYGROUP')
+        self.addCleanup(cfg.CONF.reset)
+        device = self._prepared_device()
+        self.assertEqual([self.remote_rule, self.egress_rule,
+                          self.provider_rule],
+                         device['security_group_rules'])
+        self.assertEqual({'fake_sgid2': ['10.0.0.2', '10.0.0.3', 'fe80::3']},
+                         device['security_group_member_ips'])
+
+    def _test_fall_back_to_security_group_rules_for_devices(self, error):
+        self.rpc.security_group_info_for_devices.side_effect = error
+        self.rpc.security_group_rules_for_devices.return_value = {}
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.assertFalse(self.agent.use_enhanced_rpc)
+        self.assertEqual(
+            1, self.rpc.security_group_info_for_devices.call_count)
+        self.assertEqual(
+            2, self.rpc.security_group_rules_for_devices.call_count)
+
+    def test_fall_back_to_security_group_rules_for_devices(self):
+        self._test_fall_back_to_security_group_rules_for_devices(
+            rpc_common.RemoteError(
+                'AttributeError',
+                "No such RPC function 'security_group_info_for_devices'"))
+
+    def test_fall_back_on_unsupported_version(self):
+        self._test_fall_back_to_security_group_rules_for_devices(
+            rpc_common.RemoteError('UnsupportedRpcVersion', '1.2'))
+
+    def test_fall_back_on_local_unsupported_version(self):
+        self._test_fall_back_to_security_group_rules_for_devices(
+            rpc_common.UnsupportedRpcVersion(version='1.2'))
+
+    def test_no_fall_back_on_other_remote_error(self):
+        self.rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError('DBError', 'database is starting'))
+        self.assertRaises(rpc_common.RemoteError,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+        self.assertIsNone(self.agent.use_enhanced_rpc)
+        self.assertFalse(self.rpc.security_group_rules_for_devices.called)
+
+    def _sg_info(self, member_ips):
+        device = {'device': 'fake_device',
+                  'fixed_ips': ['10.0.0.2'],
+                  'security_groups': ['fake_sgid1', 'fake_sgid2'],
+                  'security_group_rules': [self.provider_rule]}
+        return {'devices': {'fake_device': device},
+                'security_groups': {'fake_sgid1': [self.remote_rule],
+                                    'fake_sgid2': [self.egress_rule]},
+                'sg_member_ips': {'fake_sgid2': member_ips}}
+
+    def _filter_device(self):
+        device = self._prepared_device()
+        self.firewall.ports = {'fake_device': device}
+        self.firewall.reset_mock()
+        self.rpc.reset_mock()
+
+    def test_security_groups_member_updated(self):
+        self._filter_device()
+        self.rpc.security_group_info_for_devices.return_value = (
+            self._sg_info(['10.0.0.2', '10.0.0.4']))
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+
+        self.rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'])
+        self.assertEqual(1, self.firewall.defer_apply.call_count)
+        device = self.firewall.update_port_filter.call_args[0][0]
+        expanded_rule = dict(self.remote_rule,
+                             source_ip_prefix='10.0.0.4/32')
+        self.assertEqual([expanded_rule, self.egress_rule,
+                          self.provider_rule],
+                         device['security_group_rules'])
+
+    def test_security_groups_member_not_changed(self):
+        self._filter_device()
+        self.rpc.security_group_info_for_devices.return_value = (
+            self._sg_info(['10.0.0.2', '10.0.0.3', 'fe80::3']))
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.assertTrue(self.rpc.security_group_info_for_devices.called)
+        self.assertFalse(self.firewall.update_port_filter.called)
+
+    def test_security_groups_member_updated_not_referenced(self):
+        self._filter_device()
+        self.agent.security_groups_member_updated(['fake_sgid1'])
+        self.assertFalse(self.rpc.security_group_info_for_devices.called)
+        self.assertFalse(self.firewall.update_port_filter.called)
+
+    def test_remove_devices_filter_clears_index(self):
+        self._filter_device()
+        self.agent.remove_devices_filter(['fake_device'])
+        self.assertEqual({}, self.agent.devices_info)
+        self.assertEqual({}, self.agent.sg_devices)
+        self.assertEqual({}, self.agent.sg_rules)
+
+    def test_deferred_updates_are_coalesced(self):
+        self._filter_device()
+        self.agent.defer_refresh_firewall = True
+        self.rpc.security_group_info_for_devices.return_value = (
+            self._sg_info(['10.0.0.2', '10.0.0.4']))
+        for i in range(3):
+            self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.agent.security_groups_rule_updated(['fake_sgid1'])
+        self.assertFalse(self.rpc.security_group_info_for_devices.called)
+        self.assertFalse(self.firewall.defer_apply.called)
+
+        self.agent.refresh_deferred_firewall()
+        self.assertEqual(1, self.firewall.defer_apply.call_count)
+        # once for the members, once for the device refiltered for rules
+        self.assertEqual(
+            2, self.rpc.security_group_info_for_devices.call_count)
+        self.assertEqual(set(), self.agent.updated_member_groups)
+        self.assertEqual(set(), self.agent.devices_to_refilter)
+
+        self.rpc.reset_mock()
+        self.agent.refresh_deferred_firewall()
+        self.assertFalse(self.rpc.security_group_info_for_devices.called)
+
+    def test_deferred_provider_update_refreshes_all(self):
+        self._filter_device()
+        self.agent.defer_refresh_firewall = True
+        self.agent.security_groups_member_updated(['fake_sgid2'])
+        self.agent.security_groups_provider_updated()
+        self.agent.refresh_deferred_firewall()
+        self.rpc.security_group_info_for_devices.assert_called_once_with(
+            None, ['fake_device'])
+        self.assertEqual(1, self.firewall.update_port_filter.call_count)
+        self.assertEqual(set(), self.agent.updated_member_groups)
+        self.assertFalse(self.agent.global_refresh_firewall)
+
+    def test_error_after_enhanced_rpc_is_supported(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.rpc.security_group_info_for_devices.side_effect = (
+            rpc_common.RemoteError())
+        self.assertRaises(rpc_common.RemoteError,
+                          self.agent.prepare_devices_filter, ['fake_device'])
+
+
 class FakeSGRpcApi(agent_rpc.PluginApi,
                    sg_rpc.SecurityGroupServerRpcApiMixin):
     pass
@@ -602,6 +921,30 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_rules_for_devices_without_expanding(self):
+        self.rpc.security_group_rules_for_devices(
+            None, ['fake_device'], expand_remote_groups=False)
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device'],
+                  'expand_remote_groups': False},
+             'method': 'security_group_rules_for_devices',
+             'namespace': None},
+             version=sg_rpc.SG_RPC_VERSION,
+             topic='fake_topic')])
+
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+             'method': 'security_group_info_for_devices',
+             'namespace': None},
+             version=sg_rpc.SG_RPC_VERSION,
+             topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(proxy.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -1209,6 +1552,7 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
         self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
         self.agent.context = None
+        self.agent.use_enhanced_rpc = False
 
         self.root_helper = 'sudo'
         self.agent.root_helper = 'sudo'
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 import socket
 import urllib2
@@ -92,6 +93,35 @@ class TestWSGIServer(base.BaseTestCase):
                             mock_listen.return_value)
                     ])
 
+    def test_start_multiple_workers(self):
+        server = wsgi.Server("test_multiple_workers")
+        with contextlib.nested(
+            mock.patch.object(wsgi.common_service, 'ProcessLauncher'),
+            mock.patch.object(wsgi.api, 'dispose_db')
+        ) as (launcher_cls, dispose_db):
+            launcher = launcher_cls.return_value
+            server.start(None, 0, host="127.0.0.1", workers=2)
+            dispose_db.assert_called_once_with()
+            launcher.launch_service.assert_called_once_with(mock.ANY,
+                                                            workers=2)
+            worker = launcher.launch_service.call_args[0][0]
+            self.assertIsInstance(worker, wsgi.WorkerService)
+            server.stop()
+            server.wait()
+            launcher.wait.assert_called_once_with()
+        server._socket.close()
+
+    def test_worker_service(self):
+        server = wsgi.Server("test_worker_service")
+        server._socket = mock.Mock()
+        worker = wsgi.WorkerService(server, 'app')
+        with mock.patch.object(server, 'pool') as mock_pool:
+            worker.start()
+            mock_pool.spawn.assert_called_once_with(server._run, 'app',
+                                                    server._socket)
+            worker.wait()
+            mock_pool.waitall.assert_called_once_with()
+
     def test_app(self):
         greetings = 'Hello, World!!!'
 
@@ -37,9 +37,11 @@ import webob.exc
 from neutron.common import constants
 from neutron.common import exceptions as exception
 from neutron import context
+from neutron.db import api
 from neutron.openstack.common import gettextutils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import service as common_service
 
 socket_opts = [
     cfg.IntOpt('backlog',
@@ -82,12 +84,35 @@ def run_server(application, port):
     eventlet.wsgi.server(sock, application)
 
 
+class WorkerService(object):
+    """Wraps a worker to be handled by ProcessLauncher."""
+    def __init__(self, service, application):
+        self._service = service
+        self._application = application
+        self._server = None
+
+    def start(self):
+        self._server = self._service.pool.spawn(self._service._run,
+                                                self._application,
+                                                self._service._socket)
+
+    def wait(self):
+        self._service.pool.waitall()
+
+    def stop(self):
+        if isinstance(self._server, eventlet.greenthread.GreenThread):
+            self._server.kill()
+            self._server = None
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
     def __init__(self, name, threads=1000):
         self.pool = eventlet.GreenPool(threads)
         self.name = name
+        self._launcher = None
+        self._server = None
 
     def _get_socket(self, host, port, backlog):
         bind_addr = (host, port)
@@ -166,8 +191,13 @@ class Server(object):
 
         return sock
 
-    def start(self, application, port, host='0.0.0.0'):
-        """Run a WSGI server with the given application."""
+    def start(self, application, port, host='0.0.0.0', workers=0):
+        """Run a WSGI server with the given application.
+
+        With workers, the listening socket is shared by as many child
+        processes serving the application, which are respawned by
+        wait() when they die.
+        """
         self._host = host
         self._port = port
         backlog = CONF.backlog
@@ -175,7 +205,17 @@ class Server(object):
         self._socket = self._get_socket(self._host,
                                         self._port,
                                         backlog=backlog)
-        self._server = self.pool.spawn(self._run, application, self._socket)
+        if workers < 1:
+            # For the case where only one process is required.
+            self._server = self.pool.spawn(self._run, application,
+                                           self._socket)
+        else:
+            # The connections of the database pool would be shared with
+            # the children, which open their own ones instead
+            api.dispose_db()
+            self._launcher = common_service.ProcessLauncher()
+            self._server = WorkerService(self, application)
+            self._launcher.launch_service(self._server, workers=workers)
 
     @property
     def host(self):
@@ -185,13 +225,23 @@ class Server(object):
     def port(self):
         return self._socket.getsockname()[1] if self._socket else self._port
 
+    @property
+    def launcher(self):
+        """The ProcessLauncher supervising the workers, if any."""
+        return self._launcher
+
     def stop(self):
-        self._server.kill()
+        if isinstance(self._server, eventlet.greenthread.GreenThread):
+            self._server.kill()
+            self._server = None
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
-            self.pool.waitall()
+            if self._launcher:
+                self._launcher.wait()
+            else:
+                self.pool.waitall()
         except KeyboardInterrupt:
             pass
 
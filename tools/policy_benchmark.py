@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the throughput of interpreted and compiled policy checks.
+
+Checks a few typical API actions against etc/policy.json, or another
+policy file, for an admin and a regular user context. The interpreted
+engine evaluates the check tree of each rule, as neutron.policy did
+before rules were compiled:
+
+    python tools/policy_benchmark.py -n 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'neutron', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from oslo.config import cfg
+
+from neutron.common import config
+from neutron import context
+from neutron.openstack.common import policy as common_policy
+from neutron import policy
+
+TENANT_ID = 'policy-benchmark'
+NETWORK = {'id': 'net1', 'tenant_id': TENANT_ID, 'shared': False,
+           'router:external': False}
+PORT = {'id': 'port1', 'tenant_id': TENANT_ID, 'network_id': 'net1',
+        'binding:vif_type': 'ovs'}
+NEW_PORT = {'tenant_id': TENANT_ID, 'network_id': 'net1',
+            'network:tenant_id': TENANT_ID, 'name': 'port',
+            'admin_state_up': True}
+ACTIONS = [('get_network', NETWORK),
+           ('get_port', PORT),
+           ('get_port:binding:vif_type', PORT),
+           ('create_port', NEW_PORT)]
+
+
+def _interpreted_check(ctx, action, target):
+    return common_policy.check(*policy._prepare_check(ctx, action, target))
+
+
+def _measure(check, ctx, iterations):
+    start = time.time()
+    for i in range(iterations):
+        for action, target in ACTIONS:
+            check(ctx, action, dict(target))
+    return iterations * len(ACTIONS) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=10000)
+    parser.add_argument('--policy-file',
+                        default=os.path.join(possible_topdir, 'etc',
+                                             'policy.json'))
+    args = parser.parse_args()
+
+    config.parse([])
+    cfg.CONF.set_override('policy_file', args.policy_file)
+    contexts = [('admin', context.get_admin_context()),
+                ('user', context.Context('user', TENANT_ID,
+                                         roles=['member']))]
+    for name, ctx in contexts:
+        interpreted = _measure(_interpreted_check, ctx, args.iterations)
+        compiled = _measure(policy.check, ctx, args.iterations)
+        print('%-6s interpreted %9.0f checks/s  compiled %9.0f checks/s  '
+              '(x%.1f)' % (name, interpreted, compiled,
+                           compiled / interpreted))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the per-command latency of neutron-rootwrap and its daemon.
+
+Runs the same command through agent.linux.utils.execute, first forking
+neutron-rootwrap for each call, then through neutron-rootwrap-daemon.
+
+By default both are run as the current user with a temporary
+configuration that only allows /bin/true, so no privileges are needed:
+
+    python tools/rootwrap_daemon_benchmark.py -n 200
+
+Use --sudo and --config to measure a deployed configuration instead:
+
+    python tools/rootwrap_daemon_benchmark.py --sudo \\
+        --config /etc/neutron/rootwrap.conf -- ip link show lo
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'neutron', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from oslo.config import cfg
+
+from neutron.agent.linux import utils
+
+
+def _write_config(temp_dir):
+    filters_dir = os.path.join(temp_dir, 'rootwrap.d')
+    os.mkdir(filters_dir)
+    with open(os.path.join(filters_dir, 'benchmark.filters'), 'w') as f:
+        f.write('[Filters]\ntrue: CommandFilter, /bin/true, root\n')
+    config = os.path.join(temp_dir, 'rootwrap.conf')
+    with open(config, 'w') as f:
+        f.write('[DEFAULT]\nfilters_path=%s\n' % filters_dir)
+    return config
+
+
+def _measure(command, root_helper, iterations):
+    # The first call is not timed, it starts the daemon if one is used
+    utils.execute(command, root_helper=root_helper)
+    timings = []
+    for i in range(iterations):
+        start = time.time()
+        utils.execute(command, root_helper=root_helper)
+        timings.append(time.time() - start)
+    return sorted(timings)
+
+
+def _report(name, timings):
+    count = len(timings)
+    print('%-8s mean %7.2f ms  median %7.2f ms  p95 %7.2f ms  max %7.2f ms'
+          % (name,
+             1000 * sum(timings) / count,
+             1000 * timings[count // 2],
+             1000 * timings[min(count - 1, int(count * 0.95))],
+             1000 * timings[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('--config',
+                        help='rootwrap.conf to use instead of a temporary '
+                             'configuration allowing /bin/true')
+    parser.add_argument('--sudo', action='store_true',
+                        help='run neutron-rootwrap and its daemon with sudo')
+    parser.add_argument('command', nargs='*', default=['true'],
+                        help='command to run, must be allowed by the filters')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        config = args.config or _write_config(temp_dir)
+        bin_dir = os.path.join(possible_topdir, 'bin')
+        prefix = 'sudo ' if args.sudo else ''
+        root_helper = '%s%s %s %s' % (
+            prefix, sys.executable,
+            os.path.join(bin_dir, 'neutron-rootwrap'), config)
+        daemon = '%s%s %s %s' % (
+            prefix, sys.executable,
+            os.path.join(bin_dir, 'neutron-rootwrap-daemon'), config)
+
+        print('%d calls of %s' % (args.iterations, ' '.join(args.command)))
+        _report('fork', _measure(args.command, root_helper, args.iterations))
+
+        cfg.CONF.set_override('root_helper_daemon', daemon, 'AGENT')
+        try:
+            _report('daemon', _measure(args.command, root_helper,
+                                       args.iterations))
+        finally:
+            utils.get_root_helper_daemon_client().stop()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()